@@ -0,0 +1,115 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Benchmark of the offline gazetteer index.
+
+Build an index from a GeoNames dump, or from random places if none is
+given, then report the build time, the size of the index, and the
+throughput (operations per second) of name lookups, prefix completions
+and nearest-place queries, along with that of coordinates lookups in the
+geocoding cache for comparison.
+
+usage: python benchmarks/gazetteer.py [--dump FILE] [-n PLACES]
+                                      [-q QUERIES] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+
+sys.path.insert(0, SRC)
+
+from terminal_weather import gazetteer, geocode
+
+SYLLABLES = ("ra", "bat", "sa", "le", "pa", "ris", "to", "kyo", "li", "ma",
+             "ca", "sa", "blan", "ca", "mar", "ra", "kech", "fes", "ne", "ka")
+
+def random_places(count, seed=0):
+    """Yield places as read_geonames() does, with made-up names."""
+    rng = random.Random(seed)
+    for n in range(count):
+        name = ''.join(rng.choice(SYLLABLES)
+                       for _ in range(rng.randint(2, 4))).title()
+        if rng.random() < 0.9:
+            name = f"{name} {n}"
+        yield (name,
+               name,
+               rng.uniform(-60, 70),
+               rng.uniform(-180, 180),
+               rng.choice(("MA", "FR", "US", "BR", "JP")),
+               int(rng.paretovariate(1) * 1000))
+
+def throughput(func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(*query)
+    return round(len(queries) / (time.perf_counter() - start))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dump", help="a GeoNames dump (.txt or .zip)")
+    parser.add_argument("-n", "--places", type=int, default=200000,
+                        help="number of random places without --dump "
+                        "(default: 200000)")
+    parser.add_argument("-q", "--queries", type=int, default=20000)
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.dump:
+        with gazetteer.open_dump(args.dump) as lines:
+            places = list(gazetteer.read_geonames(lines))
+    else:
+        places = list(random_places(args.places))
+
+    rng = random.Random(1)
+    sample = [rng.choice(places) for _ in range(args.queries)]
+    names = [(name, country) for name, _, _, _, country, _ in sample]
+    prefixes = [(name[:3],) for name, _ in names]
+    coords = [(rng.uniform(-60, 70), rng.uniform(-180, 180))
+              for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["XDG_CACHE_HOME"] = directory
+        path = os.path.join(directory, "gazetteer.idx")
+
+        start = time.perf_counter()
+        gazetteer.build(places, path)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = gazetteer.Gazetteer(path)
+        open_time = time.perf_counter() - start
+
+        for name, country in names[:1000]:
+            geocode.resolve(name,
+                            lambda *a, **k: [{ "lat": 0, "lon": 0 }],
+                            country=country)
+
+        report = {
+            "places": len(places),
+            "index_bytes": os.path.getsize(path),
+            "build_s": round(build_time, 3),
+            "open_ms": round(open_time * 1000, 3),
+            "find_per_sec": throughput(index.find, names),
+            "complete_per_sec": throughput(index.complete, prefixes),
+            "nearest_per_sec": throughput(index.nearest, coords),
+            "geocache_per_sec": throughput(geocode.lookup, names[:1000]),
+        }
+        index.close()
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+
+    for name, value in report.items():
+        print(f"{name}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Benchmark of the history store.
+
+Record months of hourly observations and of forecasts fetched every 3
+hours for one location, then report the size of the store, the append
+throughput (records per second), and the time of range queries and of
+daily aggregates over a week and over the whole period, both for the
+store and for the same data kept as NDJSON responses, for comparison.
+
+usage: python benchmarks/history.py [-d DAYS] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+
+sys.path.insert(0, SRC)
+
+from terminal_weather import columns, history
+
+HOUR = 60 * 60
+FIELDS = ("temp", "humidity", "wind_speed", "rain")
+
+def responses(days, seed=0):
+    """Yield (kind, response, issued) as fetched over 'days' days."""
+    rng = random.Random(seed)
+    start = 1700000000 - 1700000000 % (24 * HOUR)
+
+    def slot(dt):
+        return { "dt": dt,
+                 "main": { "temp": round(rng.gauss(20, 5), 2),
+                           "feels_like": round(rng.gauss(20, 5), 2),
+                           "pressure": rng.randint(990, 1030),
+                           "humidity": rng.randint(20, 100) },
+                 "wind": { "speed": round(rng.uniform(0, 15), 2),
+                           "deg": rng.randint(0, 359) },
+                 "clouds": { "all": rng.randint(0, 100) },
+                 "rain": { "3h": round(rng.expovariate(2), 2) },
+                 "visibility": 10000 }
+
+    for hour in range(days * 24):
+        issued = start + hour * HOUR
+        yield "weather", dict(slot(issued), name="Rabat", timezone=3600), \
+            issued
+        if hour % 3 == 0:
+            first = issued - issued % (3 * HOUR) + 3 * HOUR
+            yield "forecast", { "city": { "name": "Rabat",
+                                          "timezone": 3600 },
+                                "list": [slot(first + i * 3 * HOUR)
+                                         for i in range(40)] }, issued
+
+def elapsed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return round((time.perf_counter() - start) * 1000, 3), result
+
+def scan_ndjson(path, kind, start, end):
+    """Return a columns.Columns of the records of an NDJSON file."""
+    dt = []
+    values = dict((f, []) for f in FIELDS)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["kind"] != kind:
+                continue
+            data = record["data"]
+            for ts in data.get("list") or (data,):
+                if start <= ts["dt"] < end:
+                    dt.append(ts["dt"])
+                    for field in FIELDS:
+                        value = columns.COLUMNS[field](ts)
+                        values[field].append(
+                            float("nan") if value is None else value
+                        )
+    return columns.Columns(dt, 3600, values)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-d", "--days", type=int, default=180,
+                        help="days of recorded data (default: 180)")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    args = parser.parse_args()
+
+    fetched = list(responses(args.days))
+    first = fetched[0][2]
+    end = fetched[-1][2]
+    week = end - 7 * 24 * HOUR
+
+    with tempfile.TemporaryDirectory() as directory:
+        ndjson = os.path.join(directory, "responses.ndjson")
+        with open(ndjson, 'w', encoding="utf-8") as f:
+            for kind, data, issued in fetched:
+                f.write(json.dumps({ "kind": kind, "data": data }) + '\n')
+
+        start = time.perf_counter()
+        records = sum(history.record(directory, (34.01, -6.83), "metric",
+                                     kind, data, issued)
+                      for kind, data, issued in fetched)
+        append_time = time.perf_counter() - start
+
+        path = os.path.join(history.location_dir(directory, (34.01, -6.83)),
+                            "metric")
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+
+        report = {
+            "days": args.days,
+            "records": records,
+            "store_bytes": size,
+            "ndjson_bytes": os.path.getsize(ndjson),
+            "append_per_sec": round(records / append_time),
+        }
+
+        for kind in history.KINDS:
+            store = history.Store(os.path.join(path, kind), kind)
+            for name, since in (("week", week), ("all", first)):
+                select_ms, (data, _) = elapsed(store.select,
+                                               since,
+                                               end,
+                                               FIELDS)
+                aggregate_ms, _ = elapsed(columns.aggregate, data)
+                ndjson_ms, _ = elapsed(lambda: columns.aggregate(
+                    scan_ndjson(ndjson, kind, since, end)
+                ))
+                report[f"{kind}_{name}_rows"] = len(data.dt)
+                report[f"{kind}_{name}_select_ms"] = select_ms
+                report[f"{kind}_{name}_daily_ms"] = \
+                    round(select_ms + aggregate_ms, 3)
+                report[f"{kind}_{name}_ndjson_daily_ms"] = ndjson_ms
+                del data
+            store.close()
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+
+    for name, value in report.items():
+        print(f"{name}: {value}")
+
+if __name__ == "__main__":
+    main()
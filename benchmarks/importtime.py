@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Import-time benchmark with a tracked budget.
+
+Import each entry-point module in a fresh interpreter with
+'python -X importtime', and compare the median cumulative import time
+and the set of imported modules to the budget in importtime.json.
+Exit with status 1 if the budget is exceeded.
+
+usage: python benchmarks/importtime.py [-n RUNS] [--update]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+BUDGET_FILE = os.path.join(HERE, "importtime.json")
+MARGIN = 2 # budget written by --update, as a multiple of the measurement
+
+def measure(module):
+    """Import a module in a fresh interpreter.
+
+    Return a tuple: (cumulative import time in microseconds, names of the
+    modules imported because of it).
+    """
+    env = dict(os.environ, PYTHONPATH=SRC, PYTHONDONTWRITEBYTECODE='')
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True
+    )
+
+    lines = [line for line in result.stderr.splitlines()
+             if line.startswith("import time:") and '|' in line]
+    # modules imported at startup (by site) are logged before 'site'
+    names = [line.split('|')[2].strip() for line in lines]
+    start = names.index("site") + 1 if "site" in names else 0
+
+    total = None
+    imported = set()
+    for line in lines[start:]:
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            total = int(cumulative)
+
+    return total, imported
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=7)
+    parser.add_argument("--update", action="store_true",
+                        help="write the current measurements as the budget")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE, encoding="utf-8") as f:
+        budget = json.load(f)
+
+    failed = False
+    for module, limits in budget.items():
+        measure(module) # warm-up, compiles bytecode
+        runs = [measure(module) for _ in range(args.runs)]
+        median = statistics.median(total for total, _ in runs)
+        forbidden = sorted(set(limits.get("forbidden", ()))
+                           & set.union(*(imported for _, imported in runs)))
+
+        print(f"{module}: {median / 1000:.2f} ms "
+              f"(budget: {limits['max_us'] / 1000:.2f} ms)")
+        if forbidden:
+            print("  forbidden imports:", ' '.join(forbidden))
+
+        if args.update:
+            limits["max_us"] = int(median * MARGIN)
+        elif median > limits["max_us"] or forbidden:
+            failed = True
+
+    if args.update:
+        with open(BUDGET_FILE, 'w', encoding="utf-8") as f:
+            json.dump(budget, f, indent=4)
+            f.write('\n')
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
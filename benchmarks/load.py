@@ -0,0 +1,290 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""End-to-end load harness running against the local API stand-in.
+
+Send queries for many locations through one of four paths:
+
+cli -- one 'weather' process per query
+batch -- a single 'weather --batch' process for all queries
+library -- in-process calls of the geocoding, request and rendering
+functions, sharing one transport and key pool
+async -- tasks of one event loop awaiting an api.Client, 'concurrency'
+being the number of tasks in flight
+
+and report latency percentiles (p50, p95, p99), throughput and the number
+of upstream calls per query. Caches live in a temporary directory, so
+runs start cold and leave the user's caches untouched.
+
+usage: python benchmarks/load.py [-m {cli,batch,library,async}]
+                                 [-n QUERIES]
+                                 [-c CONCURRENCY] [--distinct N] [-d DAYS]
+                                 [--no-cache] [--units LIST] [--json]
+                                 [server options]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import standin
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+KEY = "0123456789abcdef0123456789abcdef"
+
+def percentile(values, p):
+    """Return the p-th percentile of sorted values (nearest rank)."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * p // 100)) # ceiling
+    return values[int(rank) - 1]
+
+def write_conf(directory, url, args):
+    path = os.path.join(directory, "conf")
+    lines = [
+        f"api-url={url}",
+        f"geoip-url={url}/geoip",
+        "geoip-fields=latitude,longitude,countryName,countryCode,cityName",
+        f"key={KEY}",
+        f"workers={args.concurrency}",
+        f"rate-limit={args.client_rate_limit}",
+    ]
+    with open(path, 'w', encoding="utf-8") as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+def make_env(directory):
+    return dict(os.environ,
+                PYTHONPATH=SRC,
+                TERMINAL_WEATHER_NO_DAEMON="1",
+                XDG_CACHE_HOME=os.path.join(directory, "cache"),
+                XDG_STATE_HOME=os.path.join(directory, "state"))
+
+def options(args):
+    """Return command-line options shared by all queries."""
+    argv = []
+    if args.days is not None:
+        argv += ["--days", args.days]
+    if args.no_cache:
+        argv.append("--no-cache")
+    return argv
+
+def run_cli(locations, conf, env, args):
+    """Run one process per query.
+
+    Return a list of tuples: (latency in seconds, whether it succeeded).
+    """
+    def query(location, units):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-m", "terminal_weather",
+                        "-c", conf, "-l", location, "-u", units,
+                        *options(args)],
+                       env=env,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        return time.perf_counter() - start, process.returncode == 0
+
+    systems = args.units.split(',')
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        return list(executor.map(query,
+                                 locations,
+                                 (systems[n % len(systems)]
+                                  for n in range(len(locations)))))
+
+def run_batch(locations, conf, env, args):
+    """Run all queries in one batch process.
+
+    Batch mode doesn't expose the latency of single queries, so none
+    are returned, but failed queries are counted.
+    """
+    process = subprocess.run([sys.executable, "-m", "terminal_weather",
+                              "-c", conf, "--batch", *options(args)],
+                             input='\n'.join(locations) + '\n',
+                             text=True,
+                             env=env,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL)
+    errors = sum(line.split('\t')[2] == "error"
+                 for line in process.stdout.splitlines())
+    return [(None, False)] * errors
+
+def run_library(locations, conf, env, args):
+    """Run queries in threads of this process, see run_cli()."""
+    for name in ("XDG_CACHE_HOME", "XDG_STATE_HOME"):
+        os.environ[name] = env[name]
+    sys.path.insert(0, SRC)
+
+    from functools import partial
+    from terminal_weather import config, geocode, keys, output, owm, util
+    from terminal_weather.transport import Transport
+
+    get_value = config.parse_conf(conf, config.CONF_SPEC)
+    api_url = get_value("api-url")
+    http = Transport(pool_size=args.concurrency)
+    pool = keys.KeyPool(get_value("key"),
+                        calls_per_minute=int(get_value("rate-limit")))
+    geo_func = pool.wrap(partial(owm.geo_direct, http, api_url=api_url))
+    days = util.parse_days(args.days) if args.days is not None else None
+    data_func = pool.wrap(partial(owm.forecast if days else owm.weather,
+                                  http,
+                                  api_url=api_url))
+    fields = tuple(util.separate(config.DEFAULTS["fields"]))
+    params = { "sep": '\t', "field_delim": '\n', "units": "metric" }
+
+    def query(location):
+        start = time.perf_counter()
+        try:
+            city, country = util.split_location(location)
+            coords = geocode.resolve(city,
+                                     geo_func,
+                                     country=country,
+                                     use_cache=not args.no_cache)
+            data = owm.convert(data_func(*coords, units=owm.FETCHED),
+                               "metric")
+            if days:
+                output.render_forecast(data,
+                                       fields,
+                                       ts_delim='\n---\n',
+                                       time_format="%c",
+                                       start_day=days[0],
+                                       end_day=days[-1],
+                                       **params)
+            else:
+                output.render_ts(data, fields, **params)
+        except Exception:
+            return time.perf_counter() - start, False
+        return time.perf_counter() - start, True
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            return list(executor.map(query, locations))
+    finally:
+        http.close()
+
+def run_async(locations, conf, env, args):
+    """Run queries as tasks of one event loop, see run_cli()."""
+    for name in ("XDG_CACHE_HOME", "XDG_STATE_HOME"):
+        os.environ[name] = env[name]
+    sys.path.insert(0, SRC)
+
+    import asyncio
+    from terminal_weather import api, config, util
+
+    get_value = config.parse_conf(conf, config.CONF_SPEC)
+    days = util.parse_days(args.days) if args.days is not None else None
+
+    async def main():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        async with api.Client(lambda name: get_value(name)
+                              or config.DEFAULTS.get(name),
+                              no_cache=args.no_cache) as client:
+
+            async def query(location):
+                async with semaphore:
+                    start = time.perf_counter()
+                    try:
+                        if days:
+                            data = await client.forecast(location, days)
+                        else:
+                            data = await client.current(location)
+                        await client.render(data, days=days)
+                    except api.Error:
+                        return time.perf_counter() - start, False
+                    return time.perf_counter() - start, True
+
+            return await asyncio.gather(*map(query, locations))
+
+    return asyncio.run(main())
+
+MODES = { "cli": run_cli,
+          "batch": run_batch,
+          "library": run_library,
+          "async": run_async }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-m", "--mode", choices=MODES, default="library")
+    parser.add_argument("-n", "--queries", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--distinct", type=int,
+                        help="number of distinct locations (default: one "
+                        "per query)")
+    parser.add_argument("-d", "--days",
+                        help="query forecasts for a day range instead of "
+                        "current weather")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--units", default="metric",
+                        help="comma-separated unit systems used in turn by "
+                        "the queries of -m cli (default: metric)")
+    parser.add_argument("--client-rate-limit", type=int, default=100000,
+                        help="calls per minute allowed by the program "
+                        "(default: 100000, i.e. no limit)")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    server_options = parser.add_argument_group("server options")
+    server_options.add_argument("--latency", type=float, default=20,
+                                help="milliseconds (default: 20)")
+    server_options.add_argument("--jitter", type=float, default=10,
+                                help="milliseconds (default: 10)")
+    server_options.add_argument("--rate-limit", type=int)
+    server_options.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    distinct = args.distinct or args.queries
+    locations = [f"city{i % distinct},MA" for i in range(args.queries)]
+
+    server = standin.StandIn(latency=args.latency / 1000,
+                             jitter=args.jitter / 1000,
+                             rate_limit=args.rate_limit,
+                             error_rate=args.error_rate).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            conf = write_conf(directory, server.url, args)
+            env = make_env(directory)
+            start = time.perf_counter()
+            results = MODES[args.mode](locations, conf, env, args)
+            elapsed = time.perf_counter() - start
+        calls = server.calls()
+        stats = server.stats()
+    finally:
+        server.stop()
+
+    latencies = sorted(t for t, _ in results if t is not None)
+    report = {
+        "mode": args.mode,
+        "queries": args.queries,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "queries_per_sec": round(args.queries / elapsed, 1),
+        "errors": sum(not ok for _, ok in results),
+        "upstream_calls_per_query": round(calls / args.queries, 3),
+        "upstream": stats,
+    }
+    for p in (50, 95, 99):
+        value = percentile(latencies, p)
+        report[f"p{p}_ms"] = value and round(value * 1000, 1)
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+
+    print(f"{args.mode}: {args.queries} queries at concurrency "
+          f"{args.concurrency} in {elapsed:.2f} s "
+          f"({report['queries_per_sec']} queries/s)")
+    if latencies:
+        print("latency: " + ", ".join(f"p{p} {report[f'p{p}_ms']} ms"
+                                      for p in (50, 95, 99)))
+    print(f"errors: {report['errors']}")
+    print(f"upstream calls per query: {report['upstream_calls_per_query']}")
+    for endpoint, counts in sorted(stats.items(), key=str):
+        print(f"  {endpoint}: " + ", ".join(f"{n} x {status}"
+                                            for status, n in counts.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Micro-benchmarks of configuration parsing, field extraction and rendering.
+
+Each case runs on recorded API responses (fixtures/weather.json and the
+40-timestamp fixtures/forecast.json) and reports its throughput in
+operations per second and the peak memory allocated by one operation.
+Throughput is compared to the baselines in micro.json: exit with status
+1 if a case is slower than its baseline by more than the threshold.
+
+usage: python benchmarks/micro.py [-r REPEAT] [-t THRESHOLD] [--update]
+                                  [CASE ...]
+"""
+
+import argparse
+import contextlib
+import copy
+import json
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+
+from datetime import timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+FIXTURES = os.path.join(HERE, "fixtures")
+BASELINE_FILE = os.path.join(HERE, "micro.json")
+THRESHOLD = 0.25 # tolerated slowdown, as a fraction of the baseline
+BATCH_SIZE = 10000
+
+sys.path.insert(0, SRC)
+
+from terminal_weather import batch, config, output, owm, util
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+def shift_forecast(forecast_dict):
+    """Move a recorded forecast's timestamps to start in the next 3 hours.
+
+    Otherwise, day ranges counted from today would select no timestamps.
+    """
+    interval = owm.INTERVAL * 3600
+    first = forecast_dict["list"][0]["dt"]
+    offset = (time.time() // interval + 1) * interval - first
+    for ts in forecast_dict["list"]:
+        ts["dt"] = int(ts["dt"] + offset)
+    return forecast_dict
+
+def make_cases():
+    """Return a dictionary of case name: function running one operation."""
+    weather = load_fixture("weather.json")
+    forecast = shift_forecast(load_fixture("forecast.json"))
+    conf_path = os.path.join(FIXTURES, "conf")
+    all_fields = owm.list_fields()
+    default_fields = tuple(util.separate(config.DEFAULTS["fields"]))
+    systems = tuple(owm.SYSTEMS)
+    tzinfo = timezone(timedelta(seconds=weather["timezone"]))
+    time_format = config.DEFAULTS["time-format"]
+    ts_params = { "sep": '\t', "field_delim": '\n', "units": "metric" }
+    forecast_params = dict(ts_params,
+                           ts_delim='\n---\n',
+                           time_format=time_format,
+                           start_day=0,
+                           end_day=owm.MAX_DAYS - 1)
+
+    records = []
+    for n in range(1, BATCH_SIZE + 1):
+        data = copy.deepcopy(weather)
+        data["name"] = f"City {n}"
+        data["main"]["temp"] += n % 10
+        records.append({ "n": n, "input": f"city {n}", "data": data })
+
+    def render_batch():
+        for record in records:
+            record = dict(record,
+                          data=batch.extract(record["data"],
+                                             default_fields,
+                                             None))
+            batch.format_tsv(record, default_fields)
+
+    values = tuple((f, owm.grep_weather(weather, f)) for f in all_fields)
+
+    return {
+        "parse_conf": lambda: config.parse_conf(conf_path, config.CONF_SPEC),
+        "grep_weather": lambda: [owm.grep_weather(weather, f)
+                                 for f in all_fields],
+        "get_unit": lambda: [owm.get_unit(f, s)
+                             for s in systems for f in all_fields],
+        "format_value": lambda: [output.format_value(f, v, tzinfo,
+                                                     time_format, "metric")
+                                 for f, v in values],
+        "print_ts": lambda: output.print_ts(weather,
+                                            default_fields,
+                                            **ts_params),
+        "print_ts_all": lambda: output.print_ts(weather,
+                                                all_fields,
+                                                **ts_params),
+        "print_forecast": lambda: output.print_forecast(forecast,
+                                                        default_fields,
+                                                        **forecast_params),
+        "print_forecast_all": lambda: output.print_forecast(forecast,
+                                                            all_fields,
+                                                            **forecast_params),
+        "render_batch_10k": render_batch,
+        "json_forecast_raw": lambda: print(output.dumps(forecast)),
+        "json_forecast": lambda: output.print_forecast(forecast,
+                                                       default_fields,
+                                                       fmt="ndjson",
+                                                       **forecast_params),
+    }
+
+def ops_per_sec(func, repeat):
+    """Return the best throughput of a function over 'repeat' timings."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return max(number / t for t in timer.repeat(repeat=repeat, number=number))
+
+def peak_memory(func):
+    """Return the peak memory in bytes allocated by one call."""
+    func() # warm-up, fills caches
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cases", nargs="*", metavar="CASE",
+                        help="cases to run (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-t", "--threshold", type=float, default=THRESHOLD,
+                        help="tolerated slowdown as a fraction of the "
+                        f"baseline (default: {THRESHOLD})")
+    parser.add_argument("--update", action="store_true",
+                        help="write the current measurements as baselines")
+    args = parser.parse_args()
+
+    try:
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baselines = json.load(f)
+    except FileNotFoundError:
+        baselines = {}
+
+    cases = make_cases()
+    unknown = set(args.cases) - set(cases)
+    if unknown:
+        parser.error("unknown cases: " + ', '.join(sorted(unknown)))
+
+    failed = False
+    with open(os.devnull, 'w', encoding="utf-8") as devnull, \
+         contextlib.redirect_stdout(devnull):
+        for name in args.cases or cases:
+            func = cases[name]
+            memory = peak_memory(func)
+            rate = ops_per_sec(func, args.repeat)
+            baseline = baselines.get(name, {}).get("ops_per_sec")
+
+            line = f"{name}: {rate:,.1f} ops/s, {memory / 1024:,.1f} KiB peak"
+            if baseline:
+                change = rate / baseline - 1
+                line += f" ({change:+.1%} vs. {baseline:,.1f} ops/s)"
+                if change < -args.threshold and not args.update:
+                    line += " REGRESSION"
+                    failed = True
+            print(line, file=sys.stderr)
+
+            if args.update:
+                baselines[name] = {
+                    "ops_per_sec": round(rate, 1),
+                    "peak_bytes": memory
+                }
+
+    if args.update:
+        with open(BASELINE_FILE, 'w', encoding="utf-8") as f:
+            json.dump(baselines, f, indent=4)
+            f.write('\n')
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
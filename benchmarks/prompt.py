@@ -0,0 +1,146 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""End-to-end latency of the shell prompt mode (--prompt).
+
+Run 'weather --prompt -f temp' processes against the local API
+stand-in and report latency percentiles (p50, p95) of:
+
+python -- an interpreter doing nothing, the floor of any process
+prompt -- prompts with a fresh value
+prompt_stale -- prompts with a stale value, starting a refresh
+cached -- 'weather -f temp' answered from the response cache
+
+along with the time of the prompt's work in a running interpreter
+(prompt.main()), and the time a stale value takes to be refreshed in
+the background. Caches live in a temporary directory.
+
+usage: python benchmarks/prompt.py [-n RUNS] [--latency MS] [--json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import standin
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+KEY = "0123456789abcdef0123456789abcdef"
+
+sys.path.insert(0, SRC)
+
+from terminal_weather import prompt
+
+def percentile(values, p):
+    """Return the p-th percentile of values (nearest rank)."""
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100)) # ceiling
+    return values[int(rank) - 1]
+
+def latencies(argv, env, runs, before=None):
+    """Return the wall-clock time of 'runs' processes, in seconds."""
+    times = []
+    for _ in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+def wait_for(condition, timeout=10):
+    """Return the seconds until condition() is true, or None."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if condition():
+            return time.perf_counter() - start
+        time.sleep(0.001)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=100,
+                        help="milliseconds added to upstream responses "
+                        "(default: 100)")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    args = parser.parse_args()
+
+    server = standin.StandIn(latency=args.latency / 1000).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            conf = os.path.join(directory, "conf")
+            with open(conf, 'w', encoding="utf-8") as f:
+                f.write(f"api-url={server.url}\nkey={KEY}\n"
+                        "geocoordinates=34.01,-6.83\n")
+            env = dict(os.environ,
+                       PYTHONPATH=SRC,
+                       TERMINAL_WEATHER_NO_DAEMON="1",
+                       XDG_CACHE_HOME=os.path.join(directory, "cache"),
+                       XDG_STATE_HOME=os.path.join(directory, "state"))
+            options = ["--prompt", "-c", conf, "-f", "temp"]
+            command = [sys.executable, "-m", "terminal_weather"]
+
+            os.environ["XDG_CACHE_HOME"] = env["XDG_CACHE_HOME"]
+            os.environ["TERMINAL_WEATHER_CF"] = ''
+            path = prompt.entry_path(options)
+
+            # the first prompt has no value yet, and starts a refresh
+            start = time.perf_counter()
+            subprocess.run(command + options, env=env, check=True)
+            if wait_for(lambda: os.path.exists(path)
+                        and not os.path.exists(path + ".lock")) is None:
+                sys.exit("the background refresh didn't complete")
+            refresh = time.perf_counter() - start
+
+            def make_stale():
+                with contextlib.suppress(OSError):
+                    os.unlink(path + ".lock")
+                prompt.write(path, "20 °C", -1)
+
+            with open(os.devnull, 'w', encoding="utf-8") as devnull, \
+                 contextlib.redirect_stdout(devnull):
+                prompt.write(path, "20 °C", 3600)
+                timer = timeit.Timer(lambda: prompt.main(options))
+                number, _ = timer.autorange()
+                in_process = min(timer.repeat(repeat=5, number=number)) \
+                    / number
+
+            results = {
+                "python": latencies([sys.executable, "-c", "pass"],
+                                    env,
+                                    args.runs),
+                "prompt": latencies(command + options, env, args.runs),
+                "prompt_stale": latencies(command + options,
+                                          env,
+                                          args.runs,
+                                          before=make_stale),
+                "cached": latencies(command + options[1:], env, args.runs),
+            }
+            wait_for(lambda: not os.path.exists(path + ".lock"))
+    finally:
+        server.stop()
+
+    report = { "runs": args.runs }
+    for name, times in results.items():
+        for p in (50, 95):
+            report[f"{name}_p{p}_ms"] = round(percentile(times, p) * 1000, 2)
+    report["prompt_main_us"] = round(in_process * 1e6, 1)
+    report["first_refresh_ms"] = round(refresh * 1000, 1)
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+
+    for name, value in report.items():
+        print(f"{name}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Burst of independent processes against a rate-limited API stand-in.
+
+Start 'weather --refresh --timings' processes all at once, as cron jobs
+and status bars do at the top of a minute, against the local API
+stand-in allowing 'limit' calls per minute per key, first without the
+host-wide rate limit, then with it (host-rate-limit=LIMIT), and report
+for each run the upstream 429 responses, the processes that got data,
+that failed, and the time each one waited for a token (p50, p95, max,
+from the "ratelimit" phase of their timings). Caches live in a temporary
+directory. The limiter's state is kept in the user's runtime directory,
+under a random key per run, so that runs don't share it.
+
+usage: python benchmarks/ratelimit.py [-n PROCESSES] [--limit CALLS]
+                                      [--wait SECONDS] [--json]
+"""
+
+import argparse
+import json
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import standin
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+
+def percentile(values, p):
+    """Return the p-th percentile of sorted values (nearest rank)."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * p // 100)) # ceiling
+    return values[int(rank) - 1]
+
+def burst(server, directory, name, args, host_limit):
+    """Run a burst of processes, return a dictionary of its results."""
+    conf = os.path.join(directory, f"{name}.conf")
+    with open(conf, 'w', encoding="utf-8") as f:
+        # a key per run, so that runs don't share the stand-in's limit
+        f.write(f"api-url={server.url}\nkey={secrets.token_hex(16)}\n"
+                "geocoordinates=34.01,-6.83\nretries=0\n"
+                f"host-rate-limit={host_limit}\n"
+                f"rate-limit-wait={args.wait}\n")
+    env = dict(os.environ,
+               PYTHONPATH=SRC,
+               TERMINAL_WEATHER_NO_DAEMON="1",
+               XDG_CACHE_HOME=os.path.join(directory, "cache"),
+               XDG_STATE_HOME=os.path.join(directory, "state"))
+    command = [sys.executable, "-m", "terminal_weather", "-c", conf,
+               "--refresh", "--timings", "-f", "temp"]
+
+    before = stats(server)
+    start = time.perf_counter()
+    processes = [subprocess.Popen(command,
+                                  env=env,
+                                  stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE,
+                                  text=True)
+                 for _ in range(args.processes)]
+    waits = []
+    failed = 0
+    for process in processes:
+        _, stderr = process.communicate()
+        failed += process.returncode != 0
+        for line in stderr.splitlines():
+            if line.startswith('{'):
+                phase = json.loads(line)["phases"].get("ratelimit")
+                waits.append(phase["ms"] if phase else 0)
+    elapsed = time.perf_counter() - start
+    after = stats(server)
+
+    waits.sort()
+    return {
+        "upstream_429": after.get("429", 0) - before.get("429", 0),
+        "ok": args.processes - failed,
+        "failed": failed,
+        "wait_p50_ms": percentile(waits, 50),
+        "wait_p95_ms": percentile(waits, 95),
+        "wait_max_ms": waits[-1] if waits else None,
+        "elapsed_s": round(elapsed, 1),
+    }
+
+def stats(server):
+    """Return the weather responses of the stand-in per status code."""
+    with urllib.request.urlopen(server.url + "/stats") as response:
+        return json.load(response).get("weather", {})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--processes", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=12,
+                        help="calls per minute allowed by the stand-in "
+                        "and the host-wide limit (default: 12)")
+    parser.add_argument("--wait", type=float, default=20,
+                        help="rate-limit-wait in seconds (default: 20)")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    args = parser.parse_args()
+
+    server = standin.StandIn(rate_limit=args.limit).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            report = {
+                "processes": args.processes,
+                "limit": args.limit,
+                "unlimited": burst(server, directory, "unlimited", args, 0),
+                "host": burst(server, directory, "host", args, args.limit),
+            }
+    finally:
+        server.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+
+    for run in ("unlimited", "host"):
+        for name, value in report[run].items():
+            print(f"{run}_{name}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Local stand-in for the OpenWeatherMap API and a geoip provider.
+
+Serve the recorded responses in fixtures/ for the geocoding, current
+weather and forecast endpoints (under the same paths as the real API)
+and for /geoip, with simulated latency, per-key rate limiting and random
+failures. Forecast timestamps are moved to start in the next 3 hours, so
+that any day range matches, and values recorded in metric units are
+converted to the requested units. /stats returns the number of requests
+answered per endpoint and status code.
+
+Point the program at it with, in the configuration file:
+
+    api-url=http://127.0.0.1:PORT
+    geoip-url=http://127.0.0.1:PORT/geoip
+    geoip-fields=latitude,longitude,countryName,countryCode,cityName
+
+usage: python benchmarks/standin.py [-p PORT] [--latency MS] [--jitter MS]
+                                    [--rate-limit CALLS] [--error-rate P]
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+INTERVAL = 3 * 60 * 60 # seconds between forecast timestamps
+ENDPOINTS = {
+    "/geo/1.0/direct": "geo",
+    "/data/2.5/weather": "weather",
+    "/data/2.5/forecast": "forecast",
+    "/geoip": "geoip",
+}
+NOT_FOUND = "nowhere" # geocoding queries starting with it find nothing
+TEMPERATURES = ("temp", "feels_like", "temp_min", "temp_max")
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+def to_units(weather_dict, units):
+    """Convert the values of a recorded weather dictionary from metric."""
+    if units == "metric":
+        return weather_dict
+
+    main = dict(weather_dict.get("main") or {})
+    wind = dict(weather_dict.get("wind") or {})
+    for key in TEMPERATURES:
+        if key in main:
+            main[key] = round(main[key] * 1.8 + 32 if units == "imperial"
+                              else main[key] + 273.15, 2)
+    if units == "imperial":
+        for key in ("speed", "gust"):
+            if key in wind:
+                wind[key] = round(wind[key] * 2.2369363, 2)
+    return dict(weather_dict, main=main, wind=wind)
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # headers and body are sent separately
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=()):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(self.endpoint, status)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        self.endpoint = ENDPOINTS.get(url.path)
+        server = self.server
+
+        if url.path == "/stats":
+            return self.send_json(200, server.stats())
+        if self.endpoint is None:
+            return self.send_json(404, { "cod": 404,
+                                         "message": "Internal error" })
+
+        server.delay()
+
+        if self.endpoint != "geoip":
+            key = params.get("appid")
+            if not key:
+                return self.send_json(401, {
+                    "cod": 401,
+                    "message": "Invalid API key. Please see "
+                    "https://openweathermap.org/faq#error401 for more info."
+                })
+            retry_after = server.limit(key)
+            if retry_after:
+                return self.send_json(429, {
+                    "cod": 429,
+                    "message": "Your account is temporary blocked due to "
+                    "exceeding of requests limitation of your subscription "
+                    "type."
+                }, headers=(("Retry-After", str(retry_after)),))
+
+        if random.random() < server.error_rate:
+            return self.send_json(random.choice((500, 502, 503)), {
+                "cod": 500,
+                "message": "Internal error"
+            })
+
+        return self.send_json(200, getattr(self, self.endpoint)(params))
+
+    def geo(self, params):
+        city = params.get("q", '').split(',')[0]
+        if not city or city.casefold().startswith(NOT_FOUND):
+            return []
+        # distinct cities get distinct geocoordinates near the recorded ones
+        offset = zlib.crc32(city.casefold().encode("utf-8")) % 10000 / 1000
+        return [dict(location,
+                     name=city.title(),
+                     lat=round(location["lat"] + offset, 4),
+                     lon=round(location["lon"] - offset, 4))
+                for location in self.server.fixtures["geo"]]
+
+    def weather(self, params):
+        data = dict(to_units(self.server.fixtures["weather"],
+                             params.get("units")),
+                    dt=int(time.time()))
+        if "lat" in params and "lon" in params:
+            data["coord"] = { "lat": float(params["lat"]),
+                              "lon": float(params["lon"]) }
+        return data
+
+    def forecast(self, params):
+        data = self.server.fixtures["forecast"]
+        timestamps = data["list"]
+        offset = (time.time() // INTERVAL + 1) * INTERVAL - timestamps[0]["dt"]
+        cnt = int(params.get("cnt") or len(timestamps))
+        timestamps = [dict(to_units(ts, params.get("units")),
+                           dt=int(ts["dt"] + offset))
+                      for ts in timestamps[:cnt]]
+        return dict(data, cnt=len(timestamps), list=timestamps)
+
+    def geoip(self, params):
+        return self.server.fixtures["geoip"]
+
+class StandIn(ThreadingHTTPServer):
+    """The stand-in server.
+
+    Keyword arguments:
+    latency -- seconds added to every response
+    jitter -- maximum seconds added at random to the latency
+    rate_limit -- calls per minute allowed for each API key, or None;
+    further calls in the same minute get a 429 response with Retry-After
+    error_rate -- probability of answering with a server error
+    """
+
+    daemon_threads = True
+
+    def __init__(self,
+                 address=("127.0.0.1", 0),
+                 latency=0,
+                 jitter=0,
+                 rate_limit=None,
+                 error_rate=0):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.fixtures = dict(
+            (name, load_fixture(f"{name}.json"))
+            for name in ("geo", "weather", "forecast", "geoip")
+        )
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.windows = {} # API key: (start of minute, number of calls)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self):
+        seconds = self.latency + random.uniform(0, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def limit(self, key):
+        """Count a call made with an API key.
+
+        Return the number of seconds to wait if it's over the rate limit,
+        otherwise 0.
+        """
+        if not self.rate_limit:
+            return 0
+
+        now = time.time()
+        with self.lock:
+            start, calls = self.windows.get(key, (now, 0))
+            if now - start >= 60:
+                start, calls = now, 0
+            self.windows[key] = (start, calls + 1)
+
+        if calls < self.rate_limit:
+            return 0
+        return max(1, round(start + 60 - now))
+
+    def count(self, endpoint, status):
+        with self.lock:
+            self.counts[endpoint, status] += 1
+
+    def stats(self):
+        """Return a dictionary of endpoint: {status code: requests}."""
+        with self.lock:
+            counts = dict(self.counts)
+        result = {}
+        for (endpoint, status), n in counts.items():
+            result.setdefault(endpoint, {})[str(status)] = n
+        return result
+
+    def calls(self):
+        """Return the number of requests answered by API endpoints."""
+        with self.lock:
+            return sum(n for (endpoint, _), n in self.counts.items()
+                       if endpoint)
+
+    def start(self):
+        """Serve requests in a background thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-p", "--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0,
+                        help="milliseconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="maximum milliseconds added at random")
+    parser.add_argument("--rate-limit", type=int,
+                        help="calls per minute allowed for each API key")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="probability of answering with a server error")
+    args = parser.parse_args()
+
+    server = StandIn(("127.0.0.1", args.port),
+                     latency=args.latency / 1000,
+                     jitter=args.jitter / 1000,
+                     rate_limit=args.rate_limit,
+                     error_rate=args.error_rate)
+    print(f"Serving on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
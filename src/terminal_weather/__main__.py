@@ -1,6 +1,6 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from .cli import main
+from .client import main
 
 if __name__ == "__main__":
     main()
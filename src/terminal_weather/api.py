@@ -0,0 +1,541 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Embeddable weather client, with coroutines for asyncio programs.
+
+    async with api.Client(key=["..."], units="metric") as client:
+        data = await client.current("Paris,FR")
+        print(await client.render(data, fields=("city", "temp")))
+
+The coroutines resolve(), current(), forecast() and render() can be
+awaited concurrently by any number of tasks of one event loop. Blocking
+work (HTTP requests, cache files) runs in a thread pool of 'workers'
+threads, over one keep-alive transport, key pool, retry policy and
+on-disk cache shared by all clients of the process with the same
+settings. Concurrent identical requests are sent once, and their result
+given to every caller.
+
+Failures are raised as subclasses of Error, the program is never exited
+and nothing is ever printed or prompted. The command-line program is a
+wrapper around the blocking methods of the same class.
+"""
+
+import asyncio
+import atexit
+
+from functools import partial
+from . import config
+from . import owm
+from . import timings
+from . import util
+
+SHARED = {} # key pools, transports and policies, reused across clients
+
+class Error(Exception):
+    """Base class of the errors raised by clients."""
+
+class ConfigError(Error, ValueError):
+    """Invalid or missing settings, e.g. no API keys."""
+
+class LocationError(Error, LookupError):
+    """An invalid location string, or one unknown to the geocoding API."""
+
+class UpstreamError(Error):
+    """A failed request: network error, error response or invalid data.
+
+    status -- HTTP status code of the response, None if there was none
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class Unavailable(UpstreamError):
+    """No request was made: the service keeps failing (its circuit is
+    open), every API key is suspended or over its quota, or the host-wide
+    rate limit would delay it more than 'rate-limit-wait' seconds."""
+
+def translate(exception):
+    """Return the Error matching an exception raised by a request."""
+    from . import keys, ratelimit, retry
+
+    if isinstance(exception, Error):
+        return exception
+    if isinstance(exception, (retry.CircuitOpen,
+                              keys.Exhausted,
+                              ratelimit.Saturated)):
+        return Unavailable(str(exception))
+    status = keys.status_code(exception)
+    if status is not None or isinstance(exception, (OSError, ValueError)):
+        return UpstreamError(str(exception) or type(exception).__name__,
+                             status)
+    return exception
+
+def make_pool(get_value, api_keys):
+    from . import keys, ratelimit
+
+    rate = get_value("rate-limit")
+    quota = get_value("monthly-quota")
+    settings = ("pool",
+                tuple(api_keys),
+                int(rate) if rate else ratelimit.CALLS_PER_MINUTE,
+                int(quota) if quota else keys.MONTHLY_QUOTA,
+                *ratelimit.host_limit(get_value))
+
+    if settings not in SHARED:
+        pool = keys.KeyPool(settings[1],
+                            calls_per_minute=settings[2],
+                            monthly_quota=settings[3],
+                            usage_path=keys.usage_file(),
+                            host_calls=settings[4],
+                            max_wait=settings[5])
+        atexit.register(pool.save)
+        SHARED[settings] = pool
+    return SHARED[settings]
+
+def make_transport(get_value):
+    from . import transport
+
+    connect_timeout = get_value("connect-timeout")
+    read_timeout = get_value("read-timeout")
+    settings = ("transport",
+                float(connect_timeout) if connect_timeout
+                else transport.CONNECT_TIMEOUT,
+                float(read_timeout) if read_timeout
+                else transport.READ_TIMEOUT,
+                max(transport.POOL_SIZE, int(get_value("workers"))))
+
+    if settings not in SHARED:
+        SHARED[settings] = transport.Transport(*settings[1:])
+    return SHARED[settings]
+
+def make_policy(get_value):
+    from . import retry
+
+    def number(name, default, kind=float):
+        value = get_value(name)
+        return kind(value) if value else default
+
+    settings = ("policy",
+                number("retries", retry.RETRIES, int),
+                number("retry-backoff", retry.BACKOFF),
+                number("retry-backoff-max", retry.BACKOFF_MAX),
+                number("retry-deadline", retry.DEADLINE),
+                number("breaker-threshold", retry.BREAKER_THRESHOLD, int),
+                number("breaker-cooldown", retry.BREAKER_COOLDOWN))
+
+    if settings not in SHARED:
+        SHARED[settings] = retry.RetryPolicy(*settings[1:])
+    return SHARED[settings]
+
+def bind(func, pool, http, api_url=None, policy=None):
+    """Bind an owm request function to a transport and the key pool.
+
+    Keyword arguments:
+    api_url -- base URL of the OpenWeatherMap API (default: owm.API_URL)
+    policy -- a retry.RetryPolicy retrying failed calls, if any
+    """
+    func = pool.wrap(partial(func, http, api_url=api_url))
+    return policy.wrap("OpenWeatherMap", func) if policy else func
+
+def open_gazetteer(get_value):
+    """Return the gazetteer.Gazetteer of the 'gazetteer' entry, or None.
+
+    None is returned if no index was built at the default path. Indexes
+    are shared until their file changes.
+    """
+    import os
+    from . import gazetteer
+
+    path = get_value("gazetteer") or gazetteer.index_file()
+    try:
+        settings = ("gazetteer", path, os.stat(path).st_mtime_ns)
+    except OSError:
+        if get_value("gazetteer"):
+            raise ConfigError(f"no gazetteer index at {path}") from None
+        return None
+
+    if settings not in SHARED:
+        try:
+            SHARED[settings] = gazetteer.Gazetteer(path)
+        except (OSError, ValueError) as e:
+            raise ConfigError(str(e)) from e
+    return SHARED[settings]
+
+def parse_coords(coords):
+    """Return a tuple (latitude, longitude) of floats.
+
+    coords -- a sequence of two numbers, or a string: latitude,longitude
+    """
+    if isinstance(coords, str):
+        coords = util.separate(coords)
+    try:
+        lat, lon = map(float, coords)
+    except (TypeError, ValueError):
+        raise LocationError(f"invalid geocoordinates: {coords}") from None
+    return lat, lon
+
+class Client:
+    """A weather client, safe to share between threads and tasks.
+
+    Settings are configuration entries (see README), given as keyword
+    arguments with underscores instead of dashes, e.g. key=["..."] or
+    api_url="http://localhost:8080". Entries that aren't given are
+    looked up with 'lookup', if any, or take their default value.
+
+    Keyword argument:
+    lookup -- a function returning the value of a configuration entry,
+    as made by config.init_conf()
+    """
+
+    def __init__(self, lookup=None, **entries):
+        def get_value(name):
+            value = entries.get(name.replace('-', '_'))
+            if value is not None:
+                return value
+            return lookup(name) if lookup else config.DEFAULTS.get(name)
+
+        api_keys = get_value("key")
+        if isinstance(api_keys, str):
+            api_keys = (api_keys,)
+        if not api_keys:
+            raise ConfigError("unable to find any API keys")
+
+        self.get_value = get_value
+        try:
+            self.units = get_value("units")
+            if self.units not in owm.SYSTEMS:
+                raise ValueError(f"invalid units: {self.units}")
+            self.use_cache = not get_value("no-cache")
+            self.refresh = bool(get_value("refresh"))
+            self.workers = int(get_value("workers"))
+            if self.workers < 1:
+                raise ValueError(f"invalid number of workers: {self.workers}")
+            self.pool = make_pool(get_value, api_keys)
+            self.http = make_transport(get_value)
+            self.policy = make_policy(get_value)
+            self.gazetteer = open_gazetteer(get_value)
+            self.snapper = None
+            if get_value("snap"):
+                from . import spatial
+                self.snapper = spatial.make_snapper(get_value("snap"))
+                self.coalescer = spatial.Coalescer()
+            self.history = None
+            if get_value("record-history"):
+                from . import history
+                self.history = get_value("history-dir") \
+                    or history.history_dir()
+        except ValueError as e:
+            raise ConfigError(str(e)) from e
+
+        api_url = get_value("api-url")
+        self.geo_func = bind(owm.geo_direct,
+                             self.pool,
+                             self.http,
+                             api_url,
+                             self.policy)
+        self.data_funcs = dict(
+            (endpoint, bind(getattr(owm, endpoint),
+                            self.pool,
+                            self.http,
+                            api_url,
+                            self.policy))
+            for endpoint in ("weather", "forecast")
+        )
+        self.executor = None
+        self.inflight = {}
+
+    def ttl(self, entry, namespace):
+        """Return the 'ttl' entry, or the default TTL of a namespace."""
+        from . import cache
+
+        ttl = self.get_value(entry)
+        return int(ttl) if ttl else cache.TTL[namespace]
+
+    def locate(self, city, country=''):
+        """Return the coordinates (latitude, longitude) of a location.
+
+        Places of the gazetteer index, if any, and cached coordinates are
+        returned without any request, see geocode.resolve().
+        """
+        from . import geocode
+
+        if self.gazetteer:
+            with timings.phase("gazetteer"):
+                place = self.gazetteer.find(city, country)
+            if place:
+                return place[2], place[3]
+
+        try:
+            return geocode.resolve(city,
+                                   self.geo_func,
+                                   country=country,
+                                   use_cache=self.use_cache,
+                                   ttl=self.ttl("geocode-ttl",
+                                                geocode.NAMESPACE))
+        except LookupError as e:
+            raise LocationError(str(e)) from e
+        except Exception as e:
+            raise translate(e) from e
+
+    def place_name(self, coords):
+        """Return the name of the nearest place of the gazetteer, if any.
+
+        Places farther than gazetteer.NEAREST_DISTANCE are ignored.
+        """
+        from . import gazetteer
+
+        if not self.gazetteer:
+            return None
+        try:
+            coords = parse_coords(coords)
+        except LocationError:
+            return None
+        with timings.phase("gazetteer"):
+            place = self.gazetteer.nearest(*coords,
+                                           gazetteer.NEAREST_DISTANCE)
+        return place and place[0]
+
+    def get(self, endpoint, coords, days=None, refresh=False):
+        """Return an API response, from the cache if it's fresh enough.
+
+        Values are converted to the 'units' system. With the 'snap'
+        entry, coordinates are replaced by the center of their cell, and
+        a single request is made for all the coordinates of a cell, see
+        spatial.py.
+
+        Positional arguments:
+        endpoint -- "weather" or "forecast"
+        coords -- a tuple: (latitude, longitude)
+
+        Keyword arguments:
+        days -- the day range of a forecast, only used to request fewer
+        timestamps when the response isn't cached
+        refresh -- ignore cached responses (new ones are still stored)
+        """
+        if self.snapper is None:
+            data = self.fetch(endpoint, coords, days, refresh)
+        else:
+            cell, coords = self.snapper(*parse_coords(coords))
+            timings.cell(endpoint, cell)
+            key = (endpoint,
+                   cell,
+                   None if self.use_cache or not days else days[-1])
+            # responses kept by the coalescer were fetched during this
+            # run, so they are fresh enough for the 'refresh' entry
+            data = self.coalescer.call(key,
+                                       self.ttl(f"{endpoint}-ttl", endpoint),
+                                       self.fetch,
+                                       endpoint,
+                                       coords,
+                                       days,
+                                       refresh,
+                                       fresh=refresh)
+
+        with timings.phase("convert"):
+            return owm.convert(data, self.units)
+
+    def fetch(self, endpoint, coords, days=None, refresh=False):
+        """Like get(), without snapping coordinates nor converting units.
+
+        Responses are requested, cached and recorded in owm.FETCHED
+        units, so that all unit systems share them.
+        """
+        from . import cache
+
+        api_params = { "units": owm.FETCHED }
+
+        try:
+            with timings.phase(endpoint):
+                if not self.use_cache:
+                    if days:
+                        api_params["cnt"] = util.count_ts(days[-1])
+                    return self.request(endpoint, coords, api_params)
+
+                key = cache.make_key(endpoint,
+                                     cache.round_coords(coords),
+                                     api_params.get("units"))
+
+                if not (refresh or self.refresh):
+                    data = cache.load(endpoint,
+                                      key,
+                                      ttl=self.ttl(f"{endpoint}-ttl",
+                                                   endpoint))
+                    if data is not None:
+                        return data
+
+                # a cached full forecast answers any day range
+                data = self.request(endpoint, coords, api_params)
+                max_size = self.get_value("cache-size")
+                cache.store(endpoint,
+                            key,
+                            data,
+                            max_size=int(max_size) if max_size
+                            else cache.MAX_SIZE)
+                return data
+        except Exception as e:
+            raise translate(e) from e
+
+    def request(self, endpoint, coords, api_params):
+        """Request an API response, and record it in the history store.
+
+        The response is only recorded with the 'record-history' entry.
+        """
+        data = self.data_funcs[endpoint](*coords, **api_params)
+        if self.history:
+            from . import history
+            with timings.phase("history"):
+                history.record(self.history,
+                               coords,
+                               api_params["units"],
+                               endpoint,
+                               data)
+        return data
+
+    def format(self, data, fields=None, days=None, fmt=None):
+        """Return a response of get() as printed by the program.
+
+        Keyword arguments:
+        fields -- field names (default: the 'fields' entry)
+        days -- the day range of a forecast, whose timestamps are shown
+        (default: all of them)
+        fmt -- one of output.FORMATS (default: the 'format' entry)
+        """
+        from . import output
+
+        fields = tuple(fields or
+                       util.separate(self.get_value("fields") or "city"))
+        if fields == ("all",):
+            fields = owm.list_fields()
+        invalid = tuple(f for f in fields if f not in owm.FIELD_SET)
+        if invalid:
+            raise ConfigError("invalid fields: " + ' '.join(invalid))
+
+        fmt = fmt or self.get_value("format") or "table"
+        if fmt not in output.FORMATS:
+            raise ConfigError(f"invalid format: {fmt}")
+
+        params = { "sep": '\t',
+                   "field_delim": '\n',
+                   "units": self.units,
+                   "fmt": fmt }
+
+        if "list" not in data:
+            return output.render_ts(data, fields, **params)
+        if not data["list"]:
+            return ''
+
+        days = days or (0, owm.MAX_DAYS)
+        return output.render_forecast(data,
+                                      fields,
+                                      ts_delim="\n---\n",
+                                      time_format=self.get_value(
+                                          "time-format"
+                                      ),
+                                      start_day=days[0],
+                                      end_day=days[-1],
+                                      **params)
+
+    async def call(self, func, *args):
+        """Await func(*args), run in the client's thread pool."""
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="terminal-weather"
+            )
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            timings.inherit(partial(func, *args))
+        )
+
+    async def shared(self, key, func, *args):
+        """Like call(), but joining an identical call in progress, if any.
+
+        Cancelling a caller doesn't cancel the call for the others.
+        """
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.call(func, *args))
+            self.inflight[key] = task
+
+            def done(task):
+                if self.inflight.get(key) is task:
+                    del self.inflight[key]
+                if not task.cancelled():
+                    task.exception() # retrieved, even if nobody awaits
+            task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    async def resolve(self, location):
+        """Return the coordinates of a location string: city[,country]."""
+        try:
+            city, country = util.split_location(location)
+        except ValueError as e:
+            raise LocationError(str(e)) from e
+        key = ("geo", city.strip().casefold(), country.strip().casefold())
+        return await self.shared(key, self.locate, city, country)
+
+    async def coords(self, where):
+        """Return coordinates of a location string, or parse them.
+
+        where -- city[,country], latitude,longitude, or a sequence of two
+        numbers
+        """
+        if isinstance(where, str):
+            try:
+                return parse_coords(where)
+            except LocationError:
+                return await self.resolve(where)
+        return parse_coords(where)
+
+    async def current(self, where, refresh=False):
+        """Return the current weather API response of a location.
+
+        where -- as in coords()
+        refresh -- ignore cached responses
+        """
+        coords = await self.coords(where)
+        key = ("weather", coords, refresh)
+        return await self.shared(key,
+                                 self.get,
+                                 "weather",
+                                 coords,
+                                 None,
+                                 refresh)
+
+    async def forecast(self, where, days=None, refresh=False):
+        """Return the forecast API response of a location.
+
+        where -- as in coords()
+        days -- a day range (start, end), or a single day (default: all)
+        refresh -- ignore cached responses
+        """
+        coords = await self.coords(where)
+        days = tuple(days) if days else (0, owm.MAX_DAYS)
+        key = ("forecast", coords, refresh, self.use_cache or days)
+        return await self.shared(key,
+                                 self.get,
+                                 "forecast",
+                                 coords,
+                                 days,
+                                 refresh)
+
+    async def render(self, data, fields=None, days=None, fmt=None):
+        """Return data of current() or forecast() formatted as text.
+
+        See format() for the keyword arguments.
+        """
+        return self.format(data, fields=fields, days=days, fmt=fmt)
+
+    def close(self):
+        """Stop the thread pool (shared transports are kept open)."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,151 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Concurrent weather lookups for many locations.
+
+Input lines are locations of the form city[,country] or geocoordinates
+of the form latitude,longitude. Results are written as soon as they are
+available, one record per location, in NDJSON or TSV format. Failures
+are written as error records instead of aborting the whole batch.
+"""
+
+import csv
+import io
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from . import output
+from . import owm
+from . import timings
+from . import util
+
+def parse_line(line):
+    """Parse an input line.
+
+    Return a tuple: ("coords", (latitude, longitude)) or
+    ("location", (city, country)).
+    """
+    parts = util.separate(line)
+    if len(parts) == 2:
+        try:
+            return "coords", tuple(map(float, parts))
+        except ValueError:
+            pass
+    return "location", util.split_location(line)
+
+def extract(weather_data, fields, days):
+    """Make a flat dictionary of field values from an API response.
+
+    Forecasts are reduced to the timestamps within the day range, stored
+    as a list under the key "list".
+    """
+    if not days:
+        return dict((f, owm.grep_weather(weather_data, f)) for f in fields)
+
+    global_fields = ("city", "sunrise", "sunset")
+    data = dict((f, owm.grep_forecast(weather_data, f))
+                for f in fields if f in global_fields)
+    data["list"] = [
+        dict((f, owm.grep_weather(ts, f))
+             for f in ("dt", *fields) if f not in global_fields)
+        for ts in output.select_days(weather_data, days[0], days[-1])
+    ]
+    return data
+
+def make_processor(resolve, fetch, fields, days):
+    """Make a function turning an input line into a result record.
+
+    Positional arguments:
+    resolve -- a function: (city, country) -> (latitude, longitude)
+    fetch -- a function: (latitude, longitude) -> API response
+    fields -- field names to extract
+    days -- a day range for forecasts, or None for current weather
+    """
+    def process(n, line):
+        record = { "n": n, "input": line }
+        try:
+            kind, value = parse_line(line)
+            coords = value if kind == "coords" else resolve(*value)
+            record["lat"], record["lon"] = coords
+            record["data"] = extract(fetch(*coords), fields, days)
+        except Exception as e:
+            record["error"] = str(e) or type(e).__name__
+        return record
+    return process
+
+def format_ndjson(record, fields):
+    return output.dumps(record) + '\n'
+
+def rows(record, fields):
+    """Return the rows of a record: n, input, status, values...
+
+    Forecasts take one row per timestamp, with the timestamp's values
+    following global fields (city, sunrise, sunset).
+    """
+    head = (record["n"], record["input"])
+
+    if "error" in record:
+        return [(*head, "error", record["error"])]
+
+    data = record["data"]
+    if "list" not in data:
+        return [(*head, "ok", *(data[f] for f in fields))]
+
+    glob = tuple(data[f] for f in fields if f in data and f != "list")
+    return [
+        (*head, "ok", *glob, *ts.values()) for ts in data["list"]
+    ] or [(*head, "ok", *glob)]
+
+def format_tsv(record, fields):
+    """Format a record as TSV lines, see rows()."""
+    return ''.join(
+        '\t'.join(
+            str(v).replace('\t', ' ').replace('\n', ' ') if v is not None
+            else '-'
+            for v in row
+        ) + '\n'
+        for row in rows(record, fields)
+    )
+
+def format_csv(record, fields):
+    """Format a record as CSV lines, see rows()."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(
+        ('' if v is None else v for v in row) for row in rows(record, fields)
+    )
+    return buffer.getvalue()
+
+FORMATS = { "ndjson": format_ndjson, "tsv": format_tsv, "csv": format_csv }
+
+def run(lines, process, write, workers):
+    """Process input lines concurrently and write records as they complete.
+
+    At most 2 * workers lines are in flight at a time, so memory use
+    doesn't depend on the length of the input. Blank lines and lines
+    starting with '#' are skipped. Return the number of error records.
+    """
+    errors = 0
+
+    def flush(done):
+        nonlocal errors
+        for future in done:
+            record = future.result()
+            errors += "error" in record
+            write(record)
+
+    process = timings.inherit(process)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for n, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            pending.add(executor.submit(process, n, line))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                flush(done)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            flush(done)
+
+    return errors
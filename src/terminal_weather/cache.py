@@ -0,0 +1,125 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Persistent on-disk cache for API responses.
+
+Entries are JSON files grouped by namespace (e.g. "weather", "forecast")
+under the XDG cache directory. Reads never fail: a missing, expired or
+corrupted entry is reported as a cache miss.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from . import timings
+
+MAX_SIZE = 4 * 1024 * 1024 # default size limit of a namespace in bytes
+PRECISION = 2 # decimal places kept from coordinates in cache keys (~1km)
+
+TTL = {
+    # seconds before an entry expires, None means never
+    "weather": 10 * 60, # OWM updates current weather every ~10 minutes
+    "forecast": 60 * 60,
+    "geo": None, # coordinates of a city never change
+    "geoip": 30 * 60, # the public IP address may change
+}
+
+def cache_dir(namespace=''):
+    """Return the cache directory of a namespace (it may not exist yet)."""
+    base = os.getenv("XDG_CACHE_HOME")
+    if not base:
+        base = os.path.join(os.getenv("HOME") or tempfile.gettempdir(),
+                            ".cache")
+    return os.path.join(base, "terminal-weather", namespace)
+
+def make_key(*parts):
+    """Make a file-name-safe key from JSON-serializable parts."""
+    raw = json.dumps(parts, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def round_coords(coords, precision=PRECISION):
+    return tuple(round(float(c), precision) for c in coords)
+
+def entry_path(namespace, key):
+    return os.path.join(cache_dir(namespace), key + ".json")
+
+def load(namespace, key, ttl=None):
+    """Return cached data of a key, or None if missing or older than ttl."""
+    data = None
+    try:
+        with open(entry_path(namespace, key), encoding="utf-8") as f:
+            entry = json.load(f)
+        if ttl is None or time.time() - entry["time"] <= ttl:
+            data = entry["data"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    timings.cache_lookup(namespace, data is not None)
+    return data
+
+def store(namespace, key, data, max_size=MAX_SIZE):
+    """Atomically write data to the cache, then enforce the size limit.
+
+    Errors are silently ignored since caching is only an optimization.
+    """
+    directory = cache_dir(namespace)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding="utf-8") as f:
+                json.dump({ "time": time.time(), "data": data }, f)
+            os.replace(tmp, entry_path(namespace, key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if max_size is not None:
+            evict(namespace, max_size)
+    except OSError:
+        pass
+
+def evict(namespace, max_size):
+    """Delete least recently written entries until total size <= max_size."""
+    directory = cache_dir(namespace)
+    entries = []
+    total = 0
+    try:
+        with os.scandir(directory) as it:
+            for e in it:
+                if e.name.endswith(".json") and e.is_file():
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+                    total += st.st_size
+    except OSError:
+        return
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
+
+def invalidate(namespace, key=None):
+    """Delete one entry, or every entry of a namespace if key is None."""
+    if key is not None:
+        paths = (entry_path(namespace, key),)
+    else:
+        try:
+            directory = cache_dir(namespace)
+            paths = tuple(os.path.join(directory, name)
+                          for name in os.listdir(directory)
+                          if name.endswith(".json"))
+        except OSError:
+            return
+
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -1,16 +1,18 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import argparse
-import json
+import os
 import sys
-import owmlib
 
-from requests.exceptions import ConnectionError
+from functools import partial
 from . import config
-from . import output
 from . import owm
 from . import util
 
+# Other modules are imported where they are needed, so that runs which
+# end early (--help, --version, usage errors, daemon queries) don't pay
+# for importing the HTTP stack and formatting machinery.
+
 VERSION = "Terminal-weather version 0.1.1"
 COPYRIGHT = """Copyright (C) 2026 Hassan El anabi
 Terminal-weather comes with ABSOLUTELY NO WARRANTY.
@@ -18,20 +20,52 @@ You may redistribute copies of Terminal-weather
 under the terms of the GNU General Public License.
 For more information about these matters, see the file named COPYING."""
 
-def parse_args():
+EXPORTER_ADDRESS = "localhost:9750"
+# options of 'weather history' without a value
+HISTORY_FLAGS = ("-h", "--help", "--forecasts", "--list")
+
+def positive_int(text):
+    """Parse an argument that must be an integer of at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid positive integer: {text}")
+    return value
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         prog="weather",
-        description="Get current weather and forecasts for upcoming days"
+        description="Get current weather and forecasts for upcoming days",
+        epilog="Run 'weather history -h' to query data recorded with the "
+        "'record-history' entry."
     )
     period_meg = parser.add_mutually_exclusive_group()
     period_meg.add_argument("when", nargs="?",
                         choices=["now", "today", "tomorrow", "forecast"],
                         help="show weather data for the specified time period"
                         f" (default: {config.DEFAULTS['when']})")
+    parser.add_argument("-b", "--batch", nargs="?", const='-', metavar="FILE",
+                        help="read locations or geocoordinates from FILE "
+                        "(default: stdin), one per line, and print one "
+                        "record per line as TSV (or NDJSON with --json)")
+    parser.add_argument("--build-gazetteer", metavar="FILE",
+                        help="compile a GeoNames dump (e.g. cities500.zip) "
+                        "into the offline index of places set by "
+                        "'gazetteer' and exit")
     parser.add_argument("-c", "--conf", help="configuration file")
     period_meg.add_argument("-d", "--days",
                             help="show weather forecasts for the specified "
                             "day or a range of the form: [start],[end]")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and answer queries of other "
+                        "'weather' commands on a Unix socket")
+    parser.add_argument("--exporter", nargs="?", const=EXPORTER_ADDRESS,
+                        metavar="[HOST:]PORT",
+                        help="serve current weather of the locations set by "
+                        "'exporter-location' entries as Prometheus metrics "
+                        f"over HTTP (default: {EXPORTER_ADDRESS})")
     parser.add_argument("-D", "--debug", action="store_true",
                         help="enable debugging messages")
     parser.add_argument("-f", "--fields",
@@ -42,9 +76,47 @@ def parse_args():
                         "humidity, sea_level, grnd_level, visibility, "
                         "wind_speed, wind_deg, wind_gust, rain, clouds, "
                         "sunrise, sunset")
+    parser.add_argument("-F", "--format",
+                        choices=["table", "tsv", "csv", "ndjson"],
+                        help="show results as a table of fields, or one row "
+                        "per timestamp in TSV, CSV or NDJSON format "
+                        f"(default: {config.DEFAULTS['format']})")
     parser.add_argument("-j", "--json", action="store_true",
-                        help="show results in raw json format")
+                        help="show the selected fields of results as JSON, "
+                        "one flat object per line and per timestamp (same "
+                        "as --format ndjson)")
     parser.add_argument("-k", "--key", help="OpenWeatherMap API key")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write cached responses")
+    parser.add_argument("--raw", action="store_true",
+                        help="with --json, show whole API responses "
+                        "instead of the selected fields")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore cached responses and fetch fresh data")
+    parser.add_argument("--usage", action="store_true",
+                        help="show the number of API calls made this month "
+                        "with each key and exit")
+    parser.add_argument("--prompt", action="store_true",
+                        help="print the last known values of the fields on "
+                        "one line without waiting for any request, for "
+                        "shell prompts, and update them in the background "
+                        "once stale")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="save cProfile statistics of the run to FILE "
+                        "(see the pstats module)")
+    parser.add_argument("-s", "--summary", choices=["daily", "6h"],
+                        help="show statistics of numeric fields for each day "
+                        "or 6-hour period of a forecast instead of every "
+                        "timestamp")
+    parser.add_argument("--snap", metavar="PRECISION",
+                        help="make one request for all coordinates of a "
+                        "cell, given as geohash:LENGTH (e.g. geohash:5) or "
+                        "grid:DEGREES (e.g. grid:0.05), and use the data "
+                        "of its center")
+    parser.add_argument("-t", "--timings", action="store_true",
+                        help="print a JSON record of the time spent in each "
+                        "phase of the run, received bytes and cache hits "
+                        "to stderr")
     parser.add_argument("-u", "--units",
                         choices=["metric", "imperial", "standard"],
                         help=f"(default: {config.DEFAULTS['units']})")
@@ -53,25 +125,476 @@ def parse_args():
                           help="geocoordintes of the form: latitude,longitude")
     location_meg.add_argument("-l", "--location",
                           help="a location of the form: city[,country]")
+    parser.add_argument("--forget-location", action="store_true",
+                        help="remove the given location (or all locations if"
+                        " none is given) from the geocoding cache and exit")
+    parser.add_argument("--warm-geocache", metavar="FILE",
+                        help="resolve and cache the locations listed in FILE"
+                        " (one per line, '-' for stdin) and exit")
+    parser.add_argument("-w", "--workers", type=positive_int,
+                        help="number of concurrent lookups in batch mode"
+                        f" (default: {config.DEFAULTS['workers']})")
+    parser.add_argument("-W", "--watch", nargs="?", const=60, type=float,
+                        metavar="INTERVAL",
+                        help="keep running and redraw the results every "
+                        "INTERVAL seconds (default: 60), fetching new data "
+                        "only when the API is expected to have updated it")
     parser.add_argument("-v", "--version", action="store_true",
                         help="show software version and copyright notice")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     return args
 
-def main():
-    args = parse_args()
-    if args.version:
-        print(VERSION)
-        print(COPYRIGHT)
+def find_command(argv, name="history"):
+    """Return the index of a command in argv, or None.
+
+    The command may follow options of 'weather history' (e.g. -c CONF),
+    all of which take a value except HISTORY_FLAGS.
+    """
+    i = 0
+    while i < len(argv) and argv[i] != "--":
+        arg = argv[i]
+        if arg == name:
+            return i
+        if not arg.startswith('-') or arg == '-':
+            return None
+        attached = '=' in arg if arg.startswith("--") else len(arg) > 2
+        i += 1 if attached or arg in HISTORY_FLAGS else 2
+    return None
+
+def parse_history_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="weather history",
+        description="Query weather data recorded with 'record-history'"
+    )
+    parser.add_argument("-c", "--conf", help="configuration file")
+    parser.add_argument("--from", dest="start", default="7d", metavar="TIME",
+                        help="start of the time range, as days, hours or "
+                        "minutes ago (e.g. 7d, 12h) or ahead (e.g. +2d), or "
+                        "an ISO 8601 date and time in the location's "
+                        "timezone (default: 7d)")
+    parser.add_argument("--to", dest="end", default="now", metavar="TIME",
+                        help="end of the time range, excluded (default: now)")
+    parser.add_argument("-f", "--fields",
+                        help="comma-separated list of numeric fields to show "
+                        "(default: those of the 'fields' entry), or 'all'")
+    parser.add_argument("-F", "--format",
+                        choices=["table", "tsv", "csv", "ndjson"],
+                        help="show records as a table of fields, or one row "
+                        "per timestamp in TSV, CSV or NDJSON format "
+                        f"(default: {config.DEFAULTS['format']})")
+    parser.add_argument("--forecasts", action="store_true",
+                        help="query recorded forecasts instead of current "
+                        "weather observations")
+    parser.add_argument("--lead", type=float, metavar="HOURS",
+                        help="only show forecasts made HOURS to HOURS + 3 "
+                        "in advance (e.g. 24 for day-ahead forecasts)")
+    parser.add_argument("-s", "--aggregate", choices=["daily", "6h"],
+                        help="show statistics of each field for each day or "
+                        "6-hour period instead of every record")
+    parser.add_argument("-u", "--units",
+                        choices=["metric", "imperial", "standard"],
+                        help=f"(default: {config.DEFAULTS['units']})")
+    location_meg = parser.add_mutually_exclusive_group()
+    location_meg.add_argument("-g", "--geocoordinates",
+                          help="geocoordintes of the form: latitude,longitude")
+    location_meg.add_argument("-l", "--location",
+                          help="a location of the form: city[,country]")
+    location_meg.add_argument("--list", action="store_true",
+                              help="list recorded locations and exit")
+
+    return parser.parse_args(argv)
+
+def warm_geocache(path, geo_func):
+    from . import geocode
+
+    def report(location, e):
+        print(f"{location}: {e}", file=sys.stderr)
+
+    try:
+        if path == '-':
+            counts = geocode.warm(sys.stdin, geo_func, on_error=report)
+        else:
+            with open(path, encoding="utf-8") as f:
+                counts = geocode.warm(f, geo_func, on_error=report)
+    except OSError as e:
+        util.error(str(e), exit_code=1)
+
+    print("resolved: {}, already cached: {}, failed: {}".format(*counts))
+
+def build_gazetteer(path, get_value):
+    from . import gazetteer
+
+    index = get_value("gazetteer") or gazetteer.index_file()
+    try:
+        with gazetteer.open_dump(path) as lines:
+            count = gazetteer.build(gazetteer.read_geonames(lines), index)
+    except (OSError, ValueError, StopIteration) as e:
+        util.error(str(e) or f"no dump found in {path}", exit_code=1)
+
+    print(f"indexed {count} places in {index} "
+          f"({os.path.getsize(index)} bytes)")
+
+def parse_fields(get_value):
+    fields_str = get_value("fields")
+
+    if fields_str == "all":
+        return owm.list_fields()
+
+    fields = util.separate(fields_str)
+    invalid = tuple(f for f in fields if f not in owm.FIELD_SET)
+    if invalid:
+        util.error("invalid fields: " + ' '.join(invalid))
+    return fields
+
+def parse_period(args, get_value):
+    """Return the requested day range, or None for current weather."""
+    if args.days:
+        return util.parse_days(args.days)
+    elif args.when and args.when != "now":
+        return util.word_to_days(args.when)
+    elif not args.when and get_value("days"):
+        return util.parse_days(get_value("days"))
+    elif get_value("when") != "now":
+        return util.word_to_days(get_value("when"))
+
+def report(http):
+    """Print transport statistics to stderr."""
+    print("transport: {requests} requests, {connections} connections "
+          "({reused} reused), {bytes} bytes received".format(**http.stats()),
+          file=sys.stderr)
+
+def print_usage(pool):
+    from . import keys
+
+    pool.save()
+    for key in pool.keys:
+        print(keys.mask(key), pool.calls(key), sep='\t')
+
+def batch_format(get_value):
+    """Return the record format of batch mode, TSV unless set otherwise."""
+    if get_value("json"):
+        return "ndjson"
+    fmt = get_value("format")
+    return "tsv" if fmt == "table" else fmt
+
+def run_batch(path, get_value, client, fields, days, fmt):
+    """Look up every location listed in a file and print the results.
+
+    Upstream calls (but not cache hits) are spread across the keys of
+    the pool and limited to 'rate-limit' calls per minute for each key,
+    and to 'host-rate-limit' for all processes of the host. Return the
+    number of failed lookups.
+    """
+    from . import batch
+
+    endpoint = "forecast" if days else "weather"
+
+    def fetch_coords(*coords):
+        return client.get(endpoint, coords, days=days)
+
+    formatter = batch.FORMATS[fmt]
+
+    def write(record):
+        sys.stdout.write(formatter(record, fields))
+        sys.stdout.flush()
+
+    workers = int(get_value("workers"))
+    process = batch.make_processor(client.locate, fetch_coords, fields, days)
+    try:
+        if path == '-':
+            return batch.run(sys.stdin, process, write, workers=workers)
+        with open(path, encoding="utf-8") as f:
+            return batch.run(f, process, write, workers=workers)
+    except OSError as e:
+        util.error(str(e), exit_code=1)
+
+def run_watch(interval, client, endpoint, coords, days, render):
+    """Redraw weather data until interrupted, see watch.run()."""
+    from . import watch
+
+    def fetch_data(refresh):
+        return client.get(endpoint, coords, days=days, refresh=refresh)
+
+    try:
+        watch.run(fetch_data,
+                  partial(watch.capture, render),
+                  interval,
+                  sys.stdout)
+    except KeyboardInterrupt:
         sys.exit(0)
 
+def run_exporter(address, get_value, client):
+    """Serve weather metrics of the configured locations, see exporter.py."""
+    from . import batch, cache, exporter, ratelimit
+
+    locations = get_value("exporter-location")
+    if not locations:
+        util.error("no locations to export, add 'exporter-location' "
+                   "entries to the configuration file", exit_code=3)
+
+    host, _, port = address.rpartition(':')
+    try:
+        address = (host or "localhost", int(port))
+    except ValueError:
+        util.error(f"invalid exporter address: {address}")
+
+    def fetch_location(location):
+        kind, value = batch.parse_line(location)
+        if kind == "location":
+            value = client.locate(*value)
+        # the scheduler decides when data is refreshed, not the cache
+        return client.get("weather", value, refresh=True)
+
+    rate = get_value("rate-limit")
+    rate = int(rate) if rate else ratelimit.CALLS_PER_MINUTE
+    host_calls, _ = ratelimit.host_limit(get_value)
+    calls_per_minute = (min(rate, host_calls) if host_calls else rate) \
+        * len(client.pool.keys)
+    ttl = get_value("weather-ttl")
+    period = exporter.refresh_period(len(locations),
+                                     calls_per_minute,
+                                     int(ttl) if ttl
+                                     else cache.TTL["weather"])
+
+    def ready(server):
+        print(f"Serving metrics of {len(locations)} locations on "
+              f"http://{address[0]}:{server.server_address[1]}/metrics, "
+              f"each refreshed every {period:.0f} s", file=sys.stderr)
+
+    try:
+        exporter.serve(exporter.Exporter(locations,
+                                         fetch_location,
+                                         client.units),
+                       address,
+                       period,
+                       on_ready=ready)
+    except OSError as e:
+        util.error(str(e), exit_code=1)
+
+def history_location(args, get_value, directory):
+    """Return the store directory of the location of a history query."""
+    from . import api, history
+
+    location = args.location
+    coords = args.geocoordinates
+    if not (location or coords):
+        coords = get_value("geocoordinates")
+        location = None if coords else get_value("location")
+    if not (location or coords):
+        util.error("one of 'geocoordinates' or 'location' must be specified"
+                   " to query recorded data")
+
+    if location:
+        try:
+            city, country = util.split_location(location)
+        except ValueError as e:
+            util.error(str(e))
+        path = history.find(directory, city, country)
+        if path:
+            return path
+        try:
+            coords = api.Client(get_value).locate(city, country)
+        except api.ConfigError as e:
+            util.error(str(e), exit_code=3)
+        except Exception as e:
+            util.error(str(e), exit_code=9)
+
+    try:
+        coords = api.parse_coords(coords)
+    except api.LocationError as e:
+        util.error(str(e))
+    return history.location_dir(directory, coords)
+
+def run_history(args):
+    """Run the 'history' command with parsed command-line arguments."""
+    from . import columns, history, output
+
     get_value = config.init_conf(args)
+    directory = get_value("history-dir") or history.history_dir()
 
-    api_keys = get_value("key")
-    if not api_keys:
-        util.error("unable to find any API keys", exit_code=3)
+    if args.list:
+        from datetime import datetime, timezone
 
+        for summary in history.locations(directory):
+            for key in ("first", "last"):
+                if summary[key] is not None:
+                    summary[key] = datetime.fromtimestamp(
+                        summary[key], tz=timezone.utc
+                    ).isoformat()
+            print('\t'.join('' if value is None else str(value)
+                            for value in summary.values()))
+        sys.exit(0)
+
+    if get_value("fields") == "all":
+        fields = history.FIELDS
+    else:
+        fields = tuple(f for f in util.separate(get_value("fields"))
+                       if f in history.FIELDS)
+        if not fields:
+            util.error("no numeric fields to show, available fields are: "
+                       + ' '.join(history.FIELDS))
+
+    path = history_location(args, get_value, directory)
+    units = get_value("units")
+    kind = "forecast" if args.forecasts else "weather"
+    shift = history.read_meta(path).get("timezone") or 0
+    try:
+        start = history.parse_time(args.start, shift)
+        end = history.parse_time(args.end, shift)
+        store = history.Store(os.path.join(path, owm.FETCHED, kind), kind)
+    except ValueError as e:
+        util.error(str(e))
+    except OSError:
+        util.error(f"no recorded {kind} data for this location",
+                   exit_code=9)
+
+    fmt = get_value("format")
+    if args.aggregate and fmt != "table":
+        util.error("--aggregate can only be shown as a table")
+
+    with store:
+        data, issued = store.select(
+            start,
+            end,
+            fields,
+            timezone=shift,
+            lead=None if args.lead is None else int(args.lead * 3600)
+        )
+        data = columns.convert(data, units)
+        options = dict(sep='\t',
+                       field_delim='\n',
+                       ts_delim='\n---\n',
+                       time_format=get_value("time-format"))
+        if args.aggregate:
+            text = output.render_summary(data,
+                                         units,
+                                         period=args.aggregate,
+                                         **options)
+        else:
+            text = output.render_columns(data,
+                                         units,
+                                         issued=issued if args.forecasts
+                                         else None,
+                                         fmt=fmt,
+                                         **options)
+        del data, issued
+    if text:
+        print(text)
+
+def run_prompt(args, path):
+    """Fetch current weather and write the line printed by --prompt.
+
+    The line holds the values of the fields separated by spaces, and is
+    written to the prompt file at 'path' (see prompt.py) and stdout.
+    """
+    from . import api, output, prompt
+
+    get_value = config.init_conf(args)
+    try:
+        client = api.Client(get_value)
+    except api.ConfigError as e:
+        util.error(str(e), exit_code=3)
+
+    fields = parse_fields(get_value)
+    coords, location = resolve(args, get_value, client, interactive=False)
+    try:
+        data = client.get("weather", coords, refresh=True)
+    except Exception as e:
+        util.error(f"An error occured while trying to fetch data.\n{e}",
+                   exit_code=9,
+                   prefix='')
+
+    place = None if location else client.place_name(coords)
+    if place:
+        from . import gazetteer
+        data = gazetteer.rename(data, place)
+    value = output.render_line(data,
+                               fields,
+                               client.units,
+                               get_value("time-format"))
+    try:
+        prompt.write(path, value, client.ttl("weather-ttl", "weather"))
+    except OSError as e:
+        util.error(str(e), exit_code=1)
+    print(value)
+
+def run_daemon():
+    from . import daemon
+
+    config.PARSED = {}
+
+    def ready(server):
+        print("Listening on", server.server_address, file=sys.stderr)
+
+    try:
+        daemon.serve(main, on_ready=ready)
+    except OSError as e:
+        util.error(str(e), exit_code=1)
+
+def main(argv=None, cwd=None):
+    """Run the program with a list of command-line arguments.
+
+    Keyword arguments:
+    argv -- command-line arguments (default: sys.argv[1:])
+    cwd -- directory of relative paths in arguments (default: current)
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    command = find_command(argv)
+    if command is not None:
+        args = parse_history_args(argv[:command] + argv[command + 1:])
+        if cwd and args.conf:
+            args.conf = os.path.join(cwd, args.conf)
+        return run_history(args)
+
+    args = parse_args(argv)
+    if cwd:
+        for name in ("conf",
+                     "batch",
+                     "warm_geocache",
+                     "build_gazetteer",
+                     "profile"):
+            path = getattr(args, name)
+            if path and path != '-':
+                setattr(args, name, os.path.join(cwd, path))
+
+    if args.prompt:
+        from . import prompt
+        return run_prompt(args, prompt.entry_path(argv))
+
+    if not (args.timings or args.profile):
+        return run(args)
+
+    from . import timings
+
+    if args.timings:
+        timings.start()
+    try:
+        if args.profile:
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.runcall(run, args)
+            finally:
+                profile.dump_stats(args.profile)
+        else:
+            run(args)
+    finally:
+        recorder = timings.stop()
+        if recorder:
+            import json
+            print(json.dumps(recorder.report()), file=sys.stderr)
+
+def resolve(args, get_value, client, interactive=True):
+    """Return the coordinates and the location name (if any) of a run.
+
+    Without any configured location, the location is detected by IP
+    address, and saved in the configuration file if the user agrees.
+
+    interactive -- ask before saving a detected location, otherwise
+    don't save it
+    """
     location = None
     coords = None
 
@@ -84,8 +607,11 @@ def main():
     elif get_value("location"):
         location = get_value("location")
     else:
-        coords = util.guess_location(get_value, debug=get_value("debug"))
-        if coords and \
+        coords = util.guess_location(get_value,
+                                     client.http,
+                                     debug=get_value("debug"),
+                                     policy=client.policy)
+        if coords and interactive and \
            util.prompt("Would you like to save this location for future runs? "
                        "(yes/no):") == "yes":
             config.write_conf("geocoordinates", ','.join(map(str, coords)))
@@ -95,75 +621,149 @@ def main():
                    " to get the corresponding weather data")
 
     if not coords:
-        location_parts = util.separate(location)
-        if len(location_parts) > 2 or not location_parts[0]:
-            util.error(f"invalid location string: {location}")
+        try:
+            city, country = util.split_location(location)
+        except ValueError as e:
+            util.error(str(e))
 
         try:
-            geo_response = owmlib.geo_direct(
-                location_parts[0],
-                api_keys[-1],
-                country=location_parts[1] if len(location_parts) == 2 else '',
-                limit=1
-            )
+            coords = client.locate(city, country)
         except Exception as e:
             util.error(str(e), exit_code=9)
 
-        coords = (geo_response[0]["lat"], geo_response[0]["lon"])
-
     else:
         if isinstance(coords, str):
             coords = util.separate(coords)
             if len(coords) != 2:
                 util.error(f"invalid geocoordinates string: {coords}")
 
-    fields_str = get_value("fields")
-    all_fields = owm.list_fields()
+    return coords, location
 
-    if fields_str == "all":
-        fields = all_fields
-    else:
-        fields = util.separate(fields_str)
-        if not set(fields) <= set(all_fields):
-            util.error("invalid fields: "
-                       + ' '.join(set(fields) - set(all_fields)))
+def run(args):
+    """Run the program with parsed command-line arguments."""
+    if args.version:
+        print(VERSION)
+        print(COPYRIGHT)
+        sys.exit(0)
 
-    days = None
-    
-    if args.days:
-        days = util.parse_days(args.days)
-    elif args.when and args.when != "now":
-        days = util.word_to_days(args.when)
-    elif not args.when and get_value("days"):
-        days = util.parse_days(get_value("days"))
-    elif get_value("when") != "now":
-        days = util.word_to_days(get_value("when"))
+    if args.daemon:
+        run_daemon()
+        sys.exit(0)
 
-    units = get_value("units")
-    api_params = { "units": units }
-    format_params = { "sep": "\t", "field_delim": "\n", "units": units }
+    from . import timings
+
+    with timings.phase("config"):
+        get_value = config.init_conf(args)
+
+    from . import api, geocode
+
+    if args.forget_location:
+        if args.location:
+            try:
+                geocode.forget(*util.split_location(args.location))
+            except ValueError as e:
+                util.error(str(e))
+        else:
+            geocode.forget()
+        sys.exit(0)
+
+    if args.build_gazetteer:
+        build_gazetteer(args.build_gazetteer, get_value)
+        sys.exit(0)
+
+    try:
+        client = api.Client(get_value)
+    except api.ConfigError as e:
+        util.error(str(e), exit_code=3)
+
+    if args.usage:
+        print_usage(client.pool)
+        sys.exit(0)
+
+    if args.exporter:
+        run_exporter(args.exporter, get_value, client)
+        sys.exit(0)
+
+    if args.warm_geocache:
+        warm_geocache(args.warm_geocache, client.geo_func)
+        sys.exit(0)
+
+    fields = parse_fields(get_value)
+    days = parse_period(args, get_value)
+
+    if args.batch:
+        errors = run_batch(args.batch,
+                           get_value,
+                           client,
+                           fields,
+                           days,
+                           batch_format(get_value))
+        if get_value("debug"):
+            report(client.http)
+        sys.exit(9 if errors else 0)
+
+    coords, location = resolve(args, get_value, client)
 
     if days:
-        data_func = owmlib.forecast
-        print_func = output.print_forecast
-        format_params.update(ts_delim='\n---\n',
-                             time_format=get_value("time-format"),
-                             start_day=days[0],
-                             end_day=days[-1])
-        api_params["cnt"] = util.count_ts(days[-1])
+        endpoint = "forecast"
+        if get_value("summary") and get_value("format") != "table":
+            util.error("--summary can only be shown as a table")
+    elif get_value("summary"):
+        util.error("--summary requires a forecast (see --days)")
     else:
-        data_func = owmlib.weather
-        print_func = output.print_ts
+        endpoint = "weather"
 
-    try:
-        weather_data = data_func(*coords, api_keys[-1], **api_params)
+    # names of given coordinates, rather than those of weather stations
+    place = None if location else client.place_name(coords)
 
-        if args.json:
-            print(json.dumps(weather_data))
-        else:
-            print_func(weather_data, fields, **format_params)
+    def show(weather_data):
+        with timings.phase("render"):
+            if place and not (args.json and args.raw):
+                from . import gazetteer
+                weather_data = gazetteer.rename(weather_data, place)
+
+            if args.json and args.raw:
+                from . import output
+
+                if days:
+                    weather_data = dict(
+                        weather_data,
+                        list=weather_data.get("list", [])[
+                            :util.count_ts(days[-1])
+                        ]
+                    )
+                print(output.dumps(weather_data))
+            elif args.json:
+                text = client.format(weather_data, fields, days, "ndjson")
+                if text:
+                    print(text)
+            elif get_value("summary"):
+                from . import output
 
+                output.print_summary(weather_data,
+                                     fields,
+                                     sep='\t',
+                                     field_delim='\n',
+                                     units=client.units,
+                                     ts_delim='\n---\n',
+                                     time_format=get_value("time-format"),
+                                     start_day=days[0],
+                                     end_day=days[-1],
+                                     period=get_value("summary"))
+            else:
+                text = client.format(weather_data, fields, days)
+                if text:
+                    print(text)
+
+    if args.watch is not None:
+        run_watch(max(args.watch, 1), client, endpoint, coords, days, show)
+
+    try:
+        show(client.get(endpoint, coords, days=days))
     except Exception as e:
         util.error(f"An error occured while trying to fetch data.\n{e}",
                    exit_code=9,
                    prefix='')
+
+    if get_value("debug"):
+        report(client.http)
@@ -0,0 +1,144 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Program entry point and thin client of the weather daemon.
+
+This module only depends on the standard library, so that queries
+answered by a running daemon (see daemon.py) don't pay for importing
+the rest of the program. If no daemon is running, or a query needs
+interactive input, the program runs in-process instead. Shell prompt
+queries (--prompt) are answered from a file, see prompt.py.
+"""
+
+import os
+import sys
+
+BUFSIZE = 65536
+RESIDENT = ("--daemon", "--exporter", "--watch", "-W") # run until stopped
+STREAMING = ("--batch", "-b") # write results as they come
+# variables locating the configuration file, caches, state and history
+ENVIRONMENT = ("TERMINAL_WEATHER_CF", "HOME", "XDG_CONFIG_HOME",
+               "XDG_CACHE_HOME", "XDG_DATA_HOME", "XDG_STATE_HOME")
+
+def environment():
+    """Return the values of the variables in ENVIRONMENT, None if unset."""
+    return dict((name, os.getenv(name)) for name in ENVIRONMENT)
+
+def private_dir(path):
+    """Create a directory only the user can access, unless it exists.
+
+    Return its path. Raise OSError if it isn't a directory owned by the
+    user (a symbolic link isn't followed), or if others can access it.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+
+    import stat
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() \
+       or info.st_mode & 0o077:
+        raise PermissionError(f"unsafe runtime directory: {path}")
+    return path
+
+def runtime_dir():
+    """Return a directory of runtime files only the user can access.
+
+    It's /run/user/UID if it exists, otherwise terminal-weather-UID in
+    /tmp, whatever the environment, so that login sessions and cron jobs
+    agree on it. Raise OSError if it's unsafe, see private_dir().
+    """
+    path = f"/run/user/{os.getuid()}"
+    if os.path.isdir(path):
+        return private_dir(path)
+
+    base = "/tmp"
+    if not os.path.isdir(base):
+        import tempfile
+        base = tempfile.gettempdir()
+    return private_dir(os.path.join(base, f"terminal-weather-{os.getuid()}"))
+
+def socket_path():
+    """Return the path of the daemon's Unix socket.
+
+    Raise OSError if the runtime directory is unsafe, see runtime_dir().
+    """
+    path = os.getenv("TERMINAL_WEATHER_SOCKET")
+    if path:
+        return path
+    return os.path.join(runtime_dir(), "terminal-weather.sock")
+
+def check_peer(sock):
+    """Raise PermissionError unless a Unix socket's peer is the user.
+
+    The owner of the peer process is checked where SO_PEERCRED is
+    available (Linux), otherwise the owner of the socket file.
+    """
+    import socket
+
+    if hasattr(socket, "SO_PEERCRED"):
+        import struct
+        credentials = struct.Struct("3i") # pid, uid, gid
+        _, uid, _ = credentials.unpack(sock.getsockopt(socket.SOL_SOCKET,
+                                                       socket.SO_PEERCRED,
+                                                       credentials.size))
+    else:
+        uid = os.stat(sock.getpeername()).st_uid
+    if uid != os.getuid():
+        raise PermissionError("the daemon's socket belongs to another user")
+
+def query(argv, path=None, cwd=None):
+    """Send command-line arguments to the daemon and return its reply.
+
+    The reply is a dictionary with the keys: "status", "stdout" and
+    "stderr", or "fallback" if the query must run in-process, e.g.
+    because the daemon's environment differs (see ENVIRONMENT).
+    Raise OSError if the daemon can't be reached, or is run by another
+    user.
+    """
+    import json
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path or socket_path())
+        check_peer(sock)
+        request = { "argv": list(argv),
+                    "cwd": cwd or os.getcwd(),
+                    "env": environment() }
+        sock.sendall(json.dumps(request).encode("utf-8") + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            chunk = sock.recv(BUFSIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    try:
+        return json.loads(b''.join(chunks))
+    except ValueError as e:
+        raise ConnectionError(f"invalid reply from daemon: {e}")
+
+def main():
+    argv = sys.argv[1:]
+
+    if "--prompt" in argv and not {"-h", "--help"} & set(argv):
+        from . import prompt
+        sys.exit(prompt.main(argv))
+
+    # the daemon only answers queries that return, without streaming
+    local = any(arg.startswith(RESIDENT + STREAMING) for arg in argv)
+    if not local and not os.getenv("TERMINAL_WEATHER_NO_DAEMON"):
+        try:
+            reply = query(argv)
+        except OSError:
+            reply = None
+
+        if reply and not reply.get("fallback"):
+            sys.stdout.write(reply["stdout"])
+            sys.stderr.write(reply["stderr"])
+            sys.exit(reply["status"])
+
+    from . import cli
+    cli.main()
@@ -0,0 +1,134 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Columnar representation of forecasts and per-period aggregates.
+
+A forecast's list of timestamp dictionaries is converted once into one
+contiguous array of floats per numeric field (NaN for missing values),
+indexed by a sorted array of 'dt' epoch seconds. Aggregates are then
+computed in a single pass over the arrays, without building dictionaries.
+"""
+
+import math
+
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from . import owm
+
+PERIODS = {
+    # name: length in seconds
+    "daily": 24 * 60 * 60,
+    "6h": 6 * 60 * 60,
+}
+
+def rain_column(weather_dict):
+    # forecasts hold rain volume of the last 3 hours, no entry means none
+    rain = weather_dict.get("rain") or {}
+    return rain.get("3h", rain.get("1h", 0))
+
+COLUMNS = dict(
+    (f.name, f.extract) for f in owm.FIELDS
+    if f.unit and f.name != "rain"
+)
+COLUMNS["rain"] = rain_column
+
+# statistics computed for each field, by default: min, max and mean
+STATS = {
+    "rain": ("sum",),
+    "wind_gust": ("max",),
+}
+DEFAULT_STATS = ("min", "max", "mean")
+
+Columns = namedtuple("Columns", ("dt", "timezone", "values"))
+Columns.__doc__ = """A forecast in columnar form.
+
+dt -- array of epoch seconds, in increasing order
+timezone -- shift in seconds from UTC of the forecast's location
+values -- dictionary of field name: array of floats, aligned with dt
+"""
+
+def to_columns(forecast_dict, fields=None):
+    """Convert the timestamps of a forecast to columns.
+
+    fields -- names of the numeric fields to convert (default: all)
+    """
+    fields = tuple(f for f in fields or COLUMNS if f in COLUMNS)
+    timestamps = sorted(forecast_dict.get("list") or (),
+                        key=lambda ts: ts["dt"])
+
+    dt = array('q', (ts["dt"] for ts in timestamps))
+    values = {}
+    for field in fields:
+        extract = COLUMNS[field]
+        column = array('d')
+        for ts in timestamps:
+            value = extract(ts)
+            column.append(math.nan if value is None else value)
+        values[field] = column
+
+    return Columns(dt,
+                   owm.grep_forecast(forecast_dict, "timezone") or 0,
+                   values)
+
+def convert(columns, system):
+    """Convert the values of columns from standard units to a system."""
+    values = {}
+    for field, column in columns.values.items():
+        func = owm.converter(owm.REGISTRY[field].unit, system)
+        values[field] = array('d', map(func, column)) if func else column
+    return Columns(columns.dt, columns.timezone, values)
+
+def select(columns, start, end):
+    """Return the columns of timestamps within [start, end) epoch seconds."""
+    i = bisect_left(columns.dt, start)
+    j = bisect_left(columns.dt, end)
+    return Columns(columns.dt[i:j],
+                   columns.timezone,
+                   dict((f, c[i:j]) for f, c in columns.values.items()))
+
+def aggregate(columns, period="daily"):
+    """Compute statistics of each field for each period.
+
+    Periods start at local midnight of the forecast's timezone. Return
+    a list of dictionaries, one per period in chronological order, with
+    the key "start" (epoch seconds) and a dictionary of statistics per
+    field, e.g. { "min": ..., "max": ..., "mean": ... }. Missing values
+    are ignored; a field without any value in a period gets None.
+    """
+    length = PERIODS[period]
+    shift = columns.timezone
+    dt = columns.dt
+
+    # boundaries of periods, as indices in dt
+    bounds = []
+    current = None
+    for i, t in enumerate(dt):
+        bucket = (t + shift) // length
+        if bucket != current:
+            bounds.append((bucket * length - shift, i))
+            current = bucket
+    bounds.append((None, len(dt)))
+
+    rows = [{ "start": start } for start, _ in bounds[:-1]]
+    for field, column in columns.values.items():
+        stats = STATS.get(field, DEFAULT_STATS)
+        for row, (_, i), (_, j) in zip(rows, bounds, bounds[1:]):
+            values = [v for v in column[i:j] if v == v] # drop NaN
+            if not values:
+                row[field] = dict.fromkeys(stats)
+                continue
+
+            total = math.fsum(values)
+            result = {}
+            for stat in stats:
+                if stat == "min":
+                    result[stat] = min(values)
+                elif stat == "max":
+                    result[stat] = max(values)
+                elif stat == "sum":
+                    result[stat] = total
+                elif stat == "mean":
+                    result[stat] = total / len(values)
+            row[field] = result
+
+    return rows
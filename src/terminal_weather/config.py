@@ -8,8 +8,9 @@ import sys
 from . import util
 
 CONF_FILE = None # automatically set by init_conf()
+PARSED = None # set to a dict to keep parsed files in memory (e.g. in daemons)
 CONF_SPEC = {
-    "cumulative": ("geoip-url", "geoip-fields", "key"),
+    "cumulative": ("geoip-url", "geoip-fields", "key", "exporter-location"),
     "scalar": (
         "days",
         "location",
@@ -19,7 +20,34 @@ CONF_SPEC = {
         "units",
         "debug",
         "json",
-        "time-format"
+        "time-format",
+        "no-cache",
+        "refresh",
+        "cache-size",
+        "weather-ttl",
+        "forecast-ttl",
+        "geocode-ttl",
+        "geoip-timeout",
+        "workers",
+        "rate-limit",
+        "host-rate-limit",
+        "rate-limit-wait",
+        "monthly-quota",
+        "connect-timeout",
+        "read-timeout",
+        "summary",
+        "format",
+        "api-url",
+        "retries",
+        "retry-backoff",
+        "retry-backoff-max",
+        "retry-deadline",
+        "breaker-threshold",
+        "breaker-cooldown",
+        "gazetteer",
+        "snap",
+        "record-history",
+        "history-dir"
     )
 }
 
@@ -27,7 +55,9 @@ DEFAULTS = {
     "when": "now",
     "fields": "city,desc,temp",
     "time-format": "%a %e %b %l %p",
-    "units": "metric"
+    "units": "metric",
+    "format": "table",
+    "workers": "8"
 }
 
 def store_line(spec, conf, line):
@@ -97,6 +127,23 @@ def resolve_cf(args):
         if cf:
             return cf
 
+def load_conf(path):
+    """Parse a configuration file, or reuse it if kept in PARSED.
+
+    Files kept in PARSED are parsed again when modified.
+    """
+    if PARSED is None:
+        return parse_conf(path, CONF_SPEC)
+
+    try:
+        key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    except OSError:
+        return parse_conf(path, CONF_SPEC)
+
+    if key not in PARSED:
+        PARSED[key] = parse_conf(path, CONF_SPEC)
+    return PARSED[key]
+
 def init_conf(args):
     """Make a function to lookup values from args, config and defaults.
 
@@ -113,11 +160,11 @@ def init_conf(args):
 
     global CONF_FILE
     CONF_FILE = conf_file
-    conf = parse_conf(conf_file, CONF_SPEC)
+    conf = load_conf(conf_file)
 
     def lookup(var):
         try:
-            value = getattr(args, var)
+            value = getattr(args, var.replace('-', '_'))
             if value:
                 if var in CONF_SPEC["cumulative"]:
                     value = (value,)
@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Long-running server answering queries over a Unix socket.
+
+Each query is a JSON object holding command-line arguments, which are
+handled in-process by the same function as a regular run, with its
+output captured and sent back. Parsed configuration files, API key
+pools and imported modules stay in memory between queries.
+"""
+
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import traceback
+
+from . import client
+
+class InteractiveInput(BaseException):
+    """Raised when a query tries to read from stdin.
+
+    It derives from BaseException so that it isn't swallowed by
+    'except Exception' handlers on its way up.
+    """
+
+class ThreadLocalStream:
+    """A stand-in for sys.stdin/stdout/stderr with per-thread targets.
+
+    Threads without a target use the original stream.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def target(self):
+        return getattr(self.local, "stream", None) or self.default
+
+    def redirect(self, stream):
+        self.local.stream = stream
+
+    def write(self, s):
+        return self.target().write(s)
+
+    def flush(self):
+        return self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+class NoInput(io.TextIOBase):
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        raise InteractiveInput()
+
+    def readline(self, size=-1):
+        raise InteractiveInput()
+
+    def __iter__(self):
+        raise InteractiveInput()
+
+def handle(request, run, streams):
+    """Run a query with captured output and return a reply dictionary.
+
+    streams -- ThreadLocalStream instances installed as sys.stdin,
+    sys.stdout and sys.stderr
+
+    Queries from another environment (see client.ENVIRONMENT), which
+    would read other files, are sent back to run in-process.
+    """
+    if request.get("env") != client.environment():
+        return { "fallback": True }
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    status = 0
+
+    for stream, target in zip(streams, (NoInput(), stdout, stderr)):
+        stream.redirect(target)
+
+    try:
+        run(request["argv"], cwd=request.get("cwd"))
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            status = e.code
+        elif e.code is not None:
+            print(e.code, file=stderr)
+            status = 1
+    except InteractiveInput:
+        return { "fallback": True }
+    except Exception:
+        traceback.print_exc(file=stderr)
+        status = 9
+    finally:
+        for stream in streams:
+            stream.redirect(None)
+
+    return {
+        "status": status,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue()
+    }
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            reply = handle(request, self.server.run, self.server.streams)
+        except ValueError as e:
+            reply = { "status": 2, "stdout": '', "stderr": f"Error: {e}\n" }
+        self.wfile.write(json.dumps(reply).encode("utf-8"))
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(run, path=None, on_ready=None):
+    """Answer queries on a Unix socket until interrupted.
+
+    Positional argument:
+    run -- a function taking a list of command-line arguments and
+    keyword argument 'cwd', used to handle each query
+
+    Keyword arguments:
+    path -- path of the socket (default: client.socket_path())
+    on_ready -- a function called with the server once it's listening
+    """
+    path = path or client.socket_path()
+
+    if os.path.exists(path):
+        try:
+            client.query(["--version"], path=path)
+        except OSError:
+            os.unlink(path) # left over by a daemon that didn't exit cleanly
+        else:
+            raise FileExistsError(f"a daemon is already listening on {path}")
+
+    original = (sys.stdin, sys.stdout, sys.stderr)
+    streams = tuple(map(ThreadLocalStream, original))
+    sys.stdin, sys.stdout, sys.stderr = streams
+
+    mask = os.umask(0o077) # no one else may connect, even briefly
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(mask)
+    server.run = run
+    server.streams = streams
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if on_ready:
+            on_ready(server)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        sys.stdin, sys.stdout, sys.stderr = original
@@ -0,0 +1,179 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Prometheus exporter of current weather for many locations.
+
+A single scheduler thread refreshes locations one at a time, evenly
+spread over the refresh period, so that upstream calls never come in
+bursts. After each refresh, the whole exposition is rendered once and
+kept in memory: scrapes only send these bytes, whatever the number of
+locations or the scrape frequency.
+"""
+
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import columns
+from . import owm
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REFRESH = 10 * 60 # seconds, how often current weather is updated upstream
+HEADROOM = 0.9 # fraction of the rate limit used by the scheduler
+TIMESTAMPS = {
+    # metric name: field
+    "weather_observation_timestamp_seconds": "dt",
+    "weather_sunrise_timestamp_seconds": "sunrise",
+    "weather_sunset_timestamp_seconds": "sunset",
+}
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def refresh_period(locations, calls_per_minute, minimum=REFRESH):
+    """Return seconds between refreshes of each location.
+
+    A location takes one call per refresh, and calls are kept under
+    HEADROOM times the rate limit (calls_per_minute for all keys).
+    """
+    return max(minimum, locations * 60 / (calls_per_minute * HEADROOM))
+
+def schedule(count, period, task, clock=time.monotonic, sleep=time.sleep):
+    """Call task(i) for every i in range(count), each one every period.
+
+    Calls start period / count seconds apart. Late calls delay the next
+    ones instead of being caught up with, so they never come in bursts.
+    This function never returns.
+    """
+    step = period / count
+    due = clock()
+    n = 0
+    while True:
+        delay = due - clock()
+        if delay > 0:
+            sleep(delay)
+        started = clock()
+        task(n % count)
+        n += 1
+        due = started + step
+
+class Exporter:
+    """Weather metrics of a list of locations.
+
+    Positional arguments:
+    locations -- location strings, used as the 'location' label
+    fetch -- a function taking a location string and returning a current
+    weather API response
+    units -- units of the responses, written in metric descriptions
+    """
+
+    def __init__(self, locations, fetch, units):
+        self.locations = tuple(locations)
+        self.fetch = fetch
+        self.units = units
+        self.labels = tuple(f'{{location="{escape(l)}"}}'
+                            for l in self.locations)
+        self.values = [{} for _ in self.locations]
+        self.errors = [0] * len(self.locations)
+        self.updated = [None] * len(self.locations)
+        self.lock = threading.Lock()
+        self.payload = self.render()
+
+    def refresh(self, i):
+        """Fetch new data for the i-th location and render all metrics."""
+        try:
+            data = self.fetch(self.locations[i])
+            values = dict((f, extract(data))
+                          for f, extract in columns.COLUMNS.items())
+            values.update((f, owm.grep_weather(data, f))
+                          for f in TIMESTAMPS.values())
+            self.values[i] = values
+            self.updated[i] = time.time()
+        except Exception:
+            self.errors[i] += 1
+
+        payload = self.render()
+        with self.lock:
+            self.payload = payload
+
+    def render(self):
+        """Return the exposition of all metrics, in bytes."""
+        lines = []
+
+        def add(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{label} {value}"
+                         for label, value in samples
+                         if value is not None and value == value)
+
+        for field in columns.COLUMNS:
+            unit = owm.get_unit(field, self.units)
+            add(f"weather_{field}",
+                "gauge",
+                f"Current {field} ({unit})",
+                ((label, values.get(field))
+                 for label, values in zip(self.labels, self.values)))
+
+        for name, field in TIMESTAMPS.items():
+            add(name,
+                "gauge",
+                f"Time of the {field} field",
+                ((label, values.get(field))
+                 for label, values in zip(self.labels, self.values)))
+
+        add("weather_last_refresh_timestamp_seconds",
+            "gauge",
+            "Time of the last successful refresh",
+            zip(self.labels, (t and round(t, 3) for t in self.updated)))
+        add("weather_refresh_errors_total",
+            "counter",
+            "Number of failed refreshes",
+            zip(self.labels, self.errors))
+
+        return ('\n'.join(lines) + '\n').encode("utf-8")
+
+    def scrape(self):
+        with self.lock:
+            return self.payload
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            body = b'<a href="/metrics">Metrics</a>\n'
+            content_type = "text/html"
+        else:
+            body = self.server.exporter.scrape()
+            content_type = CONTENT_TYPE
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(exporter, address, period, on_ready=None):
+    """Refresh metrics in the background and serve them until interrupted.
+
+    Positional arguments:
+    exporter -- an Exporter
+    address -- a tuple: (host, port)
+    period -- seconds between refreshes of each location
+    """
+    server = ThreadingHTTPServer(address, Handler)
+    server.daemon_threads = True
+    server.exporter = exporter
+
+    threading.Thread(target=schedule,
+                     args=(len(exporter.locations), period, exporter.refresh),
+                     daemon=True).start()
+    try:
+        if on_ready:
+            on_ready(server)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,355 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Offline index of places for name and reverse lookups.
+
+An index is compiled once from a GeoNames dump (e.g. cities500.txt or
+cities15000.zip from https://download.geonames.org/export/dump/) into a
+single file, read through mmap so that opening it costs nothing but the
+pages actually touched by lookups. The file is made of:
+
+header -- MAGIC, then counts and the grid resolution (HEADER)
+places -- fixed-width records: latitude, longitude, population, country
+code, and the location of the display name in the string blob (PLACE)
+names -- (key location, place number) records sorted by key, a key
+being the casefolded name or ASCII name of a place (NAME)
+prefixes -- for each first byte of keys, the number of the first name
+record starting with it or a greater byte (257 integers)
+grid -- for each cell of the grid (CELLS_PER_DEGREE cells per degree of
+latitude and longitude), the number of its first entry in the list of
+place numbers sorted by cell, followed by that list
+strings -- UTF-8 keys and display names
+"""
+
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+MAGIC = b"TWGAZ\x00\x00\x01"
+HEADER = struct.Struct("<8sIIII") # magic, places, names, strings, cells
+PLACE = struct.Struct("<ffI2sIH") # lat, lon, population, country, name
+NAME = struct.Struct("<IHI") # key offset, key length, place number
+INDEX = struct.Struct("<I")
+COORDS = struct.Struct("<ff") # first fields of PLACE
+CELLS_PER_DEGREE = 1
+NEAREST_DISTANCE = 30 # km, beyond which coordinates aren't named
+EARTH_RADIUS = 6371.0 # km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+def index_file():
+    """Return the default path of the index."""
+    base = os.getenv("XDG_DATA_HOME")
+    if not base:
+        base = os.path.join(os.getenv("HOME") or tempfile.gettempdir(),
+                            ".local", "share")
+    return os.path.join(base, "terminal-weather", "gazetteer.idx")
+
+def make_key(name):
+    return ' '.join(name.casefold().split()).encode("utf-8")
+
+def distance(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance in km between two points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) \
+        * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+def rename(data, name):
+    """Return a copy of a weather or forecast response named 'name'."""
+    if "list" in data:
+        return dict(data, city=dict(data.get("city") or {}, name=name))
+    return dict(data, name=name)
+
+def read_geonames(lines):
+    """Yield places of a GeoNames dump as tuples.
+
+    Tuples: (name, ASCII name, latitude, longitude, country code,
+    population). Places other than populated places (feature class P)
+    are skipped, as are malformed lines.
+    """
+    for line in lines:
+        columns = line.rstrip('\n').split('\t')
+        if len(columns) < 15 or columns[6] != 'P':
+            continue
+        try:
+            yield (columns[1],
+                   columns[2],
+                   float(columns[4]),
+                   float(columns[5]),
+                   columns[8],
+                   int(columns[14] or 0))
+        except ValueError:
+            continue
+
+def open_dump(path):
+    """Return the lines of a GeoNames dump, zipped or not."""
+    import io
+
+    if not path.endswith(".zip"):
+        return open(path, encoding="utf-8")
+
+    import zipfile
+    archive = zipfile.ZipFile(path)
+    name = next(n for n in archive.namelist() if n.endswith(".txt"))
+    return io.TextIOWrapper(archive.open(name), encoding="utf-8")
+
+class Grid:
+    """Geometry of the grid of an index."""
+
+    def __init__(self, cells_per_degree):
+        self.cells_per_degree = cells_per_degree
+        self.rows = 180 * cells_per_degree
+        self.columns = 360 * cells_per_degree
+
+    def cell(self, lat, lon):
+        row = min(self.rows - 1,
+                  max(0, int((lat + 90) * self.cells_per_degree)))
+        column = int((lon + 180) * self.cells_per_degree) % self.columns
+        return row, column
+
+    def number(self, row, column):
+        return row * self.columns + column % self.columns
+
+def build(places, path, cells_per_degree=CELLS_PER_DEGREE):
+    """Write the index of an iterable of places, see read_geonames().
+
+    The file is replaced atomically. Return the number of places.
+    """
+    grid = Grid(cells_per_degree)
+    strings = bytearray()
+    offsets = {}
+
+    def intern(data):
+        if data not in offsets:
+            offsets[data] = len(strings)
+            strings.extend(data)
+        return offsets[data]
+
+    records = []
+    names = []
+    cells = []
+    for name, ascii_name, lat, lon, country, population in places:
+        number = len(records)
+        display = name.encode("utf-8")[:0xffff]
+        records.append(PLACE.pack(lat,
+                                  lon,
+                                  min(population, 0xffffffff),
+                                  country.upper().encode("ascii", "replace")
+                                  [:2].ljust(2),
+                                  intern(display),
+                                  len(display)))
+        for key in dict.fromkeys(make_key(n)[:0xffff]
+                                 for n in (name, ascii_name)):
+            if key:
+                names.append((key, number))
+        cells.append((grid.number(*grid.cell(lat, lon)), number))
+
+    names.sort()
+    cells.sort()
+
+    prefixes = [0] * 257
+    for key, _ in names:
+        prefixes[key[0] + 1] += 1
+    for i in range(1, 257):
+        prefixes[i] += prefixes[i - 1]
+
+    starts = [0] * (grid.rows * grid.columns + 1)
+    for cell, _ in cells:
+        starts[cell + 1] += 1
+    for i in range(1, len(starts)):
+        starts[i] += starts[i - 1]
+
+    name_records = b''.join(NAME.pack(intern(key), len(key), number)
+                            for key, number in names)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC,
+                                len(records),
+                                len(names),
+                                len(strings),
+                                cells_per_degree))
+            f.write(b''.join(records))
+            f.write(name_records)
+            f.write(struct.pack("<257I", *prefixes))
+            f.write(struct.pack(f"<{len(starts)}I", *starts))
+            f.write(struct.pack(f"<{len(cells)}I",
+                                *(number for _, number in cells)))
+            f.write(strings)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(records)
+
+class Gazetteer:
+    """A read-only index, see the module's description.
+
+    Raise OSError if the file can't be read, ValueError if it isn't an
+    index.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC or len(self.map) < HEADER.size:
+            raise ValueError(f"not a gazetteer index: {path}")
+
+        _, self.places, self.names, size, cells_per_degree = \
+            HEADER.unpack_from(self.map)
+        self.grid = Grid(cells_per_degree)
+        self.places_at = HEADER.size
+        self.names_at = self.places_at + self.places * PLACE.size
+        self.prefixes_at = self.names_at + self.names * NAME.size
+        self.starts_at = self.prefixes_at + 257 * INDEX.size
+        self.cells_at = self.starts_at \
+            + (self.grid.rows * self.grid.columns + 1) * INDEX.size
+        self.strings_at = self.cells_at + self.places * INDEX.size
+        if self.strings_at + size != len(self.map):
+            raise ValueError(f"truncated gazetteer index: {path}")
+
+    def close(self):
+        self.map.close()
+
+    def integer(self, offset, i):
+        return INDEX.unpack_from(self.map, offset + i * INDEX.size)[0]
+
+    def string(self, offset, length):
+        start = self.strings_at + offset
+        return self.map[start:start + length]
+
+    def key(self, i):
+        offset, length, _ = NAME.unpack_from(self.map,
+                                             self.names_at + i * NAME.size)
+        return self.string(offset, length)
+
+    def place(self, number):
+        """Return a place as a tuple: (name, country, lat, lon, population).
+        """
+        lat, lon, population, country, offset, length = PLACE.unpack_from(
+            self.map,
+            self.places_at + number * PLACE.size
+        )
+        return (self.string(offset, length).decode("utf-8"),
+                country.decode("ascii").strip(),
+                round(lat, 5),
+                round(lon, 5),
+                population)
+
+    def lower_bound(self, key):
+        """Return the number of the first name record >= key."""
+        if not key:
+            return 0
+        low = self.integer(self.prefixes_at, key[0])
+        high = self.integer(self.prefixes_at, key[0] + 1)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def matches(self, name):
+        """Return numbers of the places named 'name' (any case)."""
+        key = make_key(name)
+        numbers = []
+        i = self.lower_bound(key)
+        while i < self.names and self.key(i) == key:
+            numbers.append(NAME.unpack_from(self.map,
+                                            self.names_at
+                                            + i * NAME.size)[2])
+            i += 1
+        return numbers
+
+    def find(self, city, country=''):
+        """Return the most populous place of a name, or None.
+
+        country -- an ISO 3166 country code; names of countries aren't
+        in the index, so only places without a country would match them
+        """
+        country = country.strip().upper().encode("utf-8")
+        best = None
+        best_population = -1
+        for number in self.matches(city):
+            _, _, population, code, _, _ = PLACE.unpack_from(
+                self.map,
+                self.places_at + number * PLACE.size
+            )
+            if country and code.strip() != country:
+                continue
+            if population > best_population:
+                best, best_population = number, population
+        return None if best is None else self.place(best)
+
+    def complete(self, prefix, limit=10):
+        """Return up to 'limit' names starting with a prefix, in order."""
+        key = make_key(prefix)
+        names = []
+        i = self.lower_bound(key)
+        while i < self.names and len(names) < limit:
+            if not self.key(i).startswith(key):
+                break
+            number = NAME.unpack_from(self.map,
+                                      self.names_at + i * NAME.size)[2]
+            place = self.place(number)
+            names.append(f"{place[0]},{place[1]}" if place[1] else place[0])
+            i += 1
+        return list(dict.fromkeys(names))
+
+    def cell_places(self, row, column):
+        cell = self.grid.number(row, column)
+        start = self.integer(self.starts_at, cell)
+        end = self.integer(self.starts_at, cell + 1)
+        return (self.integer(self.cells_at, i) for i in range(start, end))
+
+    def nearest(self, lat, lon, max_distance=None):
+        """Return the place closest to some coordinates, or None.
+
+        Cells are searched in growing rings around the cell of the
+        coordinates, until no unsearched cell can be closer than the best
+        place found so far.
+
+        max_distance -- maximum distance in km of the place (default: any)
+        """
+        lat, lon = float(lat), float(lon)
+        grid = self.grid
+        row, column = grid.cell(lat, lon)
+        best = None
+        best_distance = math.inf
+
+        for ring in range(max(grid.rows, grid.columns // 2) + 1):
+            # closest possible point outside the searched rings
+            degrees = max(0, ring - 1) / grid.cells_per_degree
+            bound = degrees * KM_PER_DEGREE * math.cos(
+                math.radians(min(89.0, abs(lat) + degrees))
+            )
+            if best_distance <= bound or \
+               (max_distance is not None and bound > max_distance):
+                break
+
+            for r in range(row - ring, row + ring + 1):
+                if not 0 <= r < grid.rows:
+                    continue
+                if ring and r not in (row - ring, row + ring):
+                    columns = (column - ring, column + ring)
+                else:
+                    columns = range(column - ring, column + ring + 1)
+                for c in columns:
+                    for number in self.cell_places(r, c):
+                        d = distance(lat,
+                                     lon,
+                                     *COORDS.unpack_from(
+                                         self.map,
+                                         self.places_at + number * PLACE.size
+                                     ))
+                        if d < best_distance:
+                            best, best_distance = number, d
+
+        if best is None or \
+           (max_distance is not None and best_distance > max_distance):
+            return None
+        return self.place(best)
@@ -0,0 +1,92 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Location name to geocoordinates resolution with a persistent cache."""
+
+from . import cache
+from . import timings
+from . import util
+
+NAMESPACE = "geo"
+
+def make_key(city, country=''):
+    return cache.make_key(city.strip().casefold(), country.strip().casefold())
+
+def lookup(city, country='', ttl=None):
+    """Return cached coordinates of a location, otherwise None."""
+    coords = cache.load(NAMESPACE, make_key(city, country), ttl=ttl)
+    return coords and tuple(coords)
+
+def resolve(city, geo_func, country='', use_cache=True, ttl=None):
+    """Find the coordinates (latitude, longitude) of a location.
+
+    Cached coordinates are returned without any network request, and
+    newly resolved ones are added to the cache. A LookupError is raised
+    if the location is unknown to the geocoding API.
+
+    Positional arguments:
+    city -- name of the city
+    geo_func -- owm.geo_direct, with the transport and API key bound
+
+    Keyword arguments:
+    country -- country name or code, if any
+    use_cache -- read from and write to the cache
+    ttl -- maximum age in seconds of cached coordinates (None: no expiry)
+    """
+    with timings.phase("geocode"):
+        if use_cache:
+            coords = lookup(city, country, ttl=ttl)
+            if coords:
+                return coords
+
+        response = geo_func(city, country=country, limit=1)
+        if not response:
+            raise LookupError("location not found: "
+                              + ','.join(filter(None, (city, country))))
+
+        coords = (response[0]["lat"], response[0]["lon"])
+        if use_cache:
+            # coordinates of a city never change, so they are never evicted
+            cache.store(NAMESPACE,
+                        make_key(city, country),
+                        coords,
+                        max_size=None)
+        return coords
+
+def forget(city=None, country=''):
+    """Remove a location from the cache, or all locations if city is None."""
+    cache.invalidate(NAMESPACE, city and make_key(city, country))
+
+def warm(locations, geo_func, on_error=None):
+    """Resolve and cache every uncached location of an iterable.
+
+    Locations are strings of the form: city[,country]. Return a tuple of
+    counts: (resolved, already cached, failed).
+
+    Positional arguments:
+    locations -- an iterable of location strings
+    geo_func -- as in resolve()
+
+    Keyword argument:
+    on_error -- a function called with the location string and exception
+    of every failed location
+    """
+    resolved = cached = failed = 0
+
+    for location in locations:
+        location = location.strip()
+        if not location or location.startswith('#'):
+            continue
+
+        try:
+            city, country = util.split_location(location)
+            if lookup(city, country):
+                cached += 1
+                continue
+            resolve(city, geo_func, country=country)
+            resolved += 1
+        except Exception as e:
+            failed += 1
+            if on_error:
+                on_error(location, e)
+
+    return resolved, cached, failed
@@ -0,0 +1,357 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Append-only columnar store of fetched weather data.
+
+Every response received from the API can be recorded (see the
+'record-history' entry), one record per observation or forecast
+timestamp, under a directory per location and units system:
+
+LAT,LON/ -- coordinates rounded as in cache keys
+    meta.json -- name, country and timezone of the location
+    UNITS/weather/ -- observations, in increasing 'dt' order
+    UNITS/forecast/ -- forecast timestamps, in increasing 'issued' order
+
+UNITS being the units of the responses (owm.FETCHED, see api.py).
+
+Each store directory holds one file per column: 'dt' and 'issued'
+(epoch seconds of the data and of its request, as int64) and one
+float32 per record for each field of columns.COLUMNS (NaN if missing).
+Records are only ever appended, under an exclusive lock, and columns
+cut short by an interrupted append are truncated to their common length
+by the next one. Queries read the columns through mmap: time ranges are
+found by bisecting the ordered column, and aggregates scan the values
+without any parsing.
+"""
+
+import fcntl
+import json
+import math
+import mmap
+import os
+import re
+import tempfile
+import time
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from . import columns
+from . import owm
+
+TIME = 'q' # int64
+VALUE = 'f' # float32
+FIELDS = tuple(columns.COLUMNS)
+KINDS = ("weather", "forecast")
+MAX_LEAD = (owm.MAX_DAYS + 1) * 24 * 60 * 60 # seconds, of forecasts
+SLOT = owm.INTERVAL * 60 * 60 # seconds between forecast timestamps
+EXTENSIONS = { TIME: "i64", VALUE: "f32" }
+UNITS = { "d": 24 * 60 * 60, "h": 60 * 60, "m": 60 } # of relative times
+
+def history_dir():
+    """Return the default directory of the store."""
+    base = os.getenv("XDG_DATA_HOME")
+    if not base:
+        base = os.path.join(os.getenv("HOME") or tempfile.gettempdir(),
+                            ".local", "share")
+    return os.path.join(base, "terminal-weather", "history")
+
+def parse_time(text, shift=0, now=None):
+    """Return epoch seconds of a time given as text.
+
+    Times are either relative to now, as a number of days, hours or
+    minutes ago (e.g. 7d, 12h, 30m) or ahead if prefixed with '+' (e.g.
+    +5d, for forecasts), "now", or ISO 8601 dates and times
+    (e.g. 2026-10-01 or 2026-10-01T06:00), in the timezone shifted by
+    'shift' seconds from UTC unless given. Raise ValueError if the text
+    is invalid.
+    """
+    now = time.time() if now is None else now
+    text = text.strip()
+    if text == "now":
+        return int(now)
+
+    match = re.fullmatch(r"(\+?)(\d+)([dhm])", text)
+    if match:
+        delta = int(match[2]) * UNITS[match[3]]
+        return int(now) + (delta if match[1] else -delta)
+
+    try:
+        when = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"invalid time: {text} (expected e.g. 7d, 12h, "
+                         "now or an ISO 8601 date)") from None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone(timedelta(seconds=shift)))
+    return int(when.timestamp())
+
+def location_dir(directory, coords):
+    from . import cache
+    return os.path.join(directory,
+                        "{:.2f},{:.2f}".format(*cache.round_coords(coords)))
+
+def typecode(name):
+    return TIME if name in ("dt", "issued") else VALUE
+
+def column_path(path, name):
+    return os.path.join(path, f"{name}.{EXTENSIONS[typecode(name)]}")
+
+def to_records(kind, data, issued):
+    """Return the records of an API response as a list of tuples.
+
+    Tuples: (dt, issued, values), values being aligned with FIELDS.
+    """
+    extractors = tuple(columns.COLUMNS.values())
+
+    def values(weather_dict):
+        return tuple(math.nan if value is None else value
+                     for value in (extract(weather_dict)
+                                   for extract in extractors))
+
+    if kind == "weather":
+        return [(data["dt"], issued, values(data))] if data.get("dt") else []
+    timestamps = sorted(data.get("list") or (), key=lambda ts: ts["dt"])
+    return [(ts["dt"], issued, values(ts)) for ts in timestamps]
+
+def repair(path):
+    """Truncate the columns of a store to their common length.
+
+    Return the number of complete records.
+    """
+    names = ("dt", "issued") + FIELDS
+    sizes = []
+    for name in names:
+        try:
+            sizes.append(os.path.getsize(column_path(path, name)))
+        except OSError:
+            sizes.append(0)
+
+    count = min(size // array(typecode(name)).itemsize
+                for name, size in zip(names, sizes))
+    for name, size in zip(names, sizes):
+        length = count * array(typecode(name)).itemsize
+        if size > length:
+            os.truncate(column_path(path, name), length)
+    return count
+
+def last_value(path, name, count):
+    if not count:
+        return None
+    values = array(typecode(name))
+    with open(column_path(path, name), "rb") as f:
+        f.seek((count - 1) * values.itemsize)
+        values.frombytes(f.read(values.itemsize))
+    return values[0]
+
+def append(path, kind, records):
+    """Append records to a store, see to_records().
+
+    Records that wouldn't come after the last one in the store's order
+    (e.g. the same observation fetched twice) are dropped. Return the
+    number of appended records.
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "lock"), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        count = repair(path)
+        key = "dt" if kind == "weather" else "issued"
+        last = last_value(path, key, count)
+        if last is not None:
+            records = [r for r in records
+                       if (r[0] if kind == "weather" else r[1]) > last]
+        if not records:
+            return 0
+
+        for name, data in (("dt", (r[0] for r in records)),
+                           ("issued", (r[1] for r in records))):
+            with open(column_path(path, name), "ab") as f:
+                f.write(array(TIME, data).tobytes())
+        for i, name in enumerate(FIELDS):
+            with open(column_path(path, name), "ab") as f:
+                f.write(array(VALUE, (r[2][i] for r in records)).tobytes())
+        return len(records)
+
+def write_meta(directory, data):
+    """Write the name, country and timezone of a location if changed."""
+    if "list" in data:
+        city = data.get("city") or {}
+        meta = { "name": city.get("name"),
+                 "country": city.get("country"),
+                 "timezone": city.get("timezone") }
+    else:
+        meta = { "name": data.get("name"),
+                 "country": (data.get("sys") or {}).get("country"),
+                 "timezone": data.get("timezone") }
+
+    path = os.path.join(directory, "meta.json")
+    if read_meta(directory) == meta:
+        return
+
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+def read_meta(directory):
+    try:
+        path = os.path.join(directory, "meta.json")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def record(directory, coords, units, kind, data, issued=None):
+    """Record an API response of the endpoint 'kind' in the store.
+
+    Errors are silently ignored, since recording is only a side effect
+    of fetching data. Return the number of recorded timestamps.
+    """
+    try:
+        location = location_dir(directory, coords)
+        count = append(os.path.join(location, units, kind),
+                       kind,
+                       to_records(kind,
+                                  data,
+                                  int(issued or time.time())))
+        if count:
+            write_meta(location, data)
+        return count
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+class Store:
+    """Read-only view of a store's columns, as of its opening.
+
+    Raise OSError if the store doesn't exist.
+    """
+
+    def __init__(self, path, kind):
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"no history in {path}")
+        self.kind = kind
+        self.maps = []
+        self.columns = {}
+        counts = []
+        for name in ("dt", "issued") + FIELDS:
+            try:
+                with open(column_path(path, name), "rb") as f:
+                    buffer = mmap.mmap(f.fileno(),
+                                       0,
+                                       access=mmap.ACCESS_READ)
+                self.maps.append(buffer)
+            except (OSError, ValueError): # missing or empty
+                buffer = b''
+            view = memoryview(buffer)
+            view = view[:len(view) - len(view) % array(typecode(name))
+                        .itemsize].cast(typecode(name))
+            self.columns[name] = view
+            counts.append(len(view))
+        self.count = min(counts)
+        for name, view in self.columns.items():
+            self.columns[name] = view[:self.count]
+
+    def close(self):
+        """Unmap the columns, unless views returned by select() are alive.
+
+        In that case, they are unmapped when the last view is released.
+        """
+        for view in self.columns.values():
+            view.release()
+        for buffer in self.maps:
+            try:
+                buffer.close()
+            except BufferError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def select(self, start, end, fields, timezone=0, lead=None):
+        """Return records with 'dt' in [start, end) epoch seconds.
+
+        Return a tuple: (columns.Columns, issued), issued being aligned
+        with the columns' dt. Observations are returned as views of the
+        store, forecast timestamps are copied.
+
+        lead -- only keep forecast timestamps made from lead to lead + 3
+        hours in advance (seconds)
+        """
+        dt = self.columns["dt"]
+        issued = self.columns["issued"]
+
+        if self.kind == "weather":
+            i = bisect_left(dt, start)
+            j = bisect_left(dt, end)
+            return (columns.Columns(dt[i:j],
+                                    timezone,
+                                    dict((f, self.columns[f][i:j])
+                                         for f in fields)),
+                    issued[i:j])
+
+        # forecasts of [start, end) were requested up to MAX_LEAD before
+        first = bisect_left(issued, start - MAX_LEAD)
+        last = bisect_left(issued, end)
+        rows = [k for k in range(first, last)
+                if start <= dt[k] < end
+                and (lead is None or lead <= dt[k] - issued[k] < lead + SLOT)]
+        rows.sort(key=lambda k: (dt[k], issued[k]))
+        return (columns.Columns(array(TIME, (dt[k] for k in rows)),
+                                timezone,
+                                dict((f, array('d', (self.columns[f][k]
+                                                     for k in rows)))
+                                     for f in fields)),
+                array(TIME, (issued[k] for k in rows)))
+
+def find(directory, city, country=''):
+    """Return the directory of a location recorded with a name, or None.
+
+    Names and countries (ISO 3166 codes) are matched
+    case-insensitively, countries only if both are known.
+    """
+    city = city.casefold()
+    country = country.casefold()
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return None
+
+    for location in names:
+        path = os.path.join(directory, location)
+        meta = read_meta(path)
+        if (meta.get("name") or '').casefold() == city and \
+           (not country or not meta.get("country")
+            or meta["country"].casefold() == country):
+            return path
+    return None
+
+def locations(directory):
+    """Yield a summary of every store as a dictionary.
+
+    Keys: "location" (rounded coordinates), "name", "units", "kind",
+    "records", "first" and "last" (dt of the first and last records).
+    """
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return
+
+    for location in names:
+        path = os.path.join(directory, location)
+        meta = read_meta(path)
+        for units in owm.SYSTEMS:
+            for kind in KINDS:
+                try:
+                    store = Store(os.path.join(path, units, kind), kind)
+                except OSError:
+                    continue
+                with store:
+                    dt = store.columns["dt"]
+                    yield { "location": location,
+                            "name": meta.get("name"),
+                            "units": units,
+                            "kind": kind,
+                            "records": store.count,
+                            "first": min(dt) if len(dt) else None,
+                            "last": max(dt) if len(dt) else None }
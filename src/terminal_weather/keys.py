@@ -0,0 +1,259 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""API key pool with per-key rate limits and monthly quota accounting."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from . import ratelimit
+
+MONTHLY_QUOTA = 1000000 # OWM free tier monthly calls
+
+SUSPENSION = {
+    # HTTP status code: seconds during which a key isn't used
+    401: 60 * 60, # invalid key, or new key not activated yet
+    429: 60, # rate limit or quota exceeded
+}
+
+def usage_file():
+    base = os.getenv("XDG_STATE_HOME")
+    if not base:
+        base = os.path.join(os.getenv("HOME") or tempfile.gettempdir(),
+                            ".local", "state")
+    return os.path.join(base, "terminal-weather", "usage.json")
+
+def key_id(key):
+    """Identify a key in the usage file without storing the key itself."""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+def mask(key):
+    return '*' * max(0, len(key) - 4) + key[-4:]
+
+def current_month():
+    return time.strftime("%Y-%m", time.gmtime())
+
+def status_code(exception):
+    """Return the HTTP status code of a failed request, if any."""
+    response = getattr(exception, "response", None)
+    return getattr(response, "status_code", None)
+
+def retry_after(exception):
+    """Return the seconds to wait given by a Retry-After header, if any."""
+    response = getattr(exception, "response", None)
+    value = getattr(response, "headers", {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def load_usage(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+class Exhausted(RuntimeError):
+    """Raised when every key is suspended or over its quota.
+
+    retry_after -- seconds until a suspended key can be used again, None
+    if every key is over its quota
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class KeyPool:
+    """Spread API calls across several keys.
+
+    Each key gets its own token bucket for the per-minute rate limit,
+    and, if host_calls is given, a ratelimit.HostBucket of host_calls
+    calls per minute shared with other processes. Keys are skipped for
+    a while after a 401 or 429 response, and for the rest of the month
+    once their monthly quota is used up.
+    """
+
+    def __init__(self,
+                 keys,
+                 calls_per_minute=ratelimit.CALLS_PER_MINUTE,
+                 monthly_quota=MONTHLY_QUOTA,
+                 usage_path=None,
+                 host_calls=0,
+                 max_wait=ratelimit.MAX_WAIT):
+        self.keys = tuple(dict.fromkeys(keys))
+        if not self.keys:
+            raise ValueError("no API keys were given")
+
+        self.buckets = dict((k, ratelimit.TokenBucket.per_minute(
+            calls_per_minute
+        )) for k in self.keys)
+        self.shared = {}
+        for key in self.keys if host_calls else ():
+            bucket = ratelimit.shared(key, host_calls, max_wait)
+            if bucket:
+                self.shared[key] = bucket
+        self.monthly_quota = monthly_quota
+        self.usage_path = usage_path
+        self.month = current_month()
+        self.usage = load_usage(usage_path).get(self.month, {}) \
+            if usage_path else {}
+        self.unsaved = {}
+        self.suspended = {}
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def calls(self, key):
+        """Return the number of calls made with a key this month."""
+        kid = key_id(key)
+        return self.usage.get(kid, 0) + self.unsaved.get(kid, 0)
+
+    def usable(self, key, now):
+        return self.suspended.get(key, 0) <= now \
+            and self.calls(key) < self.monthly_quota
+
+    def take(self):
+        """Return the next key with an available token, waiting if needed.
+
+        Raise Exhausted if every key is suspended or over quota.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                order = self.keys[self.next:] + self.keys[:self.next]
+                usable = tuple(k for k in order if self.usable(k, now))
+                if not usable:
+                    waits = tuple(self.suspended[k] - now for k in self.keys
+                                  if self.calls(k) < self.monthly_quota)
+                    raise Exhausted("no usable API key: all keys are "
+                                    "suspended or over their quota",
+                                    min(waits) if waits else None)
+
+                for key in usable:
+                    if self.buckets[key].try_acquire():
+                        self.next = (self.keys.index(key) + 1) \
+                            % len(self.keys)
+                        return key
+
+                delay = min(self.buckets[k].wait_time() for k in usable)
+            time.sleep(delay)
+
+    def acquire(self):
+        """Return the next key, once a host-wide token of it is taken.
+
+        If the key has no host-wide token left, another usable key with
+        one is returned, otherwise the first key whose token comes within
+        the maximum wait. Raise Exhausted as take(), and
+        ratelimit.Saturated if the host-wide limit would make the call
+        wait too long with any key.
+        """
+        key = self.take()
+        if key not in self.shared or self.shared[key].try_acquire():
+            return key
+
+        with self.lock:
+            now = time.monotonic()
+            i = self.keys.index(key)
+            others = tuple(k for k in self.keys[i + 1:] + self.keys[:i]
+                           if k in self.shared and self.usable(k, now))
+        for other in others:
+            if self.shared[other].try_acquire():
+                # the host-wide limit covers the calls of this process too
+                self.buckets[other].try_acquire()
+                return other
+
+        error = None
+        for k in (key,) + others:
+            try:
+                self.shared[k].acquire()
+                return k
+            except ratelimit.Saturated as e:
+                error = e
+        raise error
+
+    def count(self, key):
+        with self.lock:
+            kid = key_id(key)
+            self.unsaved[kid] = self.unsaved.get(kid, 0) + 1
+
+    def suspend(self, key, seconds):
+        with self.lock:
+            self.suspended[key] = time.monotonic() + seconds
+
+    def call(self, func, *args, **kwargs):
+        """Call func(*args, key, **kwargs) with a key from the pool.
+
+        On a 401 or 429 response, the key is suspended (for as long as
+        a Retry-After header asks, if any) and the call is retried with
+        another key.
+        """
+        error = None
+        for _ in self.keys:
+            key = self.acquire()
+            try:
+                return func(*args, key, **kwargs)
+            except Exception as e:
+                status = status_code(e)
+                if status not in SUSPENSION:
+                    raise
+                seconds = retry_after(e) if status == 429 else None
+                self.suspend(key,
+                             SUSPENSION[status] if seconds is None
+                             else seconds)
+                error = e
+            finally:
+                self.count(key)
+        raise error
+
+    def wrap(self, func):
+        """Make a version of func taking its key from the pool.
+
+        The returned function takes the same arguments as func, except
+        for the key, which must be func's last positional argument.
+        """
+        def pooled(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return pooled
+
+    def save(self):
+        """Add the calls made since the last save to the usage file.
+
+        The file is re-read first, so that counts of concurrent processes
+        add up. Errors are ignored, as accounting is only informative.
+        """
+        if not self.usage_path:
+            return
+
+        with self.lock:
+            unsaved, self.unsaved = self.unsaved, {}
+
+        if not unsaved:
+            return
+
+        try:
+            directory = os.path.dirname(self.usage_path)
+            os.makedirs(directory, exist_ok=True)
+            usage = load_usage(self.usage_path)
+            month = usage.setdefault(self.month, {})
+            for kid, calls in unsaved.items():
+                month[kid] = month.get(kid, 0) + calls
+
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding="utf-8") as f:
+                json.dump(usage, f)
+            os.replace(tmp, self.usage_path)
+            self.usage = month
+        except OSError:
+            pass
@@ -2,11 +2,41 @@
 
 """Printing and formatting procedures"""
 
+import sys
+
+from bisect import bisect_left
 from datetime import datetime, timezone, timedelta
 from functools import partial
 from . import owm
 from . import util
 
+FORMATS = ("table", "tsv", "csv", "ndjson")
+TIME_FIELDS = ("dt", "sunrise", "sunset")
+GLOBAL_FIELDS = ("city", "sunrise", "sunset")
+JSON_ENCODER = None # set by dumps() on first use
+
+def dumps(obj):
+    """Serialize an object to a compact JSON string on a single line.
+
+    orjson is used if it's installed, otherwise the json module with
+    the same separators.
+    """
+    global JSON_ENCODER
+    if JSON_ENCODER is None:
+        try:
+            import orjson
+
+            def encode(obj):
+                return orjson.dumps(obj).decode("utf-8")
+        except ImportError:
+            import json
+
+            encode = partial(json.dumps,
+                             ensure_ascii=False,
+                             separators=(',', ':'))
+        JSON_ENCODER = encode
+    return JSON_ENCODER(obj)
+
 def print_ts(weather_dict,
              fields, *,
              sep,
@@ -15,43 +45,179 @@ def print_ts(weather_dict,
              end='\n',
              lookup=owm.grep_weather,
              time_shift=None,
-             time_format=None):
-    """Extract and print specific fields from a weather dictionary."""
-
-    padding = max(map(len, fields))
-    if time_shift is None:
-        time_shift = lookup(weather_dict, "timezone")
-
-    print(field_delim.join(
-        sep.join(
-            (field.ljust(padding), format_value(
-                field,
-                lookup(weather_dict, field),
-                tzinfo=timezone(timedelta(
-                    seconds=time_shift
-                )),
-                time_format=time_format,
-                units=units))
-        ) for field in fields
-    ), end=end)
+             time_format=None,
+             plan=None,
+             fmt="table"):
+    """Extract and print specific fields from a weather dictionary.
 
-def format_value(field, value, tzinfo, time_format, units):
-    """Make a string representation for a field value."""
+    A plan made by make_plan() can be passed to print many dictionaries
+    with the same fields, otherwise one is made for this call.
+    """
+
+    sys.stdout.write(render_ts(weather_dict,
+                               fields,
+                               sep=sep,
+                               field_delim=field_delim,
+                               units=units,
+                               lookup=lookup,
+                               time_shift=time_shift,
+                               time_format=time_format,
+                               plan=plan,
+                               fmt=fmt) + end)
 
-    if value == None:
-        return '-'
+def render_ts(weather_dict,
+              fields, *,
+              sep,
+              field_delim,
+              units,
+              lookup=owm.grep_weather,
+              time_shift=None,
+              time_format=None,
+              plan=None,
+              fmt="table"):
+    """Return the output of print_ts() as a string, without 'end'."""
+
+    if plan is None:
+        if time_shift is None:
+            time_shift = lookup(weather_dict, "timezone")
+        plan = make_plan(fields,
+                         units=units,
+                         tzinfo=timezone(timedelta(seconds=time_shift or 0)),
+                         time_format=time_format,
+                         lookup=lookup,
+                         fmt=fmt)
 
-    if field in ("dt", "sunrise", "sunset"):
-        utc_time = datetime.fromtimestamp(value, tz=timezone.utc)
-        return utc_time.astimezone(tz=tzinfo).strftime(
-            time_format if field == "dt" else "%I:%M"
+    if fmt == "table":
+        return field_delim.join(
+            label + sep + format(extract(weather_dict))
+            for label, extract, format in plan
         )
 
+    header, write_row = make_writer(fmt, fields)
+    row = write_row(format(extract(weather_dict))
+                    for _, extract, format in plan)
+    return (header + row).rstrip('\n')
+
+def render_line(weather_dict, fields, units, time_format):
+    """Return the values of fields of current weather on one line."""
+    tzinfo = timezone(timedelta(seconds=weather_dict.get("timezone") or 0))
+    return ' '.join(format(extract(weather_dict))
+                    for _, extract, format in make_plan(fields,
+                                                        units,
+                                                        tzinfo,
+                                                        time_format))
+
+def make_plan(fields, units, tzinfo, time_format, lookup=None, fmt="table"):
+    """Resolve how to extract and format each field, once per request.
+
+    Return a tuple of (padded label, extract, format) tuples, where
+    extract takes a weather dictionary and format takes a field value.
+
+    lookup -- a function: (dictionary, field) -> value, used instead of
+    the field registry's extractors
+    fmt -- one of FORMATS; values of other formats than "table" are
+    formatted for machines: numbers without units, times in ISO 8601
+    """
+
+    padding = max(map(len, fields)) if fmt == "table" else 0
+    plan = []
+
+    for field in fields:
+        if lookup is None or lookup is owm.grep_weather:
+            extract = owm.REGISTRY[field].extract
+        else:
+            extract = partial(lambda f, d: lookup(d, f), field)
+
+        if fmt == "table":
+            format = make_formatter(field, tzinfo, time_format, units)
+        else:
+            format = make_raw_formatter(field, tzinfo)
+
+        plan.append((field.ljust(padding), extract, format))
+
+    return tuple(plan)
+
+def make_formatter(field, tzinfo, time_format, units):
+    """Make a function returning the string representation of a value."""
+
+    if field in TIME_FIELDS:
+        fmt = time_format if field == "dt" else "%I:%M"
+
+        def format_time(value):
+            if value is None:
+                return '-'
+            return datetime.fromtimestamp(value, tz=tzinfo).strftime(fmt)
+
+        return format_time
+
     unit = owm.get_unit(field, units)
-    if unit:
-        return f"{value} {unit}"
-    else:
-        return str(value)
+    suffix = f" {unit}" if unit else ''
+
+    def format_value(value):
+        return '-' if value is None else f"{value}{suffix}"
+
+    return format_value
+
+def make_raw_formatter(field, tzinfo):
+    """Make a function converting times of a field to ISO 8601 strings.
+
+    Values of other fields are returned as they are.
+    """
+
+    if field not in TIME_FIELDS:
+        return lambda value: value
+
+    def format_time(value):
+        if value is None:
+            return None
+        return datetime.fromtimestamp(value, tz=tzinfo).isoformat()
+
+    return format_time
+
+def format_value(field, value, tzinfo, time_format, units):
+    """Make a string representation for a field value."""
+    return make_formatter(field, tzinfo, time_format, units)(value)
+
+def make_writer(fmt, fields):
+    """Make the header and a row function of a row-oriented format.
+
+    Return a tuple: (header, write_row), where header is a string and
+    write_row takes an iterable of raw values (see make_raw_formatter)
+    and returns a line, including its line terminator.
+    """
+
+    if fmt == "ndjson":
+        def write_ndjson(values):
+            return dumps(dict(zip(fields, values))) + '\n'
+
+        return '', write_ndjson
+
+    if fmt == "csv":
+        import csv
+        import io
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+
+        def write_csv(values):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow('' if v is None else v for v in values)
+            return buffer.getvalue()
+
+        return write_csv(fields), write_csv
+
+    if fmt == "tsv":
+        def write_tsv(values):
+            return '\t'.join(
+                '' if v is None
+                else str(v).replace('\t', ' ').replace('\n', ' ')
+                for v in values
+            ) + '\n'
+
+        return write_tsv(fields), write_tsv
+
+    raise ValueError(f"unknown output format: {fmt}")
 
 def print_forecast(forecast_dict,
                    fields,
@@ -61,24 +227,92 @@ def print_forecast(forecast_dict,
                    ts_delim,
                    time_format,
                    start_day,
-                   end_day):
+                   end_day,
+                   fmt="table"):
     """Extract and print a list of weather timestamps for specific fields."""
 
-    global_fields = ("city", "sunrise", "sunset")
-    global_fields = tuple(filter(lambda f: f in global_fields, fields))
-    fields = tuple(filter(lambda f: f not in global_fields, ("dt",*fields)))
-
     if not forecast_dict.get("list"):
         return
 
+    sys.stdout.write(render_forecast(forecast_dict,
+                                     fields,
+                                     sep=sep,
+                                     field_delim=field_delim,
+                                     units=units,
+                                     ts_delim=ts_delim,
+                                     time_format=time_format,
+                                     start_day=start_day,
+                                     end_day=end_day,
+                                     fmt=fmt) + '\n')
+
+def render_forecast(forecast_dict,
+                    fields, *,
+                    sep,
+                    field_delim,
+                    units,
+                    ts_delim,
+                    time_format,
+                    start_day,
+                    end_day,
+                    fmt="table"):
+    """Return the output of print_forecast() as a string.
+
+    The timezone, labels, units and day bounds are resolved once for
+    all timestamps, and the output is built as a list of chunks joined
+    at the end.
+    """
+
+    global_fields = tuple(f for f in fields if f in GLOBAL_FIELDS)
+    ts_fields = tuple(f for f in ("dt", *fields) if f not in global_fields)
+
     shift = owm.grep_forecast(forecast_dict, "timezone")
+    tzinfo = timezone(timedelta(seconds=shift or 0))
+    timestamps = select_days(forecast_dict, start_day, end_day)
+
+    global_dict = dict(
+        (f, owm.grep_forecast(forecast_dict, f)) for f in global_fields
+    )
+    global_plan = make_plan(global_fields,
+                            units,
+                            tzinfo,
+                            time_format,
+                            lookup=lambda d, k: d.get(k),
+                            fmt=fmt) if global_fields else ()
+    plan = make_plan(ts_fields, units, tzinfo, time_format, fmt=fmt)
+
+    if fmt == "table":
+        chunks = []
+        if global_fields:
+            chunks.append(field_delim.join(
+                label + sep + format(extract(global_dict))
+                for label, extract, format in global_plan
+            ))
+        for ts in timestamps:
+            chunks.append(field_delim.join(
+                label + sep + format(extract(ts))
+                for label, extract, format in plan
+            ))
+        return ts_delim.join(chunks)
+
+    # row formats repeat the values of global fields on every row
+    head = tuple(format(extract(global_dict))
+                 for _, extract, format in global_plan)
+    header, write_row = make_writer(fmt, global_fields + ts_fields)
+    chunks = [header]
+    for ts in timestamps:
+        chunks.append(write_row(
+            head + tuple(format(extract(ts)) for _, extract, format in plan)
+        ))
+    return ''.join(chunks).rstrip('\n')
+
+def day_bounds(shift, start_day, end_day):
+    """Return epoch seconds of the start of start_day and end of end_day.
+
+    Days are counted from today (day 0) in the timezone shifted by
+    'shift' seconds from UTC.
+    """
+
     tzinfo = timezone(timedelta(seconds=shift))
-    print_data = partial(print_ts,
-                         sep=sep,
-                         field_delim=field_delim,
-                         units=units,
-                         time_shift=shift,
-                         time_format=time_format)
 
     now = datetime.now(tz=tzinfo)
     midnight = datetime(year=now.year,
@@ -88,30 +322,132 @@ def print_forecast(forecast_dict,
 
     start_time = midnight + timedelta(days=start_day)
     end_time = midnight + timedelta(days=end_day+1)
-        
-    def in_range(weather_dict):
-        utc_time = datetime.fromtimestamp(
-            owm.grep_weather(weather_dict, "dt"),
-            tz=timezone.utc
-        )
+    return start_time.timestamp(), end_time.timestamp()
 
-        return utc_time >= start_time and utc_time < end_time
-    
-    timestamps = tuple(filter(in_range, forecast_dict["list"]))
+def select_days(forecast_dict, start_day, end_day):
+    """Return forecast timestamps from start_day to end_day (inclusive).
 
-    if global_fields:
-        global_dict = dict(
-            (f, owm.grep_forecast(forecast_dict, f)) for f in global_fields
+    Days are counted from today (day 0) in the forecast location's
+    timezone.
+    """
+
+    timestamps = forecast_dict.get("list") or ()
+    start, end = day_bounds(owm.grep_forecast(forecast_dict, "timezone") or 0,
+                            start_day,
+                            end_day)
+
+    # timestamps are sorted by time
+    dt = [owm.grep_weather(ts, "dt") for ts in timestamps]
+    return tuple(timestamps[bisect_left(dt, start):bisect_left(dt, end)])
+
+def print_summary(forecast_dict,
+                  fields,
+                  sep,
+                  field_delim,
+                  units,
+                  ts_delim,
+                  time_format,
+                  start_day,
+                  end_day,
+                  period,
+                  fmt="table"):
+    """Print statistics of numeric fields for each period of a forecast.
+
+    period -- a key of columns.PERIODS
+    fmt -- must be "table", the only format of summaries
+    """
+    from . import columns
+
+    if fmt != "table":
+        raise ValueError(f"summaries can't be printed as {fmt}")
+
+    data = columns.to_columns(forecast_dict, fields)
+    data = columns.select(data, *day_bounds(data.timezone, start_day, end_day))
+    print(render_summary(data,
+                         units,
+                         sep=sep,
+                         field_delim=field_delim,
+                         ts_delim=ts_delim,
+                         time_format=time_format,
+                         period=period))
+
+def render_summary(data, units, *, sep, field_delim, ts_delim, time_format,
+                   period):
+    """Return statistics of columns (see columns.py) for each period."""
+    from . import columns
+
+    tzinfo = timezone(timedelta(seconds=data.timezone))
+
+    padding = max(map(len, ("dt", *data.values)))
+    if period == "daily":
+        time_format = "%a %e %b"
+
+    def format_stats(field, stats):
+        unit = owm.get_unit(field, units)
+        suffix = f" {unit}" if unit else ''
+        values = tuple('-' if value is None else f"{round(value, 2):g}{suffix}"
+                       for value in stats.values())
+        if len(values) == 1:
+            return values[0]
+        return ", ".join(f"{stat} {value}"
+                         for stat, value in zip(stats, values))
+
+    periods = []
+    for row in columns.aggregate(data, period):
+        start = datetime.fromtimestamp(row["start"], tz=tzinfo)
+        lines = ["dt".ljust(padding) + sep + start.strftime(time_format)]
+        for field in data.values:
+            lines.append(field.ljust(padding)
+                         + sep
+                         + format_stats(field, row[field]))
+        periods.append(field_delim.join(lines))
+
+    return ts_delim.join(periods)
+
+def render_columns(data, units, *, sep, field_delim, ts_delim, time_format,
+                   issued=None, fmt="table"):
+    """Return the rows of columns (see columns.py), one per timestamp.
+
+    Missing (NaN) values are shown as missing, and values are rounded
+    to the precision of the float32 columns of history stores.
+
+    issued -- times of the requests of the timestamps, shown as an
+    "issued" field after "dt"
+    """
+    tzinfo = timezone(timedelta(seconds=data.timezone))
+    times = ("dt", "issued") if issued is not None else ("dt",)
+    fields = times + tuple(data.values)
+    time_columns = (data.dt, issued) if issued is not None else (data.dt,)
+
+    def value(v):
+        if v != v:
+            return None
+        v = round(v, 6 - len(str(int(abs(v)))))
+        return int(v) if v.is_integer() else v
+
+    rows = zip(*time_columns, *data.values.values())
+    if fmt == "table":
+        padding = max(map(len, fields))
+        formats = tuple(make_formatter("dt" if f in times else f,
+                                       tzinfo,
+                                       time_format,
+                                       units)
+                        for f in fields)
+        return ts_delim.join(
+            field_delim.join(
+                field.ljust(padding) + sep
+                + format(v if field in times else value(v))
+                for field, format, v in zip(fields, formats, row)
+            )
+            for row in rows
         )
-        print_data(global_dict,
-                 global_fields,
-                 lookup=lambda d,k: d.get(k),
-                 end='')
-        if timestamps:
-            print(ts_delim, end='')
-
-    for i, ts in enumerate(timestamps):
-        print_data(ts, fields, end='')
-        if i < len(timestamps) - 1:
-            print(ts_delim, end='')
-    print()
+
+    header, write_row = make_writer(fmt, fields)
+    iso = make_raw_formatter("dt", tzinfo)
+    chunks = [header]
+    for row in rows:
+        chunks.append(write_row(
+            tuple(map(iso, row[:len(times)]))
+            + tuple(map(value, row[len(times):]))
+        ))
+    return ''.join(chunks).rstrip('\n')
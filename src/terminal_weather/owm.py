@@ -2,30 +2,60 @@
 
 """OpenWeatherMap related data and procedures."""
 
+from collections import namedtuple
+
+API_URL = "https://api.openweathermap.org"
 MAX_DAYS = 5 # maximum number of days in weather forecasts
 INTERVAL = 3 # number of hours between weather data records
 
-# todo: change to namedtuples
+Field = namedtuple("Field", ("name", "unit", "extract"))
+Field.__doc__ = """A weather data field.
+
+name -- label used in --fields and output
+unit -- a key of UNITS, or '' for unitless fields
+extract -- a function returning the field's value from an OWM weather
+dictionary, or None if missing
+"""
+
+def from_root(key):
+    return lambda d: d.get(key)
+
+def from_section(section, key, required=False):
+    if required:
+        return lambda d: d[section].get(key)
+    return lambda d: d.get(section) and d[section].get(key)
+
+def rain(weather_dict):
+    # todo: process rain.3h
+    return weather_dict.get("rain") \
+        and weather_dict["rain"].get("1h") \
+        and f"{weather_dict["rain"]["1h"]} (1h)"
+
 FIELDS = (
-    # label, unit
-    ("city", ''),
-    ("desc", ''),
-    ("temp", "temp"),
-    ("feels_like", "temp"),
-    ("temp_min", "temp"),
-    ("temp_max", "temp"),
-    ("pressure", "pressure"),
-    ("humidity", "percent"),
-    ("sea_level", "pressure"),
-    ("grnd_level", "pressure"),
-    ("visibility", "distance"),
-    ("wind_speed", "speed"),
-    ("wind_deg", "angle"),
-    ("wind_gust", "speed"),
-    ("rain", "volume"),
-    ("clouds", "percent"),
-    ("sunrise", ''),
-    ("sunset", '')
+    Field("city", '', from_root("name")),
+    Field("desc", '', lambda d: d["weather"][0].get("description")),
+    Field("temp", "temp", from_section("main", "temp", True)),
+    Field("feels_like", "temp", from_section("main", "feels_like", True)),
+    Field("temp_min", "temp", from_section("main", "temp_min", True)),
+    Field("temp_max", "temp", from_section("main", "temp_max", True)),
+    Field("pressure", "pressure", from_section("main", "pressure", True)),
+    Field("humidity", "percent", from_section("main", "humidity", True)),
+    Field("sea_level", "pressure", from_section("main", "sea_level", True)),
+    Field("grnd_level", "pressure", from_section("main", "grnd_level", True)),
+    Field("visibility", "distance", from_root("visibility")),
+    Field("wind_speed", "speed", from_section("wind", "speed")),
+    Field("wind_deg", "angle", from_section("wind", "deg")),
+    Field("wind_gust", "speed", from_section("wind", "gust")),
+    Field("rain", "volume", rain),
+    Field("clouds", "percent", from_section("clouds", "all")),
+    Field("sunrise", '', from_section("sys", "sunrise", True)),
+    Field("sunset", '', from_section("sys", "sunset", True))
+)
+
+# fields found in responses, but not selectable by users
+HIDDEN_FIELDS = (
+    Field("dt", '', from_root("dt")),
+    Field("timezone", '', from_root("timezone"))
 )
 
 UNITS = {
@@ -39,46 +69,133 @@ UNITS = {
     "volume": ("mm",)*3, # I know volume is 3D. It isn't my fault!
 }
 
+SYSTEMS = ("standard", "metric", "imperial")
+FETCHED = "standard" # units of requests, converted locally
+
+CONVERSIONS = {
+    # unit type: {system: function of a value in standard units}
+    "temp": { "metric": lambda k: round(k - 273.15, 2),
+              "imperial": lambda k: round((k - 273.15) * 1.8 + 32, 2) },
+    "speed": { "imperial": lambda v: round(v * 2.2369363, 2) },
+}
+
+# values of a weather dictionary in each unit type: (section, key)
+CONVERTED = {
+    "temp": (("main", "temp"),
+             ("main", "feels_like"),
+             ("main", "temp_min"),
+             ("main", "temp_max")),
+    "speed": (("wind", "speed"), ("wind", "gust")),
+}
+
+# lookup tables built once, rather than searched for every value
+FIELD_NAMES = tuple(f.name for f in FIELDS)
+FIELD_SET = frozenset(FIELD_NAMES)
+REGISTRY = dict((f.name, f) for f in FIELDS + HIDDEN_FIELDS)
+FIELD_UNITS = dict(
+    (system, dict((f.name, f.unit and UNITS[f.unit][i]) for f in FIELDS))
+    for i, system in enumerate(SYSTEMS)
+)
+
+def converter(unit, system):
+    """Return a function converting values of a unit type, or None.
+
+    Values are converted from standard units to those of a system, and
+    None is returned if they're the same.
+    """
+    return CONVERSIONS.get(unit, {}).get(system)
+
+def make_conversion(system):
+    """Return the conversions of convert() for a system.
+
+    Return a tuple of tuples: (section, ((key, function), ...)), empty
+    if there's nothing to convert.
+    """
+    sections = {}
+    for unit, values in CONVERTED.items():
+        func = converter(unit, system)
+        if func:
+            for section, key in values:
+                sections.setdefault(section, []).append((key, func))
+    return tuple((section, tuple(keys)) for section, keys in sections.items())
+
+CONVERSION_PLANS = dict((system, make_conversion(system))
+                        for system in SYSTEMS)
+
+def convert(data, system):
+    """Convert a weather or forecast response from standard units.
+
+    The response is left untouched: converted sections are copied. All
+    timestamps of a forecast are converted in a single pass.
+    """
+    plan = CONVERSION_PLANS[system]
+    if not plan:
+        return data
+
+    def convert_ts(weather_dict):
+        weather_dict = dict(weather_dict)
+        for section, keys in plan:
+            values = weather_dict.get(section)
+            if not values:
+                continue
+            values = weather_dict[section] = dict(values)
+            for key, func in keys:
+                value = values.get(key)
+                if isinstance(value, (int, float)):
+                    values[key] = func(value)
+        return weather_dict
+
+    if "list" in data:
+        return dict(data, list=[convert_ts(ts) for ts in data["list"]])
+    return convert_ts(data)
+
 def list_fields():
-    return tuple(map(lambda t: t[0], FIELDS))
+    return FIELD_NAMES
 
 def get_unit(field, sys):
-    systems = ("standard", "metric", "imperial")
-    unit_type = next(filter(lambda t: t[0] == field, FIELDS))[1]
-    return unit_type and UNITS[unit_type][systems.index(sys)]
+    return FIELD_UNITS[sys][field]
 
 def grep_weather(weather_dict, field):
     """Find the value of a field in an OWM response dictionary."""
-    if field == "desc":
-        return weather_dict["weather"][0].get("description")
-    elif field in ("temp",
-                   "feels_like",
-                   "temp_min",
-                   "temp_max",
-                   "pressure",
-                   "humidity",
-                   "sea_level",
-                   "grnd_level"):
-        return weather_dict["main"].get(field)
-    elif field in ("dt", "visibility", "timezone"):
-        return weather_dict.get(field)
-    elif field.startswith("wind_"):
-        metric = field.split('_', maxsplit=1)[1]
-        return weather_dict.get("wind") and weather_dict["wind"].get(metric)
-    # todo: process rain.3h
-    elif field == "rain":
-        return weather_dict.get("rain") \
-            and weather_dict["rain"].get("1h") \
-            and f"{weather_dict["rain"]["1h"]} (1h)"
-    elif field == "clouds":
-        return weather_dict.get("clouds") and weather_dict["clouds"].get("all") 
-    elif field in ("sunrise","sunset"):
-        return weather_dict["sys"].get(field)
-    elif field == "city":
-        return weather_dict.get("name")
+    f = REGISTRY.get(field)
+    return f and f.extract(weather_dict)
 
 def grep_forecast(forecast_dict, field):
     if field in ("timezone", "sunrise", "sunset"):
         return forecast_dict.get("city") and forecast_dict["city"].get(field)
     if field == "city":
         return forecast_dict.get("city", {}).get("name")
+
+def geo_direct(transport, city, key, country='', limit=1, api_url=None):
+    """Find locations by name, using the geocoding API.
+
+    api_url -- base URL of the API (default: API_URL), same for all
+    request functions
+    """
+    return transport.get_json(
+        f"{api_url or API_URL}/geo/1.0/direct",
+        params={ "q": ','.join(filter(None, (city, country))),
+                 "limit": limit,
+                 "appid": key }
+    )
+
+def weather(transport, lat, lon, key, units=None, api_url=None):
+    """Get current weather data at some geocoordinates."""
+    return transport.get_json(
+        f"{api_url or API_URL}/data/2.5/weather",
+        params={ "lat": lat, "lon": lon, "appid": key, "units": units }
+    )
+
+def forecast(transport, lat, lon, key, units=None, cnt=None, api_url=None):
+    """Get 3-hour step forecasts for 5 days at some geocoordinates.
+
+    cnt -- maximum number of timestamps (default: all)
+    """
+    return transport.get_json(
+        f"{api_url or API_URL}/data/2.5/forecast",
+        params={ "lat": lat,
+                 "lon": lon,
+                 "appid": key,
+                 "units": units,
+                 "cnt": cnt }
+    )
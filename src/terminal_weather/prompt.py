@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Shell prompt mode: print the last known weather without waiting.
+
+'weather --prompt [OPTIONS]' prints a line of current weather values
+read from a small file, without any request, configuration parsing or
+import of the rest of the program. When the line is older than the
+weather TTL (or missing), a detached process is started to fetch fresh
+data and rewrite the file for the next prompts (see cli.run_prompt()).
+
+Files are kept in the cache directory under "prompt", one per set of
+command-line options, and hold two lines: the epoch seconds after which
+the value is stale, and the value. While a refresh runs, and for RETRY
+seconds after a failed one, a lock file next to it prevents starting
+others.
+
+This module only depends on the standard library, like client.py.
+"""
+
+import os
+import sys
+import time
+import zlib
+
+RETRY = 60 # seconds before retrying a refresh that didn't complete
+IGNORED = ("--prompt", "--refresh") # options that don't change the value
+
+def prompt_dir():
+    """Return the directory of prompt files (it may not exist yet)."""
+    base = os.getenv("XDG_CACHE_HOME")
+    if not base:
+        import tempfile
+        base = os.path.join(os.getenv("HOME") or tempfile.gettempdir(),
+                            ".cache")
+    return os.path.join(base, "terminal-weather", "prompt")
+
+def entry_path(argv):
+    """Return the prompt file of some command-line arguments."""
+    key = '\0'.join([os.getenv("TERMINAL_WEATHER_CF") or '']
+                    + [arg for arg in argv if arg not in IGNORED])
+    return os.path.join(prompt_dir(),
+                        "{:08x}".format(zlib.crc32(key.encode("utf-8"))))
+
+def read(path):
+    """Return a tuple: (stale time, value) of a prompt file.
+
+    Raise OSError or ValueError if it's missing or invalid.
+    """
+    with open(path, encoding="utf-8") as f:
+        stale, value = f.read().split('\n', 1)
+    return float(stale), value
+
+def write(path, value, ttl):
+    """Atomically write a value that goes stale after ttl seconds."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding="utf-8") as f:
+        f.write(f"{time.time() + ttl:.0f}\n{value}")
+    os.replace(tmp, path)
+
+def lock(path):
+    """Create the lock file of a prompt file, return False if it's taken.
+
+    Locks older than RETRY seconds are taken over.
+    """
+    lock_path = path + ".lock"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        pass
+
+    try:
+        if time.time() - os.stat(lock_path).st_mtime < RETRY:
+            return False
+        os.utime(lock_path)
+        return True
+    except OSError:
+        return False
+
+def refresh(argv, path):
+    """Rewrite a prompt file in a detached process, unless one is running.
+
+    The lock is kept after a failed refresh, so that the next one
+    starts at least RETRY seconds later.
+    """
+    try:
+        if not lock(path):
+            return
+    except OSError:
+        return
+
+    sys.stdout.flush()
+    if os.fork():
+        return
+
+    # child: leave the terminal and the caller's pipes
+    status = 1
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        from . import cli
+        cli.main(argv)
+        os.unlink(path + ".lock")
+        status = 0
+    except BaseException:
+        pass
+    finally:
+        os._exit(status)
+
+def main(argv):
+    """Print the value of a prompt file, refresh it if stale."""
+    path = entry_path(argv)
+    try:
+        stale, value = read(path)
+    except (OSError, ValueError):
+        stale, value = 0, None
+
+    if value:
+        sys.stdout.write(value + '\n')
+    if time.time() >= stale:
+        refresh(argv, path)
+    return 0
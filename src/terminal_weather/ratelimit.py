@@ -0,0 +1,237 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Rate limiting of upstream API calls.
+
+TokenBucket limits the calls of a process. HostBucket limits those of
+all processes of a host (or rather, of a user, see runtime_dir()), for
+instance cron jobs and status bars run independently, through a small
+state file per service in a private runtime directory.
+"""
+
+import fcntl
+import functools
+import hashlib
+import os
+import struct
+import threading
+import time
+
+from . import timings
+
+CALLS_PER_MINUTE = 60 # OWM free tier rate limit
+MAX_WAIT = 30 # seconds a call may wait for a host-wide token
+STATE = struct.Struct("<dd") # tokens, epoch seconds of the last update
+
+class Saturated(RuntimeError):
+    """Raised when no host-wide token can be had within the maximum wait."""
+
+def minute_limit(calls):
+    """Return a tuple (rate, capacity) allowing 'calls' calls in any minute.
+
+    A quarter of them can be made at once, the others are spread over the
+    minute, as a full bucket refilled for a minute mustn't exceed 'calls'.
+    """
+    burst = max(1, calls // 4)
+    return max(1, calls - burst) / 60, burst
+
+class TokenBucket:
+    """A thread-safe token bucket.
+
+    Tokens are added continuously at 'rate' tokens per second, up to
+    'capacity' tokens. Each call consumes one token, waiting for it if
+    the bucket is empty.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, calls=CALLS_PER_MINUTE):
+        """Return a bucket allowing at most 'calls' calls in any minute."""
+        rate, capacity = minute_limit(calls)
+        return cls(rate, capacity)
+
+    def refill(self, now):
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available, return whether it was."""
+        with self.lock:
+            self.refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def wait_time(self):
+        """Return the number of seconds until a token is available."""
+        with self.lock:
+            self.refill(time.monotonic())
+            return max(0, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        """Take a token, waiting as long as needed.
+
+        Return the number of seconds spent waiting.
+        """
+        with self.lock:
+            start = time.monotonic()
+            self.refill(start)
+            # the token is reserved now, so waiters are served in order
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def wrap(self, func):
+        """Make a version of func that acquires a token before each call."""
+        @functools.wraps(func)
+        def limited(*args, **kwargs):
+            self.acquire()
+            return func(*args, **kwargs)
+        return limited
+
+def runtime_dir():
+    """Return the directory of host-wide buckets, created if needed.
+
+    It's in the user's runtime directory, whatever the environment, see
+    client.runtime_dir(). Raise OSError if it can't be used safely.
+    """
+    from . import client
+    return client.private_dir(os.path.join(client.runtime_dir(),
+                                           "terminal-weather-ratelimit"))
+
+def host_limit(get_value):
+    """Return a tuple (calls per minute, max wait) of the host-wide limit.
+
+    They are given by the 'host-rate-limit' entry (default: the
+    'rate-limit' entry), 0 disabling the limit, and the 'rate-limit-wait'
+    entry. Raise ValueError if an entry is invalid.
+    """
+    calls = get_value("host-rate-limit")
+    if calls is None:
+        calls = get_value("rate-limit")
+    max_wait = get_value("rate-limit-wait")
+    calls = CALLS_PER_MINUTE if calls is None else int(calls)
+    max_wait = MAX_WAIT if max_wait is None else float(max_wait)
+    if calls < 0 or max_wait < 0:
+        raise ValueError("host-rate-limit and rate-limit-wait can't be "
+                         "negative")
+    return calls, max_wait
+
+def shared(service, calls=CALLS_PER_MINUTE, max_wait=MAX_WAIT):
+    """Return the HostBucket of calls to a service by processes of the host.
+
+    Return None if the runtime directory can't be used safely, in which
+    case calls aren't limited.
+
+    service -- the name of a service, e.g. an API key or a host name,
+    only stored as a hash
+    """
+    name = hashlib.sha1(service.encode("utf-8")).hexdigest()[:12]
+    try:
+        directory = runtime_dir()
+    except OSError:
+        return None
+    return HostBucket.per_minute(os.path.join(directory, name),
+                                 calls,
+                                 max_wait)
+
+class HostBucket:
+    """A token bucket shared by the processes of a host through a file.
+
+    The file holds the number of tokens and the time they were counted,
+    read and written under an exclusive lock. As in TokenBucket, a token
+    is reserved as soon as the lock is held, so that processes are served
+    in the order they asked, unless it would mean waiting more than
+    max_wait seconds, in which case Saturated is raised. Calls aren't
+    limited if the file can't be used.
+    """
+
+    def __init__(self, path, rate, capacity=None, max_wait=MAX_WAIT):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.max_wait = max_wait
+
+    @classmethod
+    def per_minute(cls, path, calls=CALLS_PER_MINUTE, max_wait=MAX_WAIT):
+        """Return a bucket allowing at most 'calls' calls in any minute."""
+        rate, capacity = minute_limit(calls)
+        return cls(path, rate, capacity, max_wait)
+
+    def reserve(self, max_wait=None):
+        """Reserve a token, return the number of seconds to wait for it.
+
+        Keyword argument:
+        max_wait -- overrides the bucket's maximum wait, 0 only reserving
+        a token available at once
+
+        Raise OSError if the file can't be used, or if its directory
+        isn't private to the user (see client.private_dir()).
+        """
+        from . import client
+        client.private_dir(os.path.dirname(self.path))
+        # a link in place of the file would make it write to its target
+        fd = os.open(self.path,
+                     os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC,
+                     0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                tokens, updated = STATE.unpack(os.pread(fd, STATE.size, 0))
+            except struct.error: # new or truncated file
+                tokens, updated = self.capacity, now
+            tokens = min(self.capacity,
+                         tokens + max(0, now - updated) * self.rate) - 1
+            delay = -tokens / self.rate if tokens < 0 else 0
+            max_wait = self.max_wait if max_wait is None else max_wait
+            if delay > max_wait:
+                raise Saturated(f"rate limit: no call can be made within "
+                                f"{max_wait:g} seconds")
+            os.pwrite(fd, STATE.pack(tokens, now), 0)
+            return delay
+        finally:
+            os.close(fd) # and release the lock
+
+    def try_acquire(self):
+        """Take a token if one is available at once, return whether it was."""
+        try:
+            self.reserve(max_wait=0)
+        except Saturated:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def acquire(self):
+        """Take a token, waiting for it if needed.
+
+        Return the number of seconds spent waiting, which is recorded as
+        the "ratelimit" phase of timings.
+        """
+        with timings.phase("ratelimit"):
+            try:
+                delay = self.reserve()
+            except OSError:
+                return 0
+            if delay:
+                time.sleep(delay)
+        return delay
+
+    def wrap(self, func):
+        """Make a version of func that acquires a token before each call."""
+        @functools.wraps(func)
+        def limited(*args, **kwargs):
+            self.acquire()
+            return func(*args, **kwargs)
+        return limited
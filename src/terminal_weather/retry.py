@@ -0,0 +1,194 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Retries with exponential backoff and circuit breaking of requests.
+
+Connection errors, timeouts, 429 and 5xx responses are retried after
+an exponentially growing delay with full jitter, or after the delay
+given by a Retry-After header, as long as the total time stays within
+a deadline. Other errors (e.g. 401, 404 or invalid responses) are raised
+at once. When every API key is suspended (keys.Exhausted, e.g. after a
+429 response), calls are retried once a key can be used again, unless
+that's past the deadline.
+
+Each upstream service has a circuit breaker: after a number of
+consecutive failures, calls fail immediately with CircuitOpen during a
+cooldown, after which a single trial call decides whether the circuit
+closes again. Calls failing before any request is made (no usable key,
+host-wide rate limit) count neither as failures nor as successes.
+"""
+
+import random
+import threading
+import time
+
+from .keys import Exhausted, retry_after, status_code
+from .ratelimit import Saturated
+
+RETRIES = 2 # attempts after the first one
+BACKOFF = 0.5 # seconds before the first retry, doubling after each one
+BACKOFF_MAX = 8 # seconds
+DEADLINE = 30 # seconds for all attempts of a call
+BREAKER_THRESHOLD = 5 # consecutive failures opening a circuit
+BREAKER_COOLDOWN = 30 # seconds during which an open circuit fails fast
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a service that keeps failing."""
+
+def retryable(exception):
+    """Return whether a failed call may succeed if made again."""
+    if isinstance(exception, Exhausted):
+        return exception.retry_after is not None
+    status = status_code(exception)
+    if status is not None:
+        return status in RETRY_STATUS
+    # invalid responses, although requests' JSON errors are OSErrors
+    from requests.exceptions import InvalidJSONError
+    if isinstance(exception, (ValueError, InvalidJSONError)):
+        return False
+    # connection errors and timeouts, including those of requests
+    return isinstance(exception, OSError)
+
+class CircuitBreaker:
+    """Count consecutive failures of a service and stop calling it."""
+
+    def __init__(self,
+                 name,
+                 threshold=BREAKER_THRESHOLD,
+                 cooldown=BREAKER_COOLDOWN,
+                 clock=time.monotonic):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened = None # time the circuit opened, None if closed
+        self.trial = False # whether a trial call is in progress
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may be made now."""
+        with self.lock:
+            if self.opened is None:
+                return
+            remaining = self.opened + self.cooldown - self.clock()
+            if remaining <= 0 and not self.trial:
+                self.trial = True # half-open: let a single call through
+                return
+        raise CircuitOpen(f"{self.name} is failing, not calling it for "
+                          f"{max(remaining, 0):.0f} more seconds")
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened = self.clock()
+            self.trial = False
+
+    def release(self):
+        """End a call that made no request, letting another one be tried."""
+        with self.lock:
+            self.trial = False
+
+class RetryPolicy:
+    """Call functions with retries, each service behind a circuit breaker.
+
+    Keyword arguments:
+    retries -- maximum number of attempts after the first one
+    backoff -- seconds before the first retry, doubled after each one
+    and randomized between 0 and this value (full jitter)
+    backoff_max -- maximum seconds between attempts
+    deadline -- maximum seconds spent on a call, waits included; a retry
+    that couldn't start in time isn't made
+    threshold, cooldown -- settings of the circuit breakers
+    """
+
+    def __init__(self,
+                 retries=RETRIES,
+                 backoff=BACKOFF,
+                 backoff_max=BACKOFF_MAX,
+                 deadline=DEADLINE,
+                 threshold=BREAKER_THRESHOLD,
+                 cooldown=BREAKER_COOLDOWN,
+                 clock=time.monotonic,
+                 sleep=time.sleep):
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.sleep = sleep
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, name):
+        with self.lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(name,
+                                                     self.threshold,
+                                                     self.cooldown,
+                                                     self.clock)
+            return self.breakers[name]
+
+    def delay(self, attempt, exception):
+        """Return seconds to wait before a retry (attempt >= 1)."""
+        if isinstance(exception, Exhausted):
+            return exception.retry_after
+        if status_code(exception) == 429:
+            seconds = retry_after(exception)
+            if seconds is not None:
+                return seconds
+        return random.uniform(0, min(self.backoff_max,
+                                     self.backoff * 2 ** (attempt - 1)))
+
+    def call(self, name, func, *args, **kwargs):
+        """Call func(*args, **kwargs) as a request to the service 'name'."""
+        return self.attempt(name, self.deadline, func, args, kwargs)
+
+    def attempt(self, name, deadline, func, args, kwargs):
+        """Call func(*args, **kwargs), retrying it within deadline seconds."""
+        breaker = self.breaker(name)
+        end = self.clock() + deadline
+        attempt = 0
+        while True:
+            breaker.allow()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if isinstance(e, (Exhausted, Saturated)):
+                    breaker.release() # no request was made
+                elif retryable(e):
+                    breaker.failure()
+                else:
+                    breaker.success() # the service did answer
+                if not retryable(e):
+                    raise
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                delay = self.delay(attempt, e)
+                if self.clock() + delay > end:
+                    raise
+                self.sleep(delay)
+            else:
+                breaker.success()
+                return result
+
+    def wrap(self, name, func, deadline=None):
+        """Make a version of func called through this policy.
+
+        deadline -- overrides the policy's deadline, e.g. when an answer
+        is of no use after a shorter time
+        """
+        deadline = self.deadline if deadline is None else deadline
+        def retried(*args, **kwargs):
+            return self.attempt(name, deadline, func, args, kwargs)
+        return retried
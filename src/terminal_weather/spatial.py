@@ -0,0 +1,145 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Coalescing of requests for nearby coordinates.
+
+Coordinates are snapped to the center of a cell, either of a geohash of
+some precision or of a grid of latitude/longitude steps, so that every
+location of a cell shares one upstream request. The weather model's
+resolution makes the responses of nearby points practically identical
+anyway.
+
+Precisions are strings: "geohash:N" for geohash cells of N characters
+(e.g. 5 for about 4.9 km x 4.9 km at the equator, 6 for 1.2 km x 0.6 km)
+or "grid:DEGREES" (e.g. grid:0.05 for about 5.5 km of latitude).
+"""
+
+import threading
+import time
+
+from collections import OrderedDict
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MEMO_SIZE = 256 # responses kept in memory by a Coalescer
+
+def geohash(lat, lon, precision):
+    """Return the geohash of some coordinates, and its bounding box.
+
+    The box is a tuple: (south, north, west, east).
+    """
+    box = [-90.0, 90.0, -180.0, 180.0]
+    chars = []
+    even = True # bits alternate between longitude and latitude
+    bits = value = 0
+    while len(chars) < precision:
+        low, high, x = (2, 3, lon) if even else (0, 1, lat)
+        middle = (box[low] + box[high]) / 2
+        value <<= 1
+        if x >= middle:
+            value |= 1
+            box[low] = middle
+        else:
+            box[high] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars), tuple(box)
+
+def make_snapper(precision):
+    """Make a function snapping coordinates to the center of their cell.
+
+    The function takes a latitude and a longitude, and returns a tuple:
+    (cell name, (latitude, longitude)). Raise ValueError if the
+    precision string is invalid.
+    """
+    kind, _, value = precision.partition(':')
+    try:
+        if kind == "geohash":
+            length = int(value)
+            if not 1 <= length <= 12:
+                raise ValueError
+
+            def snap(lat, lon):
+                cell, (south, north, west, east) = geohash(float(lat),
+                                                           float(lon),
+                                                           length)
+                return cell, (round((south + north) / 2, 6),
+                              round((west + east) / 2, 6))
+            return snap
+
+        if kind == "grid":
+            step = float(value)
+            if not 0 < step <= 90:
+                raise ValueError
+
+            def snap(lat, lon):
+                row = int(min(float(lat) + 90, 180 - step / 2) // step)
+                column = int((float(lon) + 180) % 360 // step)
+                # the last column is narrower if step doesn't divide 360
+                west = column * step - 180
+                return f"{row},{column}", (
+                    round(min(90.0, (row + 0.5) * step - 90), 6),
+                    round((west + min(west + step, 180)) / 2, 6)
+                )
+            return snap
+    except ValueError:
+        pass
+
+    raise ValueError(f"invalid precision: {precision} (expected "
+                     "geohash:LENGTH or grid:DEGREES)")
+
+class Coalescer:
+    """Share the results of calls with the same key.
+
+    A call whose key is already being computed by another thread waits
+    for that result instead of calling the function again. Results are
+    kept for later calls, up to MEMO_SIZE of them and for at most 'ttl'
+    seconds each.
+    """
+
+    def __init__(self, size=MEMO_SIZE, clock=time.monotonic):
+        self.size = size
+        self.clock = clock
+        self.memo = OrderedDict() # key: (time, result)
+        self.inflight = {} # key: threading.Event
+        self.lock = threading.Lock()
+
+    def call(self, key, ttl, func, *args, fresh=False):
+        """Return func(*args), or the result of a call with the same key.
+
+        Keyword argument:
+        fresh -- ignore kept results, but still join a call in progress
+        """
+        while True:
+            with self.lock:
+                now = self.clock()
+                entry = self.memo.get(key)
+                if entry and not fresh and \
+                   (ttl is None or now - entry[0] <= ttl):
+                    self.memo.move_to_end(key)
+                    return entry[1]
+                event = self.inflight.get(key)
+                if event is None:
+                    event = self.inflight[key] = threading.Event()
+                    break
+            event.wait()
+            with self.lock:
+                entry = self.memo.get(key)
+            if entry and entry[0] >= now:
+                # the call completed while waiting, its result is fresh
+                return entry[1]
+            # the call failed, try it in this thread
+
+        try:
+            result = func(*args)
+            with self.lock:
+                self.memo[key] = (self.clock(), result)
+                self.memo.move_to_end(key)
+                while len(self.memo) > self.size:
+                    self.memo.popitem(last=False)
+            return result
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            event.set()
@@ -0,0 +1,159 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Wall time per phase, traffic and cache statistics of a run.
+
+Nothing is recorded unless start() is called, so the hooks spread over
+the program (phase(), count(), cache_lookup() and cell()) only cost
+a context variable lookup when timings are disabled. Library users can
+record their own calls the same way:
+
+    with timings.recording() as recorder:
+        ...
+    print(recorder.report())
+
+Recorders are kept in a context variable, so that concurrent runs
+(e.g. queries answered by threads of the daemon, or asyncio tasks)
+each record their own statistics. Work handed to other threads is
+recorded by the caller's recorder if wrapped with inherit().
+"""
+
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+RECORDER = ContextVar("terminal_weather.timings", default=None)
+NULL = nullcontext()
+
+class Recorder:
+    """Accumulated statistics, from its creation on."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.phases = {} # name: [seconds, count]
+        self.counters = { "requests": 0, "bytes": 0 }
+        self.cache = {} # namespace: [hits, misses]
+        self.cells = {} # namespace: {cell: number of requested locations}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                total = self.phases.setdefault(name, [0, 0])
+                total[0] += elapsed
+                total[1] += 1
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def cache_lookup(self, namespace, hit):
+        with self.lock:
+            self.cache.setdefault(namespace, [0, 0])[0 if hit else 1] += 1
+
+    def cell(self, namespace, name):
+        with self.lock:
+            cells = self.cells.setdefault(namespace, {})
+            cells[name] = cells.get(name, 0) + 1
+
+    def report(self):
+        """Return the statistics as a JSON-serializable dictionary.
+
+        Keys: "total_ms", "phases" (name: {"ms", "count"}), "cache"
+        (namespace: {"hits", "misses"}), "cells" (namespace: {"cells",
+        "locations", "largest"}: locations snapped to shared cells, see
+        spatial.py) and counters such as "requests" and "bytes" (received
+        from the network).
+        """
+        with self.lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.start) * 1000,
+                                  3),
+                "phases": dict(
+                    (name, { "ms": round(seconds * 1000, 3), "count": n })
+                    for name, (seconds, n) in self.phases.items()
+                ),
+                "cache": dict(
+                    (ns, { "hits": hits, "misses": misses })
+                    for ns, (hits, misses) in self.cache.items()
+                ),
+                "cells": dict(
+                    (ns, { "cells": len(cells),
+                           "locations": sum(cells.values()),
+                           "largest": max(cells.values()) })
+                    for ns, cells in self.cells.items()
+                ),
+                **self.counters
+            }
+
+def current():
+    """Return the recorder of the current context, or None."""
+    return RECORDER.get()
+
+def start():
+    """Start recording with a new recorder and return it."""
+    recorder = Recorder()
+    RECORDER.set(recorder)
+    return recorder
+
+def stop():
+    """Stop recording and return the recorder, if any."""
+    recorder = RECORDER.get()
+    RECORDER.set(None)
+    return recorder
+
+@contextmanager
+def recording():
+    """Record statistics within a with block."""
+    recorder = start()
+    try:
+        yield recorder
+    finally:
+        stop()
+
+def inherit(func):
+    """Make a version of func recording with the caller's recorder.
+
+    Threads start without a recorder: functions run in other threads
+    (e.g. by an executor) must be wrapped to be recorded.
+    """
+    recorder = RECORDER.get()
+    if recorder is None:
+        return func
+
+    def inheriting(*args, **kwargs):
+        token = RECORDER.set(recorder)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            RECORDER.reset(token)
+    return inheriting
+
+def phase(name):
+    """Return a context manager timing a phase of the run."""
+    recorder = RECORDER.get()
+    if recorder is None:
+        return NULL
+    return recorder.phase(name)
+
+def count(name, value=1):
+    recorder = RECORDER.get()
+    if recorder is not None:
+        recorder.count(name, value)
+
+def cache_lookup(namespace, hit):
+    recorder = RECORDER.get()
+    if recorder is not None:
+        recorder.cache_lookup(namespace, hit)
+
+def cell(namespace, name):
+    """Record a location snapped to a cell."""
+    recorder = RECORDER.get()
+    if recorder is not None:
+        recorder.cell(namespace, name)
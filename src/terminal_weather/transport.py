@@ -0,0 +1,93 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Shared HTTP transport for all outbound requests."""
+
+import threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from . import timings
+
+CONNECT_TIMEOUT = 3.05 # seconds
+READ_TIMEOUT = 10 # seconds
+POOL_SIZE = 10 # maximum number of kept-alive connections per host
+
+class HTTPError(requests.HTTPError):
+    """An HTTP error response, with the server's message if it sent one."""
+
+class Transport:
+    """A keep-alive HTTP session with timeouts and traffic statistics.
+
+    A single instance is meant to be shared by every request of a run
+    (and across threads), so that consecutive requests to the same host
+    reuse one connection.
+    """
+
+    def __init__(self,
+                 connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT,
+                 pool_size=POOL_SIZE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": "terminal-weather"
+        })
+        self.adapter = HTTPAdapter(pool_connections=pool_size,
+                                   pool_maxsize=pool_size)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.received = 0 # bytes read from the network (compressed)
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        """Send a GET request and return the response.
+
+        Raise HTTPError for error responses.
+        """
+        response = self.session.get(url,
+                                    params=params,
+                                    timeout=timeout or self.timeout)
+        received = response.raw.tell() if response.raw else 0
+        received = received or len(response.content)
+        with self.lock:
+            self.received += received
+        timings.count("requests")
+        timings.count("bytes", received)
+
+        if not response.ok:
+            try:
+                message = response.json()["message"]
+            except Exception:
+                message = response.reason
+            raise HTTPError(f"{response.status_code} {message} ({url})",
+                            response=response)
+        return response
+
+    def get_json(self, url, params=None, timeout=None):
+        return self.get(url, params=params, timeout=timeout).json()
+
+    def stats(self):
+        """Return a dictionary of traffic statistics.
+
+        Keys: "requests", "connections" (newly opened), "reused"
+        (requests sent over an already open connection), "bytes"
+        (received from the network).
+        """
+        requests_sent = connections = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+
+        return {
+            "requests": requests_sent,
+            "connections": connections,
+            "reused": requests_sent - connections,
+            "bytes": self.received
+        }
+
+    def close(self):
+        self.session.close()
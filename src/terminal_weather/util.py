@@ -5,51 +5,144 @@
 import math
 import re
 import sys
-import requests
 
-from datetime import datetime
 from . import owm
+from . import timings
             
-def get_location(conf):
-    template = ("lat", "lon", "country_name", "country_code", "city")
+GEOIP_TIMEOUT = 5 # seconds allowed for geoip providers to answer
+GEOIP_TEMPLATE = ("lat", "lon", "country_name", "country_code", "city")
+
+def query_geoip(transport, url, fields, timeout=GEOIP_TIMEOUT):
+    """Get a location dictionary from a single geoip provider."""
+    json = transport.get_json(url, timeout=timeout)
+    location = dict(((key, json.get(field))
+                     for key,field in zip(GEOIP_TEMPLATE, fields)))
+    if location["lat"] is None or location["lon"] is None:
+        raise ValueError("no geocoordinates in response from: " + url)
+    return location
+
+def get_location(conf, transport, timeout=GEOIP_TIMEOUT, policy=None):
+    """Query all configured geoip providers concurrently.
+
+    Return the location of the first provider to give a valid answer
+    within timeout seconds, the remaining queries are abandoned: they
+    run in daemon threads, which don't delay the exit, and can't take
+    more than timeout seconds either. If all of them fail, the last
+    error is raised, TimeoutError if none answered in time.
+
+    policy -- a retry.RetryPolicy retrying failed queries within the
+    timeout, each provider having its own circuit breaker
+
+    Queries to each provider are limited by a host-wide rate limit, see
+    ratelimit.host_limit().
+    """
     urls = conf("geoip-url")
     fields = conf("geoip-fields")
 
     if not urls:
         return
 
-    for i in range(len(urls)):
-        current_fields = tuple((f.strip() for f in fields[i].split(',')))
-        if len(current_fields) != len(template):
-            raise ValueError("invalid number of fields for geoip-url:",
-                             urls[i])
-        
-        response = requests.get(urls[i])
-        if response.ok:
-            json = response.json()
-            return dict(((key, json[field])
-                         for key,field in zip(template,current_fields)))
-        else:
-            response.raise_for_status()
-            
+    if not fields or len(fields) != len(urls):
+        raise ValueError("each geoip-url must have a matching geoip-fields")
+
+    providers = []
+    for url, current_fields in zip(urls, fields):
+        current_fields = separate(current_fields)
+        if len(current_fields) != len(GEOIP_TEMPLATE):
+            raise ValueError("invalid number of fields for geoip-url:", url)
+        providers.append((url, current_fields))
+
+    import queue
+    import threading
+    import time
+    from urllib.parse import urlsplit
+    from . import ratelimit
+
+    calls, max_wait = ratelimit.host_limit(conf)
+    end = time.monotonic() + timeout
+    results = queue.Queue()
+
+    def query(transport, url, fields):
+        # each attempt only has the time left until the deadline
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"no answer from {url} within {timeout:g} "
+                               "seconds")
+        return query_geoip(transport, url, fields, remaining)
+
+    def limited(url):
+        func = query
+        # tokens that would come after the deadline are of no use
+        bucket = calls and ratelimit.shared(urlsplit(url).netloc,
+                                            calls,
+                                            min(max_wait, timeout))
+        if bucket:
+            func = bucket.wrap(func)
+        return policy.wrap(url, func, deadline=timeout) if policy else func
+
+    def run(func, *args):
+        try:
+            results.put((func(*args), None))
+        except Exception as e:
+            results.put((None, e))
+
+    for url, f in providers:
+        threading.Thread(target=timings.inherit(run),
+                         args=(limited(url), transport, url, f),
+                         daemon=True).start()
+
+    error = None
+    for _ in providers:
+        try:
+            location, error = results.get(timeout=max(0, end -
+                                                      time.monotonic()))
+        except queue.Empty:
+            raise TimeoutError(f"no geoip provider answered within "
+                               f"{timeout:g} seconds") from None
+        if error is None:
+            return location
+    raise error
+
 def prompt(question):
     answer = input(f"{question} ").lower()
     while answer not in ("yes", "no"):
         answer = input("Please answer with 'yes' or 'no':").lower()
     return answer
 
-def guess_location(lookup, debug=False):
+def guess_location(lookup, transport, debug=False, policy=None):
     """Try to find user's location coordinates.
 
     If succesfull, return a tuple of coordinates (latitude, longitude),
     otherwise return None.
 
-    Positional argument:
+    Positional arguments:
     lookup -- a function that can lookup configuration entries
+    transport -- a transport.Transport for HTTP requests
+
+    Keyword arguments:
     debug -- enable debugging messages
+    policy -- as in get_location()
     """
+    from . import cache
+
     try:
-        location = get_location(lookup)
+        use_cache = not lookup("no-cache")
+        key = cache.make_key(lookup("geoip-url"), lookup("geoip-fields"))
+        with timings.phase("geoip"):
+            location = use_cache and cache.load("geoip",
+                                                key,
+                                                cache.TTL["geoip"])
+            if not location:
+                timeout = lookup("geoip-timeout")
+                location = get_location(
+                    lookup,
+                    transport,
+                    timeout=float(timeout) if timeout else GEOIP_TIMEOUT,
+                    policy=policy
+                )
+                if location and use_cache:
+                    cache.store("geoip", key, location)
+
         if location:
             print(f"It appears that you are in {location["city"]},",
                   location["country_name"])
@@ -70,6 +163,17 @@ def separate(csv):
     """
     return tuple(value.strip() for value in csv.split(','))
 
+def split_location(location):
+    """Split a location string of the form city[,country].
+
+    Return a tuple: (city, country), where country may be empty.
+    Raise ValueError if the string is invalid.
+    """
+    parts = separate(location)
+    if len(parts) > 2 or not parts[0]:
+        raise ValueError(f"invalid location string: {location}")
+    return parts[0], parts[1] if len(parts) == 2 else ''
+
 def error(msg, exit_code=2, prefix="Error: "):
     """Exit with an error message.
 
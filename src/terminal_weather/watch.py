@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Resident mode redrawing weather data as it changes.
+
+Instead of polling on a fixed timer, the next request is scheduled for
+when the API is expected to have new data: current weather is updated
+about every 10 minutes after its 'dt' time, and forecasts when their
+next timestamp is reached. In between, the output is rendered again
+every interval (e.g. to follow the day range) and only the terminal
+lines whose text changed are redrawn. Failed requests are retried with
+an exponential backoff while the last data stays on screen.
+"""
+
+import io
+import time
+
+from contextlib import redirect_stdout
+
+WEATHER_CADENCE = 10 * 60 # seconds between updates of current weather
+FORECAST_CADENCE = 3 * 60 * 60 # seconds between forecast timestamps
+BACKOFF_START = 15 # seconds before retrying after a first failure
+BACKOFF_MAX = 15 * 60
+
+def next_refresh(data, now, interval):
+    """Return the time (epoch seconds) of the next request.
+
+    Positional arguments:
+    data -- the last API response
+    now -- time of the last request
+    interval -- minimum number of seconds between requests
+    """
+    if "list" in data:
+        upcoming = [ts["dt"] for ts in data["list"] if ts["dt"] > now]
+        expected = min(upcoming) if upcoming else now + FORECAST_CADENCE
+    else:
+        expected = (data.get("dt") or 0) + WEATHER_CADENCE
+        if expected <= now:
+            # the station hasn't reported for a while
+            expected = now + WEATHER_CADENCE
+    return max(expected, now + interval)
+
+def backoff(failures):
+    """Return seconds to wait after a number of consecutive failures."""
+    return min(BACKOFF_START * 2 ** (failures - 1), BACKOFF_MAX)
+
+def redraw(old, new):
+    """Return terminal output turning the lines 'old' into 'new'.
+
+    The cursor is expected at the start of the line below 'old', and is
+    left below 'new'. Lines of equal count are rewritten in place, one by
+    one, otherwise everything after the first difference is redrawn.
+    """
+    if old is None:
+        return ''.join(line + '\n' for line in new)
+
+    changed = [i for i, (a, b) in enumerate(zip(old, new)) if a != b]
+    if len(old) == len(new):
+        return ''.join(
+            f"\x1b[{len(old) - i}F{new[i]}\x1b[K\x1b[{len(old) - i}E"
+            for i in changed
+        )
+
+    first = min(changed + [min(len(old), len(new))])
+    up = f"\x1b[{len(old) - first}F" if len(old) > first else ''
+    return up + ''.join(line + "\x1b[K\n" for line in new[first:]) + "\x1b[J"
+
+def capture(func, *args, **kwargs):
+    """Return what a function prints to stdout, without trailing newlines."""
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        func(*args, **kwargs)
+    return buffer.getvalue().rstrip('\n')
+
+def run(fetch, render, interval, stream, clock=time.time, sleep=time.sleep):
+    """Fetch and draw data until interrupted.
+
+    Positional arguments:
+    fetch -- a function taking a boolean: whether cached data must be
+    ignored (always true but for the first call), returning a response
+    render -- a function turning a response into a string
+    interval -- seconds between redraws, and at least between requests
+    stream -- the output stream, updated in place if it's a terminal
+
+    Keyword arguments:
+    clock -- a function returning the current epoch time
+    sleep -- a function sleeping for a number of seconds
+    """
+    tty = stream.isatty()
+    data = None
+    lines = None
+    status = None
+    failures = 0
+    next_fetch = 0
+
+    while True:
+        now = clock()
+        if now >= next_fetch:
+            try:
+                data = fetch(data is not None)
+                failures = 0
+                status = None
+                next_fetch = next_refresh(data, now, interval)
+            except Exception as e:
+                failures += 1
+                delay = backoff(failures)
+                next_fetch = now + delay
+                message = ' '.join(str(e).split()) or type(e).__name__
+                status = f"Error: {message} (retrying in {delay} s)"
+
+        new = render(data).split('\n') if data is not None else []
+        if status:
+            new.append(status)
+
+        if tty:
+            stream.write(redraw(lines, new))
+        elif new != lines:
+            # blank lines separate successive outputs
+            stream.write(('\n' if lines else '')
+                         + ''.join(line + '\n' for line in new))
+        stream.flush()
+        lines = new
+
+        now = clock()
+        sleep(max(0, min(next_fetch, now + interval) - now))
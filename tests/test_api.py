@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from terminal_weather import api, ratelimit
+
+WEATHER = { "name": "Rabat",
+            "weather": [{ "description": "clear sky" }],
+            "main": { "temp": 21.3 },
+            "dt": 1000,
+            "timezone": 0 }
+# as sent by the API, which the client always requests in standard units
+STANDARD = dict(WEATHER, main={ "temp": 294.45 })
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        time.sleep(0.05)
+        if self.path.startswith("/geo/"):
+            status = 200
+            body = [] if "nowhere" in self.path \
+                else [{ "lat": 34.0, "lon": -6.8 }]
+        elif "lat=0.0" in self.path:
+            status, body = 404, { "message": "city not found" }
+        else:
+            assert "units=standard" in self.path
+            status, body = 200, STANDARD
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
+    monkeypatch.setattr(ratelimit, "runtime_dir", lambda: str(tmp_path))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.paths = []
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    client = api.Client(key="key",
+                        api_url=f"http://127.0.0.1:{httpd.server_port}",
+                        retries=0)
+    client.paths = httpd.paths
+    yield client
+    client.close()
+    httpd.shutdown()
+    thread.join()
+
+def test_config():
+    with pytest.raises(api.ConfigError):
+        api.Client()
+    with pytest.raises(api.ConfigError):
+        api.Client(key="key", workers=0)
+
+def test_shared_requests(client):
+    async def main():
+        return await asyncio.gather(*(client.current("Rabat,MA")
+                                      for _ in range(20)))
+
+    results = asyncio.run(main())
+    assert all(r == WEATHER for r in results)
+    assert len(client.paths) == 2 # one geocoding and one weather request
+
+    # cached from now on
+    assert asyncio.run(client.current((34.0, -6.8))) == WEATHER
+    assert len(client.paths) == 2
+
+def test_errors(client):
+    with pytest.raises(api.LocationError, match="nowhere"):
+        asyncio.run(client.resolve("nowhere"))
+    with pytest.raises(api.LocationError):
+        asyncio.run(client.current("a,b,c"))
+    with pytest.raises(api.UpstreamError) as e:
+        asyncio.run(client.current("0,0"))
+    assert e.value.status == 404
+
+def test_render(client):
+    text = asyncio.run(client.render(WEATHER, fields=("city", "temp")))
+    assert text == "city\tRabat\ntemp\t21.3 °C"
+    with pytest.raises(api.ConfigError):
+        asyncio.run(client.render(WEATHER, fields=("bogus",)))
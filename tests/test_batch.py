@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+import pytest
+from terminal_weather import batch, cli, ratelimit
+
+WEATHER = {
+    "name": "Rabat",
+    "weather": [{ "description": "clear sky" }],
+    "main": { "temp": 21.5 },
+}
+
+def test_parse_line():
+    assert batch.parse_line("33.5, -6.8") == ("coords", (33.5, -6.8))
+    assert batch.parse_line("rabat,MA") == ("location", ("rabat", "MA"))
+    assert batch.parse_line("berkeley") == ("location", ("berkeley", ''))
+
+def test_run_records():
+    def resolve(city, country):
+        if city == "nowhere":
+            raise LookupError("location not found: nowhere")
+        return (33.5, -6.8)
+
+    process = batch.make_processor(resolve,
+                                   lambda lat, lon: WEATHER,
+                                   ("city", "temp"),
+                                   None)
+    records = []
+    lines = ["rabat,MA\n", "\n", "# comment\n", "nowhere\n", "1,2,3\n"]
+    errors = batch.run(lines, process, records.append, workers=2)
+
+    assert errors == 2
+    records.sort(key=lambda r: r["n"])
+    assert records[0]["data"] == { "city": "Rabat", "temp": 21.5 }
+    assert records[1] == { "n": 4,
+                           "input": "nowhere",
+                           "error": "location not found: nowhere" }
+    assert "invalid location" in records[2]["error"]
+
+    assert json.loads(batch.format_ndjson(records[0], None)) == records[0]
+    assert batch.format_tsv(records[0], ("city", "temp")) == \
+        "1\trabat,MA\tok\tRabat\t21.5\n"
+    assert batch.format_tsv(records[1], ("city", "temp")) == \
+        "4\tnowhere\terror\tlocation not found: nowhere\n"
+    assert batch.format_csv(records[0], ("city", "temp")) == \
+        '1,"rabat,MA",ok,Rabat,21.5\n'
+
+def test_bounded_in_flight():
+    in_flight = peak = 0
+    lock = threading.Lock()
+
+    def process(n, line):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.001)
+        with lock:
+            in_flight -= 1
+        return { "n": n }
+
+    def lines():
+        for i in range(500):
+            yield f"city{i}"
+
+    written = []
+    batch.run(lines(), process, written.append, workers=4)
+    assert len(written) == 500
+    assert peak <= 4
+
+def test_token_bucket():
+    bucket = ratelimit.TokenBucket(rate=100, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.acquire() > 0
+
+def test_workers():
+    assert cli.parse_args(["-w", "3"]).workers == 3
+    for value in ("0", "-2", "x"):
+        with pytest.raises(SystemExit):
+            cli.parse_args(["-w", value])
@@ -0,0 +1,51 @@
+import os, time
+import pytest
+from terminal_weather import cache
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    return tmp_path
+
+def test_store_load():
+    key = cache.make_key("weather", cache.round_coords(("33.001", -6.8)),
+                         "metric")
+    assert cache.load("weather", key) == None
+
+    cache.store("weather", key, { "name": "Rabat" })
+    assert cache.load("weather", key) == { "name": "Rabat" }
+    assert cache.load("weather", key, ttl=60) == { "name": "Rabat" }
+
+    path = cache.entry_path("weather", key)
+    old = time.time() - 120
+    with open(path, 'w') as f:
+        f.write(f'{{"time": {old}, "data": 1}}')
+    assert cache.load("weather", key, ttl=60) == None
+    assert cache.load("weather", key) == 1
+
+def test_rounded_keys():
+    assert cache.make_key(cache.round_coords((33.0012, -6.8))) == \
+        cache.make_key(cache.round_coords(("33.0031", "-6.80")))
+
+def test_corrupted_entry():
+    key = cache.make_key("x")
+    os.makedirs(cache.cache_dir("weather"))
+    with open(cache.entry_path("weather", key), 'w') as f:
+        f.write("{not json")
+    assert cache.load("weather", key) == None
+
+def test_eviction():
+    for i in range(5):
+        cache.store("forecast", str(i), "x" * 100, max_size=None)
+        os.utime(cache.entry_path("forecast", str(i)), (i, i))
+
+    size = sum(os.path.getsize(cache.entry_path("forecast", str(i)))
+               for i in range(2, 5))
+    cache.evict("forecast", size)
+    assert sorted(os.listdir(cache.cache_dir("forecast"))) == \
+        ["2.json", "3.json", "4.json"]
+
+    cache.invalidate("forecast", "4")
+    assert cache.load("forecast", "4") == None
+    cache.invalidate("forecast")
+    assert os.listdir(cache.cache_dir("forecast")) == []
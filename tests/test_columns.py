@@ -0,0 +1,50 @@
+import math
+
+from terminal_weather import columns
+
+HOUR = 3600
+
+# UTC+01:00, 3-hourly timestamps from 21:00 local time on day 0
+FORECAST = {
+    "city": { "timezone": HOUR },
+    "list": [
+        {
+            "dt": 20 * HOUR + i * 3 * HOUR,
+            "main": { "temp": 10.0 + i, "humidity": 50 },
+            "wind": { "speed": 2.0 },
+            **({ "rain": { "3h": 0.5 } } if i % 2 else {}),
+        }
+        for i in range(6)
+    ]
+}
+
+def test_to_columns():
+    data = columns.to_columns(FORECAST, ("temp", "rain", "city"))
+    assert tuple(data.values) == ("temp", "rain")
+    assert list(data.dt) == [20 * HOUR + i * 3 * HOUR for i in range(6)]
+    assert list(data.values["rain"]) == [0, 0.5, 0, 0.5, 0, 0.5]
+    assert math.isnan(columns.to_columns(FORECAST, ("wind_gust",))
+                      .values["wind_gust"][0])
+
+def test_convert():
+    data = columns.to_columns(FORECAST, ("temp", "humidity", "wind_speed"))
+    converted = columns.convert(data, "metric")
+    assert converted.values["temp"][0] == -263.15
+    assert converted.values["humidity"] is data.values["humidity"]
+    assert columns.convert(data, "imperial").values["wind_speed"][0] == 4.47
+
+def test_select():
+    data = columns.to_columns(FORECAST, ("temp",))
+    part = columns.select(data, 23 * HOUR, 29 * HOUR)
+    assert list(part.values["temp"]) == [11.0, 12.0]
+
+def test_aggregate():
+    data = columns.to_columns(FORECAST, ("temp", "rain", "wind_gust"))
+    first, second = columns.aggregate(data, "daily")
+    assert first["start"] == -HOUR
+    assert first["temp"] == { "min": 10.0, "max": 10.0, "mean": 10.0 }
+    assert second["start"] == 23 * HOUR
+    assert second["temp"] == { "min": 11.0, "max": 15.0, "mean": 13.0 }
+    assert second["rain"] == { "sum": 1.5 }
+    assert second["wind_gust"] == { "max": None }
+    assert len(columns.aggregate(data, "6h")) == 4
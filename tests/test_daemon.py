@@ -0,0 +1,87 @@
+import contextlib
+import os
+import sys
+import threading
+import pytest
+from terminal_weather import client, daemon
+
+def run(argv, cwd=None):
+    if argv[0] == "ask":
+        input("Continue? ")
+    print(' '.join(argv), "in", cwd)
+    print("warning", file=sys.stderr)
+    if argv[0] == "fail":
+        sys.exit(9)
+
+@contextlib.contextmanager
+def serving(tmp_path):
+    path = str(tmp_path / "d.sock")
+    ready = threading.Event()
+    servers = []
+
+    def on_ready(server):
+        servers.append(server)
+        ready.set()
+
+    thread = threading.Thread(target=daemon.serve,
+                              args=(run,),
+                              kwargs={ "path": path, "on_ready": on_ready })
+    thread.start()
+    assert ready.wait(5)
+    yield path
+    servers[0].shutdown()
+    thread.join(5)
+
+def test_query(tmp_path):
+    # started within the test, as pytest replaces sys.stdout for each phase
+    with serving(tmp_path) as server:
+        assert os.stat(server).st_mode & 0o077 == 0
+        check_queries(server)
+
+def check_queries(server):
+    assert client.query(["-f", "temp"], path=server, cwd="/home") == {
+        "status": 0,
+        "stdout": "-f temp in /home\n",
+        "stderr": "warning\n"
+    }
+    assert client.query(["fail"], path=server)["status"] == 9
+    assert client.query(["ask"], path=server) == { "fallback": True }
+
+def test_environment(monkeypatch):
+    monkeypatch.setenv("TERMINAL_WEATHER_CF", "conf")
+    request = { "argv": ["-f", "temp"], "env": client.environment() }
+    monkeypatch.setenv("TERMINAL_WEATHER_CF", "conf2")
+    # the daemon would read another configuration file
+    assert daemon.handle(request, run, ()) == { "fallback": True }
+
+def test_no_daemon(tmp_path):
+    with pytest.raises(OSError):
+        client.query([], path=str(tmp_path / "none.sock"))
+
+def test_private_dir(tmp_path):
+    path = str(tmp_path / "private")
+    assert client.private_dir(path) == path
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    assert client.private_dir(path) == path
+
+    os.chmod(path, 0o755)
+    with pytest.raises(PermissionError):
+        client.private_dir(path)
+    # links aren't followed, whatever they point to
+    os.symlink(str(tmp_path), str(tmp_path / "link"))
+    with pytest.raises(PermissionError):
+        client.private_dir(str(tmp_path / "link"))
+
+@pytest.mark.parametrize("option",
+                         ["--exporter", "--watch=5", "-W", "-b", "--batch"])
+def test_resident(option, monkeypatch):
+    from terminal_weather import cli
+
+    def query(*args, **kwargs):
+        raise AssertionError("sent to the daemon")
+
+    monkeypatch.delenv("TERMINAL_WEATHER_NO_DAEMON", raising=False)
+    monkeypatch.setattr(client, "query", query)
+    monkeypatch.setattr(cli, "main", lambda: None)
+    monkeypatch.setattr(sys, "argv", ["weather", option])
+    client.main()
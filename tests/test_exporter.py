@@ -0,0 +1,62 @@
+import pytest
+from terminal_weather import exporter
+
+WEATHER = {
+    "main": { "temp": 21.5, "humidity": 60 },
+    "wind": { "speed": 3.0 },
+    "sys": { "sunrise": 1759990000, "sunset": 1760030000 },
+    "dt": 1760000000,
+}
+
+class Stop(Exception):
+    pass
+
+def test_refresh_period():
+    assert exporter.refresh_period(10, 60) == exporter.REFRESH
+    assert exporter.refresh_period(1800, 60) == 2000
+    assert exporter.refresh_period(1800, 120) == 1000
+
+def test_schedule():
+    clock = [0]
+    calls = []
+
+    def task(i):
+        calls.append((clock[0], i))
+        clock[0] += 3 if i == 1 else 0.1 # the second call runs late
+        if len(calls) == 5:
+            raise Stop()
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    with pytest.raises(Stop):
+        exporter.schedule(3, 6, task, clock=lambda: clock[0], sleep=sleep)
+    assert [i for _, i in calls] == [0, 1, 2, 0, 1]
+    starts = [t for t, _ in calls]
+    assert all(b - a >= 2 for a, b in zip(starts, starts[1:]))
+
+def test_exposition():
+    def fetch(location):
+        if location == "nowhere":
+            raise LookupError(location)
+        return WEATHER
+
+    metrics = exporter.Exporter(['rabat,MA', 'Say "hi"', "nowhere"],
+                                fetch,
+                                "metric")
+    assert b"weather_temp{" not in metrics.scrape()
+    for i in range(3):
+        metrics.refresh(i)
+
+    lines = metrics.scrape().decode().splitlines()
+    assert "# HELP weather_temp Current temp (°C)" in lines
+    assert "# TYPE weather_refresh_errors_total counter" in lines
+    assert 'weather_temp{location="rabat,MA"} 21.5' in lines
+    assert 'weather_humidity{location="Say \\"hi\\""} 60' in lines
+    assert 'weather_refresh_errors_total{location="nowhere"} 1' in lines
+    assert 'weather_observation_timestamp_seconds{location="rabat,MA"} ' \
+        '1760000000' in lines
+    assert not any(line.startswith("weather_wind_gust{") for line in lines)
+    # samples of a metric directly follow its HELP and TYPE lines
+    names = [line.split('{')[0] for line in lines if line[0] != '#']
+    assert names == sorted(names, key=names.index)
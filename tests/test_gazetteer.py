@@ -0,0 +1,59 @@
+import pytest
+from terminal_weather import gazetteer
+
+DUMP = [
+    # geonameid, name, asciiname, alternatenames, lat, lon, class, code,
+    # country, cc2, admin1-4, population, ...
+    "1\tRabat\tRabat\t\t34.01325\t-6.83255\tP\tPPLC\tMA\t\t\t\t\t\t1655753",
+    "2\tSalé\tSale\t\t34.0531\t-6.79846\tP\tPPLA2\tMA\t\t\t\t\t\t903485",
+    "3\tParis\tParis\t\t48.85341\t2.3488\tP\tPPLC\tFR\t\t\t\t\t\t2138551",
+    "4\tParis\tParis\t\t33.66094\t-95.55551\tP\tPPLA2\tUS\t\t\t\t\t\t24171",
+    "5\tSão Paulo\tSao Paulo\t\t-23.5475\t-46.63611\tP\tPPLA\tBR"
+    "\t\t\t\t\t\t10021295",
+    "6\tMont Blanc\tMont Blanc\t\t45.83\t6.86\tT\tMT\tFR\t\t\t\t\t\t0",
+    "7\tSuva\tSuva\t\t-18.14161\t178.44149\tP\tPPLC\tFJ\t\t\t\t\t\t77366",
+    "malformed line",
+]
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "gazetteer.idx")
+    assert gazetteer.build(gazetteer.read_geonames(DUMP), path) == 6
+    index = gazetteer.Gazetteer(path)
+    yield index
+    index.close()
+
+def test_find(index):
+    assert index.find("paris") == ("Paris", "FR", 48.85341, 2.3488, 2138551)
+    assert index.find(" PARIS ", "us")[1] == "US"
+    assert index.find("paris", "Spain") is None
+    assert index.find("sao paulo")[0] == "São Paulo"
+    assert index.find("são paulo", "BR")[0] == "São Paulo"
+    assert index.find("sale")[0] == "Salé"
+    assert index.find("mont blanc") is None
+    assert index.find("") is None
+
+def test_complete(index):
+    assert index.complete("pa") == ["Paris,FR", "Paris,US"]
+    assert index.complete("s") == ["Salé,MA", "São Paulo,BR", "Suva,FJ"]
+    assert index.complete("x") == []
+
+def test_nearest(index):
+    assert index.nearest(34.0, -6.8)[0] == "Rabat"
+    assert index.nearest(34.06, -6.79)[0] == "Salé"
+    assert index.nearest(48.8, 2.3, max_distance=30)[0] == "Paris"
+    assert index.nearest(0, 0, max_distance=30) is None
+    assert index.nearest(0, 0)[0] == "Rabat"
+    # across the antimeridian
+    assert index.nearest(-18, -179.9)[0] == "Suva"
+
+def test_invalid(tmp_path):
+    path = tmp_path / "invalid"
+    path.write_bytes(b"not an index at all")
+    with pytest.raises(ValueError):
+        gazetteer.Gazetteer(str(path))
+
+def test_rename():
+    assert gazetteer.rename({ "name": "a" }, "b") == { "name": "b" }
+    assert gazetteer.rename({ "list": [], "city": { "id": 1 } }, "b") == \
+        { "list": [], "city": { "id": 1, "name": "b" } }
@@ -0,0 +1,65 @@
+import json, time
+import pytest
+from terminal_weather import cache, geocode
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+def make_geo_func():
+    calls = []
+
+    def geo_func(city, country='', limit=1):
+        calls.append((city, country))
+        if city == "nowhere":
+            return []
+        return [{ "lat": 34.0, "lon": -6.8 }]
+    return geo_func, calls
+
+def test_resolve():
+    geo_func, calls = make_geo_func()
+    assert geocode.resolve("Rabat", geo_func, country="MA") == (34.0, -6.8)
+    # names are matched case-insensitively, without a request
+    assert geocode.resolve(" rabat", geo_func, country="ma") == (34.0, -6.8)
+    assert calls == [("Rabat", "MA")]
+
+    assert geocode.resolve("Rabat", geo_func, country="MA",
+                           use_cache=False) == (34.0, -6.8)
+    assert len(calls) == 2
+
+    with pytest.raises(LookupError):
+        geocode.resolve("nowhere", geo_func)
+
+def test_expiry():
+    geo_func, calls = make_geo_func()
+    geocode.resolve("Rabat", geo_func)
+    path = cache.entry_path(geocode.NAMESPACE, geocode.make_key("Rabat"))
+    with open(path, 'w') as f:
+        json.dump({ "time": time.time() - 120, "data": [1.0, 2.0] }, f)
+
+    assert geocode.resolve("Rabat", geo_func) == (1.0, 2.0)
+    assert geocode.resolve("Rabat", geo_func, ttl=60) == (34.0, -6.8)
+    assert len(calls) == 2
+
+def test_forget():
+    geo_func, calls = make_geo_func()
+    for city in ("Rabat", "Fes"):
+        geocode.resolve(city, geo_func)
+
+    geocode.forget("RABAT")
+    assert geocode.lookup("Rabat") is None
+    assert geocode.lookup("Fes") == (34.0, -6.8)
+    geocode.forget()
+    assert geocode.lookup("Fes") is None
+
+def test_warm():
+    geo_func, calls = make_geo_func()
+    geocode.resolve("Rabat", geo_func, country="MA")
+    errors = []
+
+    counts = geocode.warm(["# comment", "", "rabat,MA", "Fes", "nowhere"],
+                          geo_func,
+                          on_error=lambda location, e: errors.append(location))
+    assert counts == (1, 1, 1)
+    assert errors == ["nowhere"]
+    assert geocode.lookup("fes") == (34.0, -6.8)
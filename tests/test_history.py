@@ -0,0 +1,106 @@
+import math
+import os
+import pytest
+from terminal_weather import cli, columns, history
+
+HOUR = 60 * 60
+
+def weather(dt, temp):
+    return { "dt": dt,
+             "name": "Rabat",
+             "sys": { "country": "MA" },
+             "timezone": 3600,
+             "main": { "temp": temp, "humidity": 60 } }
+
+def forecast(issued, temps):
+    start = issued - issued % (3 * HOUR) + 3 * HOUR
+    return { "city": { "name": "Rabat", "country": "MA", "timezone": 3600 },
+             "list": [{ "dt": start + i * 3 * HOUR, "main": { "temp": t } }
+                      for i, t in enumerate(temps)] }
+
+def test_record(tmp_path):
+    directory = str(tmp_path)
+    coords = (34.01325, -6.83255)
+    for dt, temp in ((1000, 20.5), (1000, 20.5), (2000, 21), (1500, 19)):
+        history.record(directory, coords, "metric", "weather",
+                       weather(dt, temp), issued=dt)
+
+    path = history.location_dir(directory, coords)
+    assert history.find(directory, "RABAT", "ma") == path
+    assert history.find(directory, "rabat", "fr") is None
+    with history.Store(os.path.join(path, "metric", "weather"),
+                       "weather") as store:
+        # the same observation and older ones aren't recorded again
+        assert list(store.columns["dt"]) == [1000, 2000]
+        data, issued = store.select(0, 2000, ("temp", "humidity"))
+        assert list(data.dt) == [1000] and list(issued) == [1000]
+        assert list(data.values["temp"]) == [20.5]
+        assert data.values["humidity"][0] == 60
+        assert math.isnan(store.columns["wind_gust"][0])
+        del data, issued
+
+    summary, = history.locations(directory)
+    assert summary == { "location": "34.01,-6.83", "name": "Rabat",
+                        "units": "metric", "kind": "weather", "records": 2,
+                        "first": 1000, "last": 2000 }
+
+def test_repair(tmp_path):
+    path = str(tmp_path)
+    records = history.to_records("weather", weather(1000, 20), 1000)
+    history.append(path, "weather", records)
+    # an append interrupted after writing some columns
+    with open(history.column_path(path, "dt"), "ab") as f:
+        f.write(b"\0" * 12)
+    history.append(path, "weather",
+                   history.to_records("weather", weather(2000, 21), 2000))
+    with history.Store(path, "weather") as store:
+        assert store.count == 2
+        assert list(store.columns["dt"]) == [1000, 2000]
+        assert list(store.columns["temp"]) == [20, 21]
+
+def test_forecasts(tmp_path):
+    path = str(tmp_path)
+    issued = 100 * 24 * HOUR
+    for day in range(3):
+        t = issued + day * 24 * HOUR
+        history.append(path, "forecast",
+                       history.to_records("forecast",
+                                          forecast(t, range(24)),
+                                          t))
+
+    with history.Store(path, "forecast") as store:
+        start = issued + 2 * 24 * HOUR
+        data, issued_at = store.select(start, start + 24 * HOUR, ("temp",))
+        # timestamps of that day forecast by each of the 3 requests
+        assert len(data.dt) == 8 + 8 + 7
+        assert list(data.dt) == sorted(data.dt)
+        row, = columns.aggregate(data, "daily")
+        assert row["temp"]["min"] == 0 and row["temp"]["max"] == 22
+
+        data, issued_at = store.select(start, start + 24 * HOUR, ("temp",),
+                                       lead=24 * HOUR)
+        assert list(data.dt) == [start]
+        assert list(issued_at) == [issued + 24 * HOUR]
+        assert list(data.values["temp"]) == [7]
+
+def test_parse_time():
+    now = 10 * 24 * HOUR
+    assert history.parse_time("now", now=now) == now
+    assert history.parse_time("7d", now=now) == 3 * 24 * HOUR
+    assert history.parse_time("+12h", now=now) == now + 12 * HOUR
+    assert history.parse_time("1970-01-02", shift=3600) == 23 * HOUR
+    assert history.parse_time("1970-01-02T00:00+00:00") == 24 * HOUR
+    with pytest.raises(ValueError):
+        history.parse_time("yesterday")
+
+def test_find_command():
+    assert cli.find_command(["history", "--list"]) == 0
+    assert cli.find_command(["-c", "conf", "history", "-l", "rabat"]) == 2
+    assert cli.find_command(["--conf=conf", "--list", "history"]) == 2
+    assert cli.find_command(["-cconf", "history"]) == 1
+    # values and positional arguments aren't commands
+    assert cli.find_command(["-l", "history"]) is None
+    assert cli.find_command(["today", "history"]) is None
+    assert cli.find_command(["--", "history"]) is None
+    args = cli.parse_history_args(["-c", "conf", "--list"])
+    assert args.conf == "conf" and args.list
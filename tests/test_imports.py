@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+def imported_by(module, candidates):
+    code = (f"import sys, json; import {module}; "
+            f"print(json.dumps([m for m in {candidates!r} "
+            "if m in sys.modules]))")
+    result = subprocess.run([sys.executable, "-c", code],
+                            env={ "PYTHONPATH": SRC },
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+def test_lazy_imports():
+    heavy = ["requests",
+             "terminal_weather.cache",
+             "terminal_weather.output",
+             "terminal_weather.transport"]
+
+    assert imported_by("terminal_weather.cli", heavy) == []
+    assert imported_by("terminal_weather.client",
+                       heavy + ["argparse", "terminal_weather.cli"]) == []
+    assert imported_by("terminal_weather.prompt",
+                       heavy + ["argparse",
+                                "terminal_weather.cli",
+                                "terminal_weather.config"]) == []
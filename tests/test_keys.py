@@ -0,0 +1,53 @@
+import pytest
+from terminal_weather import keys
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), { "status_code": status_code })
+
+def echo(*args):
+    return args
+
+def test_rotation():
+    pool = keys.KeyPool(["a", "b", "c", "a"])
+    assert pool.keys == ("a", "b", "c")
+    assert [pool.call(echo, 1)[-1] for _ in range(4)] == ["a", "b", "c", "a"]
+    assert pool.calls("a") == 2
+
+def test_suspension():
+    pool = keys.KeyPool(["bad", "good"])
+
+    def request(lat, lon, key):
+        if key == "bad":
+            raise HTTPError(429)
+        return key
+
+    assert pool.wrap(request)(1, 2) == "good"
+    assert pool.wrap(request)(1, 2) == "good"
+    assert pool.calls("bad") == 1
+
+    with pytest.raises(HTTPError):
+        keys.KeyPool(["bad"]).call(request, 1, 2)
+
+    def broken(key):
+        raise HTTPError(500)
+
+    with pytest.raises(HTTPError):
+        pool.call(broken)
+    assert pool.acquire() == "good"
+
+def test_quota(tmp_path):
+    path = str(tmp_path / "usage.json")
+    pool = keys.KeyPool(["a", "b"], monthly_quota=2, usage_path=path)
+    for _ in range(4):
+        pool.call(echo)
+    with pytest.raises(RuntimeError):
+        pool.call(echo)
+    pool.save()
+
+    other = keys.KeyPool(["a", "b"], monthly_quota=3, usage_path=path)
+    assert other.calls("a") == 2
+    other.call(echo)
+    other.save()
+    assert keys.KeyPool(["a"], usage_path=path).calls("a") == 3
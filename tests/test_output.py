@@ -0,0 +1,99 @@
+from datetime import timezone
+from terminal_weather import output, owm
+
+WEATHER = {
+    "name": "Rabat",
+    "weather": [{ "description": "clear sky" }],
+    "main": { "temp": 21.5, "humidity": 60 },
+    "sys": { "sunrise": 1760000000 },
+    "timezone": 3600,
+}
+
+def test_registry():
+    assert owm.list_fields()[:3] == ("city", "desc", "temp")
+    assert owm.get_unit("temp", "imperial") == "°F"
+    assert owm.get_unit("city", "metric") == ''
+    assert owm.grep_weather(WEATHER, "temp") == 21.5
+    assert owm.grep_weather(WEATHER, "wind_speed") == None
+    assert owm.grep_weather(WEATHER, "timezone") == 3600
+    assert owm.grep_weather(WEATHER, "unknown") == None
+
+def test_convert():
+    forecast = { "list": [{ "main": { "temp": 273.15, "humidity": 60 },
+                            "wind": { "speed": 10, "gust": None } },
+                          { "weather": [] }] }
+    assert owm.convert(forecast, "standard") is forecast
+    metric = owm.convert(forecast, "metric")
+    assert metric["list"][0]["main"] == { "temp": 0, "humidity": 60 }
+    assert metric["list"][0]["wind"] is forecast["list"][0]["wind"]
+    imperial = owm.convert(forecast, "imperial")
+    assert imperial["list"][0]["main"]["temp"] == 32
+    assert imperial["list"][0]["wind"] == { "speed": 22.37, "gust": None }
+    assert imperial["list"][1] == { "weather": [] }
+    # the response is left untouched
+    assert forecast["list"][0]["main"]["temp"] == 273.15
+    assert owm.convert(WEATHER, "imperial")["main"]["temp"] == -420.97
+
+def test_print_ts(capsys):
+    output.print_ts(WEATHER,
+                    ("city", "temp", "humidity", "sunrise", "clouds"),
+                    sep='\t',
+                    field_delim='\n',
+                    units="metric")
+    assert capsys.readouterr().out == ("city    \tRabat\n"
+                                       "temp    \t21.5 °C\n"
+                                       "humidity\t60 %\n"
+                                       "sunrise \t09:53\n"
+                                       "clouds  \t-\n")
+
+def test_plan():
+    plan = output.make_plan(("temp", "dt"), "standard", timezone.utc, "%H")
+    label, extract, format = plan[1]
+    assert label == "dt  "
+    assert format(extract({ "dt": 7200 })) == "02"
+    assert plan[0][2](300) == "300 K"
+
+def test_render_ts_formats():
+    fields = ("city", "temp", "sunrise")
+    params = { "sep": '\t', "field_delim": '\n', "units": "metric" }
+    assert output.render_ts(WEATHER, fields, fmt="csv", **params) == (
+        "city,temp,sunrise\n"
+        "Rabat,21.5,2025-10-09T09:53:20+01:00"
+    )
+    assert output.render_ts(WEATHER, fields, fmt="ndjson", **params) == (
+        '{"city":"Rabat","temp":21.5,"sunrise":"2025-10-09T09:53:20+01:00"}'
+    )
+
+def test_dumps():
+    assert output.dumps({ "city": "Salé", "list": [1.5, None] }) == \
+        '{"city":"Salé","list":[1.5,null]}'
+
+def test_render_forecast(monkeypatch):
+    now = 1760000000
+    start, end = now - now % 86400, now - now % 86400 + 86400
+    monkeypatch.setattr(output, "day_bounds", lambda *args: (start, end))
+    forecast = {
+        "city": { "name": "Rabat", "timezone": 0 },
+        "list": [
+            { "dt": start + i * 3 * 3600, "main": { "temp": i } }
+            for i in range(-1, 10)
+        ]
+    }
+    params = {
+        "sep": ' ',
+        "field_delim": ';',
+        "units": "standard",
+        "ts_delim": '|',
+        "time_format": "%H",
+        "start_day": 0,
+        "end_day": 0,
+    }
+    assert output.render_forecast(forecast, ("city", "temp"), **params) == (
+        "city Rabat|" + '|'.join(f"dt   {3 * i:02};temp {i} K"
+                                 for i in range(8))
+    )
+    rows = output.render_forecast(forecast, ("city", "temp"),
+                                  fmt="tsv", **params).split('\n')
+    assert rows[0] == "city\tdt\ttemp"
+    assert len(rows) == 9
+    assert rows[1].startswith("Rabat\t")
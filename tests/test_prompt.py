@@ -0,0 +1,50 @@
+import os
+import time
+from terminal_weather import prompt
+
+def test_entry_path(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.delenv("TERMINAL_WEATHER_CF", raising=False)
+    path = prompt.entry_path(["--prompt", "-f", "temp"])
+    assert path.startswith(str(tmp_path))
+    assert prompt.entry_path(["-f", "temp", "--refresh", "--prompt"]) == path
+    assert prompt.entry_path(["--prompt", "-f", "humidity"]) != path
+    monkeypatch.setenv("TERMINAL_WEATHER_CF", "conf")
+    assert prompt.entry_path(["--prompt", "-f", "temp"]) != path
+
+def test_read_write(tmp_path):
+    path = str(tmp_path / "prompt" / "entry")
+    prompt.write(path, "21.5 °C", 600)
+    stale, value = prompt.read(path)
+    assert value == "21.5 °C"
+    assert abs(stale - time.time() - 600) <= 1
+
+def test_lock(tmp_path):
+    path = str(tmp_path / "entry")
+    assert prompt.lock(path)
+    assert not prompt.lock(path)
+    old = time.time() - prompt.RETRY - 1
+    os.utime(path + ".lock", (old, old))
+    assert prompt.lock(path)
+    assert not prompt.lock(path)
+
+def test_main(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    refreshed = []
+    monkeypatch.setattr(prompt, "refresh",
+                        lambda argv, path: refreshed.append(argv))
+
+    argv = ["--prompt", "-f", "temp"]
+    assert prompt.main(argv) == 0
+    assert capsys.readouterr().out == ''
+    assert refreshed == [argv]
+
+    prompt.write(prompt.entry_path(argv), "21.5 °C", 600)
+    prompt.main(argv)
+    assert capsys.readouterr().out == "21.5 °C\n"
+    assert len(refreshed) == 1
+
+    prompt.write(prompt.entry_path(argv), "21.5 °C", -1)
+    prompt.main(argv)
+    assert capsys.readouterr().out == "21.5 °C\n"
+    assert len(refreshed) == 2
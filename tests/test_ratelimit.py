@@ -0,0 +1,83 @@
+import multiprocessing
+import time
+import pytest
+from terminal_weather import keys, ratelimit, timings
+
+@pytest.mark.parametrize("calls", [1, 2, 12, 60, 61])
+def test_per_minute(calls):
+    # a full bucket and a minute of tokens added (a bucket must refill)
+    for bucket in (ratelimit.TokenBucket.per_minute(calls),
+                   ratelimit.HostBucket.per_minute("bucket", calls)):
+        assert bucket.capacity + bucket.rate * 60 <= max(2, calls)
+
+def test_host_limit():
+    assert ratelimit.host_limit({}.get) == (60, 30)
+    assert ratelimit.host_limit({ "rate-limit": "12" }.get) == (12, 30)
+    # 0 disables the host-wide limit, whatever the per-key one
+    assert ratelimit.host_limit({ "host-rate-limit": 0,
+                                  "rate-limit": 12,
+                                  "rate-limit-wait": 0 }.get) == (0, 0)
+    with pytest.raises(ValueError):
+        ratelimit.host_limit({ "host-rate-limit": "-1" }.get)
+
+def test_host_bucket(tmp_path):
+    path = str(tmp_path / "bucket")
+    bucket = ratelimit.HostBucket(path, rate=100, capacity=2, max_wait=0.05)
+    assert bucket.reserve() == 0
+    # another process sees the same tokens
+    other = ratelimit.HostBucket(path, rate=100, capacity=2, max_wait=0.05)
+    assert other.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.01, abs=0.002)
+    # reservations queue up behind each other, up to the maximum wait
+    assert other.reserve() == pytest.approx(0.02, abs=0.002)
+    with pytest.raises(ratelimit.Saturated):
+        ratelimit.HostBucket(path, rate=100, max_wait=0.025).reserve()
+
+    with timings.recording() as recorder:
+        assert bucket.acquire() > 0.02
+    assert recorder.report()["phases"]["ratelimit"]["ms"] >= 20
+
+def test_host_bucket_file(tmp_path):
+    victim = tmp_path / "victim"
+    victim.write_bytes(b"precious data")
+    private = tmp_path / "private"
+    private.mkdir(mode=0o700)
+    (private / "bucket").symlink_to(victim)
+    with pytest.raises(OSError):
+        ratelimit.HostBucket(str(private / "bucket"), rate=1).reserve()
+    assert victim.read_bytes() == b"precious data"
+
+    private.chmod(0o777)
+    with pytest.raises(PermissionError):
+        ratelimit.HostBucket(str(private / "other"), rate=1).reserve()
+    assert not (private / "other").exists()
+
+def take(path, calls):
+    bucket = ratelimit.HostBucket(path, rate=50, capacity=1)
+    for _ in range(calls):
+        bucket.acquire()
+
+def test_host_bucket_processes(tmp_path):
+    path = str(tmp_path / "bucket")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=take, args=(path, 3))
+                 for _ in range(4)]
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    # 1 token at once, then 11 at 50 tokens per second
+    assert time.monotonic() - start >= 11 / 50
+
+def test_key_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, "runtime_dir", lambda: str(tmp_path))
+    first = keys.KeyPool(["a"], host_calls=4, max_wait=0)
+    second = keys.KeyPool(["a", "b"], host_calls=4, max_wait=0)
+    assert first.acquire() == "a"
+    # the host-wide token of 'a' was taken by the first pool
+    assert second.acquire() == "b"
+    with pytest.raises(ratelimit.Saturated):
+        second.acquire()
+    assert keys.KeyPool(["a"]).acquire() == "a"
@@ -0,0 +1,131 @@
+import pytest
+from terminal_weather import keys, ratelimit, retry
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response",
+                             (),
+                             { "status_code": status_code,
+                               "headers": headers or {} })
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def failing(*errors):
+    errors = list(errors)
+    calls = []
+
+    def func(*args):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+    return func, calls
+
+def policy(clock, **kwargs):
+    return retry.RetryPolicy(clock=clock, sleep=clock.sleep, **kwargs)
+
+def test_retry_after():
+    assert keys.retry_after(HTTPError(429, { "Retry-After": "7" })) == 7
+    assert keys.retry_after(HTTPError(429)) is None
+    assert keys.retry_after(HTTPError(429, {
+        "Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"
+    })) == 0
+
+def test_backoff():
+    clock = Clock()
+    func, calls = failing(HTTPError(503), ConnectionError())
+    p = policy(clock, retries=2, backoff=1)
+    assert p.call("api", func, 1) == "ok"
+    assert len(calls) == 3
+    assert 0 <= clock.sleeps[0] <= 1 and 0 <= clock.sleeps[1] <= 2
+
+    func, calls = failing(HTTPError(429, { "Retry-After": "5" }))
+    assert p.call("api", func) == "ok"
+    assert clock.sleeps[-1] == 5
+
+    func, calls = failing(HTTPError(404))
+    with pytest.raises(HTTPError):
+        p.call("api", func)
+    assert len(calls) == 1
+
+def test_retryable():
+    from requests.exceptions import InvalidJSONError, JSONDecodeError
+    assert retry.retryable(ConnectionError())
+    assert retry.retryable(HTTPError(503))
+    assert not retry.retryable(HTTPError(404))
+    assert not retry.retryable(JSONDecodeError("Expecting value", "<", 0))
+    assert not retry.retryable(InvalidJSONError())
+    assert not retry.retryable(keys.Exhausted("over quota"))
+
+def test_deadline():
+    clock = Clock()
+    func, calls = failing(*[HTTPError(429, { "Retry-After": "20" })] * 3)
+    with pytest.raises(HTTPError):
+        policy(clock, retries=5, deadline=30).call("api", func)
+    assert len(calls) == 2
+    assert clock.now == 20
+
+def test_breaker():
+    clock = Clock()
+    p = policy(clock, retries=0, threshold=2, cooldown=30)
+    func, calls = failing(*[HTTPError(500)] * 3)
+    for _ in range(2):
+        with pytest.raises(HTTPError):
+            p.call("api", func)
+    with pytest.raises(retry.CircuitOpen):
+        p.call("api", func)
+    assert len(calls) == 2
+    assert p.call("other", lambda: "ok") == "ok"
+
+    # a failed trial reopens the circuit at once
+    clock.now += 30
+    with pytest.raises(HTTPError):
+        p.call("api", func)
+    with pytest.raises(retry.CircuitOpen):
+        p.call("api", func)
+
+    clock.now += 30
+    assert p.call("api", func) == "ok"
+    assert p.call("api", func) == "ok"
+
+def test_suspended_key(monkeypatch):
+    monkeypatch.setitem(keys.SUSPENSION, 429, 0.2)
+    pool = keys.KeyPool(["key"])
+    func, calls = failing(HTTPError(429))
+    retried = retry.RetryPolicy(backoff=0.01).wrap("api", pool.wrap(func))
+    # retried once the only key's suspension after the 429 is over
+    assert retried() == "ok"
+    assert len(calls) == 2
+
+    pool.suspend("key", 60)
+    with pytest.raises(keys.Exhausted) as error:
+        retried()
+    assert error.value.retry_after == pytest.approx(60, abs=1)
+    assert len(calls) == 2
+
+def test_breaker_trial():
+    clock = Clock()
+    p = policy(clock, retries=0, threshold=1, cooldown=10)
+    with pytest.raises(HTTPError):
+        p.call("api", failing(HTTPError(500))[0])
+
+    # trials making no request leave the circuit open, but not for good
+    clock.now += 1000
+    for error in (keys.Exhausted("no key", retry_after=60),
+                  ratelimit.Saturated("rate limit")):
+        with pytest.raises(type(error)):
+            p.call("api", failing(error)[0])
+        assert p.breaker("api").opened is not None
+    assert p.call("api", lambda: "ok") == "ok"
+    assert p.breaker("api").opened is None
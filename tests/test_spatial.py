@@ -0,0 +1,78 @@
+import threading
+import time
+import pytest
+from terminal_weather import spatial, timings
+
+def test_geohash():
+    # reference value from geohash.org
+    assert spatial.geohash(57.64911, 10.40744, 11)[0] == "u4pruydqqvj"
+    assert spatial.geohash(57.64911, 10.40744, 5)[0] == "u4pru"
+    south, north, west, east = spatial.geohash(34.01325, -6.83255, 5)[1]
+    assert south <= 34.01325 <= north and west <= -6.83255 <= east
+
+def test_snappers():
+    snap = spatial.make_snapper("geohash:5")
+    cell, center = snap(34.01325, -6.83255)
+    assert snap(*center) == (cell, center)
+    assert snap(center[0] + 0.01, center[1] - 0.01)[0] == cell
+    assert snap(center[0] + 0.05, center[1])[0] != cell
+
+    snap = spatial.make_snapper("grid:0.1")
+    assert snap(34.01, -6.83) == ("1240,1731", (34.05, -6.85))
+    assert snap(34.09, -6.89)[0] == "1240,1731"
+    assert snap(90, 180) == ("1799,0", (89.95, -179.95))
+
+    # cells at the antimeridian are narrower if the step doesn't divide 360
+    assert spatial.make_snapper("grid:0.7")(10, 179.9) == \
+        ("142,514", (9.75, 179.9))
+    assert spatial.make_snapper("grid:7")(10, 179.9)[1] == (11.5, 178.5)
+
+    for precision in ("geohash:0", "geohash:x", "grid:0", "grid", "5"):
+        with pytest.raises(ValueError):
+            spatial.make_snapper(precision)
+
+def test_coalescer():
+    calls = []
+    clock = [0]
+
+    def fetch(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x * 2
+
+    coalescer = spatial.Coalescer(size=2, clock=lambda: clock[0])
+    results = []
+    threads = [threading.Thread(
+        target=lambda: results.append(coalescer.call("a", 10, fetch, 1))
+    ) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [2] * 5
+    assert calls == [1]
+
+    assert coalescer.call("a", 10, fetch, 1) == 2
+    assert coalescer.call("a", 10, fetch, 1, fresh=True) == 2
+    clock[0] = 11
+    assert coalescer.call("a", 10, fetch, 1) == 2
+    assert calls == [1, 1, 1]
+
+    coalescer.call("b", 10, fetch, 2)
+    coalescer.call("c", 10, fetch, 3)
+    assert list(coalescer.memo) == ["b", "c"]
+
+    def fail():
+        raise OSError("down")
+
+    with pytest.raises(OSError):
+        coalescer.call("d", 10, fail)
+    assert coalescer.inflight == {}
+
+def test_report():
+    with timings.recording() as recorder:
+        for cell in ("a", "a", "b"):
+            timings.cell("weather", cell)
+    assert recorder.report()["cells"] == {
+        "weather": { "cells": 2, "locations": 3, "largest": 2 }
+    }
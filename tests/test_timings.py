@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from terminal_weather import geocode, timings
+
+def test_disabled():
+    assert timings.current() is None
+    assert timings.phase("render") is timings.NULL
+    timings.count("requests")
+    timings.cache_lookup("geo", True)
+
+def test_recording(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    calls = []
+
+    def geo_func(city, country='', limit=1):
+        calls.append(city)
+        timings.count("requests")
+        return [{ "lat": 34.0, "lon": -6.8 }]
+
+    with timings.recording() as recorder:
+        geocode.resolve("rabat", geo_func)
+        geocode.resolve("rabat", geo_func)
+        with timings.phase("render"):
+            pass
+    assert timings.current() is None
+
+    report = recorder.report()
+    assert calls == ["rabat"]
+    assert report["requests"] == 1
+    assert report["bytes"] == 0
+    assert report["cache"] == { "geo": { "hits": 1, "misses": 1 } }
+    assert report["phases"]["geocode"]["count"] == 2
+    assert report["phases"]["render"]["count"] == 1
+    assert report["total_ms"] >= report["phases"]["geocode"]["ms"]
+
+def test_concurrent_recorders():
+    barrier = threading.Barrier(2)
+    reports = {}
+
+    def run(name, requests):
+        with timings.recording() as recorder:
+            barrier.wait()
+            with ThreadPoolExecutor(2) as executor:
+                for _ in range(requests):
+                    executor.submit(timings.inherit(timings.count),
+                                    "requests")
+            barrier.wait()
+        reports[name] = recorder.report()
+
+    threads = [threading.Thread(target=run, args=(name, requests))
+               for name, requests in (("a", 2), ("b", 3))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert reports["a"]["requests"] == 2
+    assert reports["b"]["requests"] == 3
+    assert timings.current() is None
@@ -0,0 +1,65 @@
+import gzip
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from terminal_weather import owm, transport
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if "appid=bad" in self.path:
+            status, body = 401, { "cod": 401, "message": "Invalid API key" }
+        else:
+            status, body = 200, { "path": self.path, "padding": "x" * 1000 }
+
+        data = json.dumps(body).encode()
+        if "gzip" in self.headers.get("Accept-Encoding", ''):
+            data = gzip.compress(data)
+            self.send_response(status)
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    monkeypatch.setattr(owm, "API_URL",
+                        f"http://127.0.0.1:{httpd.server_port}")
+    yield httpd
+    httpd.shutdown()
+    thread.join()
+
+def test_reuse_and_compression(server):
+    http = transport.Transport()
+    assert owm.geo_direct(http, "rabat", "key", country="MA")["path"] \
+        .startswith("/geo/1.0/direct?q=rabat%2CMA&limit=1&appid=key")
+    assert owm.weather(http, 33, -6, "key", units="metric")["path"] == \
+        "/data/2.5/weather?lat=33&lon=-6&appid=key&units=metric"
+
+    stats = http.stats()
+    assert stats["requests"] == 2
+    assert stats["connections"] == 1
+    assert stats["reused"] == 1
+    assert 0 < stats["bytes"] < 2000 # compressed
+
+def test_error_message(server):
+    http = transport.Transport()
+    with pytest.raises(transport.HTTPError, match="401 Invalid API key") as e:
+        owm.forecast(http, 33, -6, "bad")
+    assert e.value.response.status_code == 401
+
+def test_api_url(server):
+    http = transport.Transport()
+    url = f"http://127.0.0.1:{server.server_port}/mock"
+    assert owm.forecast(http, 33, -6, "key", cnt=2, api_url=url)["path"] == \
+        "/mock/data/2.5/forecast?lat=33&lon=-6&appid=key&cnt=2"
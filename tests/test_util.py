@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from terminal_weather import ratelimit, retry, util
+
+FIELDS = "latitude,longitude,countryName,countryCode,cityName"
+SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+def make_conf(**conf):
+    return lambda name: conf.get(name)
+
+@pytest.fixture(autouse=True)
+def runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, "runtime_dir", lambda: str(tmp_path))
+
+def test_geoip_first_valid_wins(monkeypatch):
+    def query(transport, url, fields, timeout):
+        if url == "dead":
+            raise ConnectionError("unreachable")
+        if url == "slow":
+            time.sleep(0.5)
+        return { "lat": 1, "lon": 2, "city": url }
+
+    monkeypatch.setattr(util, "query_geoip", query)
+    conf = make_conf(**{ "geoip-url": ["slow", "dead", "fast"],
+                         "geoip-fields": [FIELDS]*3 })
+
+    start = time.monotonic()
+    assert util.get_location(conf, None)["city"] == "fast"
+    assert time.monotonic() - start < 0.5
+
+def test_geoip_deadline(monkeypatch):
+    monkeypatch.setattr(util, "query_geoip",
+                        lambda *args: time.sleep(1))
+    conf = make_conf(**{ "geoip-url": ["hung"], "geoip-fields": [FIELDS] })
+
+    with pytest.raises(TimeoutError):
+        util.get_location(conf, None, timeout=0.1)
+
+ABANDONED = f"""
+import time
+from terminal_weather import retry, util
+
+def query(transport, url, fields, timeout):
+    if url == "hung":
+        time.sleep(timeout)
+        raise TimeoutError(url)
+    return {{ "city": url }}
+
+util.query_geoip = query
+conf = {{ "geoip-url": ["hung", "fast"],
+         "geoip-fields": [{FIELDS!r}] * 2,
+         "host-rate-limit": "0" }}.get
+policy = retry.RetryPolicy(retries=5, backoff=0)
+print(util.get_location(conf, None, timeout=1, policy=policy)["city"])
+"""
+
+def test_geoip_abandoned():
+    start = time.monotonic()
+    output = subprocess.run([sys.executable, "-c", ABANDONED],
+                            env={ "PYTHONPATH": SRC },
+                            capture_output=True,
+                            text=True,
+                            check=True).stdout
+    assert output == "fast\n"
+    # the retries of the hung provider don't delay the exit
+    assert time.monotonic() - start < 1
+
+def test_geoip_retries(monkeypatch):
+    calls = []
+
+    def query(transport, url, fields, timeout):
+        calls.append(timeout)
+        time.sleep(0.1)
+        raise ConnectionError(url)
+
+    monkeypatch.setattr(util, "query_geoip", query)
+    conf = make_conf(**{ "geoip-url": ["a"], "geoip-fields": [FIELDS] })
+    policy = retry.RetryPolicy(retries=10, backoff=0)
+    with pytest.raises((ConnectionError, TimeoutError)):
+        util.get_location(conf, None, timeout=0.25, policy=policy)
+    # attempts only get the time left, and stop at the timeout
+    time.sleep(0.2)
+    assert 2 <= len(calls) <= 3
+    assert calls == sorted(calls, reverse=True) and calls[0] <= 0.25
+    time.sleep(0.2)
+    assert len(calls) <= 3
+
+def test_geoip_all_failed(monkeypatch):
+    def query(transport, url, fields, timeout):
+        raise ConnectionError(url)
+
+    monkeypatch.setattr(util, "query_geoip", query)
+    conf = make_conf(**{ "geoip-url": ["a", "b"],
+                         "geoip-fields": [FIELDS]*2 })
+
+    with pytest.raises(ConnectionError):
+        util.get_location(conf, None)
+
+def test_geoip_rate_limit(monkeypatch):
+    monkeypatch.setattr(util, "query_geoip",
+                        lambda transport, url, *args: { "city": url })
+    conf = make_conf(**{ "geoip-url": ["http://geoip.test/"],
+                         "geoip-fields": [FIELDS],
+                         "host-rate-limit": "1",
+                         "rate-limit-wait": "0" })
+
+    assert util.get_location(conf, None)["city"] == "http://geoip.test/"
+    with pytest.raises(ratelimit.Saturated):
+        util.get_location(conf, None)
+
+def test_split_location():
+    assert util.split_location(" rabat , MA") == ("rabat", "MA")
+    assert util.split_location("berkeley") == ("berkeley", '')
+    with pytest.raises(ValueError):
+        util.split_location(",MA")
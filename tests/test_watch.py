@@ -0,0 +1,60 @@
+import io
+import pytest
+from terminal_weather import watch
+
+class Stop(Exception):
+    pass
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+def test_next_refresh():
+    assert watch.next_refresh({ "dt": 1000 }, 1100, 60) == 1600
+    assert watch.next_refresh({ "dt": 1000 }, 1590, 60) == 1650
+    assert watch.next_refresh({ "dt": 0 }, 5000, 60) == 5600
+    forecast = { "list": [{ "dt": 900 }, { "dt": 1200 }, { "dt": 1500 }] }
+    assert watch.next_refresh(forecast, 1000, 60) == 1200
+
+def test_redraw():
+    assert watch.redraw(None, ["a", "b"]) == "a\nb\n"
+    assert watch.redraw(["a", "b", "c"], ["a", "x", "c"]) == \
+        "\x1b[2Fx\x1b[K\x1b[2E"
+    assert watch.redraw(["a", "b"], ["a", "b"]) == ''
+    assert watch.redraw(["a", "b"], ["a", "c", "d"]) == \
+        "\x1b[1Fc\x1b[K\nd\x1b[K\n\x1b[J"
+
+def test_run():
+    clock = [1000]
+    responses = [{ "dt": 1000, "temp": 1 },
+                 RuntimeError("timed\nout"),
+                 { "dt": 1650, "temp": 2 }]
+    requests = []
+    sleeps = []
+
+    def fetch(refresh):
+        requests.append((clock[0], refresh))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def sleep(seconds):
+        if len(sleeps) == 20:
+            raise Stop()
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    stream = Terminal()
+    with pytest.raises(Stop):
+        watch.run(fetch, lambda d: f"temp {d['temp']}", 60, stream,
+                  clock=lambda: clock[0], sleep=sleep)
+
+    # redrawn every minute, refetched when new data is expected, then
+    # after a backoff
+    assert requests == [(1000, False), (1600, True), (1615, True)]
+    assert set(sleeps) == { 60, 15 }
+    output = stream.getvalue()
+    assert output.startswith("temp 1\n")
+    assert "Error: timed out (retrying in 15 s)" in output
+    assert output.endswith("\x1b[2Ftemp 2\x1b[K\n\x1b[J")